@@ -0,0 +1,55 @@
+from datetime import timedelta
+from django.apps import apps as django_apps
+from edc_appointment.constants import NEW_APPT
+from edc_base.utils import get_utcnow
+
+from .batch import chunked
+from .visit_context import VisitContext
+
+
+class ScheduledAppointments:
+
+    """A class of the new appointments scheduled from `start` for
+    a number of days, as visit contexts.
+
+    Each context is built as if the visit were reported at the
+    appointment datetime.
+    """
+
+    appointment_model = 'bcpp_subject.appointment'
+    visit_context_cls = VisitContext
+    batch_size = 500
+
+    def __init__(self, start=None, days=None, batch_size=None):
+        self.start = start or get_utcnow()
+        self.end = self.start + timedelta(days=days or 1)
+        self.batch_size = batch_size or self.batch_size
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(start={self.start}, end={self.end})'
+
+    @property
+    def appointment_model_cls(self):
+        return django_apps.get_model(self.appointment_model)
+
+    @property
+    def appointments(self):
+        return self.appointment_model_cls.objects.filter(
+            appt_datetime__gte=self.start,
+            appt_datetime__lt=self.end,
+            appt_status=NEW_APPT).order_by('appt_datetime')
+
+    def contexts(self):
+        """Yields lists of visit contexts, one per appointment.
+        """
+        for appointments in chunked(self.appointments.iterator(), self.batch_size):
+            yield [self.visit_context_cls(
+                pk=appointment.pk,
+                subject_identifier=appointment.subject_identifier,
+                report_datetime=appointment.appt_datetime,
+                survey_schedule=appointment.survey_schedule,
+                visit_code=appointment.visit_code,
+                visit_schedule_name=appointment.visit_schedule_name,
+                schedule_name=appointment.schedule_name,
+                visit_code_sequence=appointment.visit_code_sequence)
+                for appointment in appointments]
@@ -4,6 +4,40 @@ from django.conf import settings
 
 class AppConfig(DjangoAppConfig):
     name = 'bcpp_metadata_rules'
+    # if True, rule runs triggered within a transaction are
+    # run once per visit on commit. See coalescer.
+    coalesce_rule_runs = False
+    # if True, rule runs are queued for the worker started by
+    # management command process_rule_run_queue. See rule_run_queue.
+    defer_rule_runs = False
+    # name of a cache shared by all processes for compiled rule set
+    # plans, e.g. a file-based cache that outlives restarts. See RuleSet.
+    rule_plan_cache = None
+    # if True, rule runs for a visit are serialized and a run is
+    # skipped if superseded by a newer one. See visit_rule_run_lock.
+    lock_rule_runs = False
+    # if True, rule results are persisted per rule fingerprint and
+    # subject input version and reused. See rule_results.
+    cache_rule_results = False
+    # added to each rule fingerprint; if None, the installed versions
+    # of this package and of bcpp-status. See fingerprint.
+    rule_fingerprint_salt = None
+    # database alias predicate reads are routed to, e.g. a read
+    # replica, and seconds to read from the primary after a
+    # subject is written. See predicate_reads and routers.
+    predicate_read_database = None
+    predicate_read_lag = 5
+    # name of a cache shared by all processes for status helper
+    # outcomes, e.g. 'default', and their timeout in seconds.
+    # See status_cache.
+    status_cache = None
+    status_cache_timeout = 86400
+    # if True, reference values and status outcomes are recorded
+    # in an interval index for as-of evaluation. See as_of.
+    as_of_index = False
+
+    def ready(self):
+        from .signals import monotonic_facts_on_post_save
 
 
 if settings.APP_NAME == 'bcpp_metadata_rules':
@@ -0,0 +1,293 @@
+import json
+import threading
+
+from contextlib import contextmanager
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.utils.module_loading import import_string
+from edc_base.utils import get_utcnow
+
+from .batch import BatchEvaluator
+from .rule_set import RuleSet
+from .scope import evaluation_scope
+from .status_cache import StatusCache, status_helpers
+
+
+class AsOfIndexError(Exception):
+    pass
+
+
+class AsOfReferenceModel:
+
+    """A stand-in for the reference model class whose `objects`
+    are the reference intervals valid at `as_of`.
+    """
+
+    def __init__(self, model_cls=None, as_of=None):
+        self.model_cls = model_cls
+        self.as_of = as_of
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(as_of={self.as_of})'
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__)
+                and (self.model_cls, self.as_of) == (other.model_cls, other.as_of))
+
+    def __hash__(self):
+        return hash((self.model_cls, self.as_of))
+
+    @property
+    def objects(self):
+        return self.model_cls.objects.as_of(self.as_of)
+
+
+class AsOfStatus:
+
+    """A stand-in for the status helper that answers from the
+    status intervals of the visit valid at `as_of`.
+    """
+
+    def __init__(self, visit=None, as_of_index=None):
+        self.visit = visit
+        as_of = as_of_index.as_of_datetime
+        self.values = {
+            name: json.loads(value)
+            for name, value in as_of_index.status_model_cls.objects.as_of(as_of).filter(
+                **as_of_index.visit_options(visit)).values_list('name', 'value')}
+        if not self.values:
+            raise AsOfIndexError(
+                f'No status recorded for visit as of {as_of}. '
+                f'Got {visit.subject_identifier}@{visit.visit_code}.')
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['values'][name]
+        except KeyError:
+            raise AttributeError(
+                f'\'{self.__class__.__name__}\' object has no attribute \'{name}\'')
+
+
+class AsOfIndex:
+
+    """A class that maintains an interval index of reference values
+    and status helper outcomes and, within `as_of`, points the
+    predicates to the index.
+
+    Reference intervals are updated by signals when a reference is
+    saved or deleted; status intervals when the rules for a visit
+    run. A new interval is only opened if the value changed.
+
+    Enabled by the app config's `as_of_index`. Use
+    `build_as_of_index` to seed the index from current data; the
+    index covers as-of datetimes from the first build only.
+
+    For example:
+
+        with as_of_index.as_of(datetime(2017, 3, 1, tzinfo=utc)):
+            outcomes = RuleSet().evaluate(visit=visit)
+    """
+
+    reference_model = 'bcpp_metadata_rules.referenceinterval'
+    status_model = 'bcpp_metadata_rules.statusinterval'
+    build_model = 'bcpp_metadata_rules.asofindexbuild'
+    batch_evaluator_cls = BatchEvaluator
+    reference_models = ['edc_reference.reference']
+    value_fields = [
+        'value_str', 'value_int', 'value_date', 'value_datetime', 'value_uuid']
+    status_helper = 'bcpp_status.status_db_helper.StatusDbHelper'
+    status_names = StatusCache.names
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return app_config.as_of_index
+
+    @property
+    def reference_model_cls(self):
+        return django_apps.get_model(self.reference_model)
+
+    @property
+    def status_model_cls(self):
+        return django_apps.get_model(self.status_model)
+
+    @property
+    def build_model_cls(self):
+        return django_apps.get_model(self.build_model)
+
+    @property
+    def status_helper_cls(self):
+        return import_string(self.status_helper)
+
+    @property
+    def coverage(self):
+        """Returns the datetime of the first build or None.
+
+        Before it, values are only indexed if they changed after
+        the index was enabled.
+        """
+        return self.build_model_cls.objects.values_list(
+            'built_datetime', flat=True).order_by('built_datetime').first()
+
+    @staticmethod
+    def visit_options(visit=None):
+        return dict(
+            subject_identifier=visit.subject_identifier,
+            visit_code=visit.visit_code,
+            visit_code_sequence=getattr(visit, 'visit_code_sequence', None) or 0)
+
+    @property
+    def as_of_datetime(self):
+        """Returns the datetime of the active `as_of` block or None.
+        """
+        return getattr(self._local, 'as_of', None)
+
+    @contextmanager
+    def as_of(self, as_of=None):
+        previous, self._local.as_of = self.as_of_datetime, as_of
+        try:
+            yield self
+        finally:
+            self._local.as_of = previous
+
+    def reference_model_for(self, reference_model_cls=None):
+        """Returns the reference model class or, within `as_of`,
+        an AsOfReferenceModel.
+        """
+        if self.as_of_datetime is None:
+            return reference_model_cls
+        return AsOfReferenceModel(
+            model_cls=self.reference_model_cls, as_of=self.as_of_datetime)
+
+    def status_helper_for(self, status_helper_cls=None):
+        """Returns the status helper class or, within `as_of`,
+        a callable that returns an AsOfStatus.
+        """
+        if self.as_of_datetime is None:
+            return status_helper_cls
+        return lambda visit=None: AsOfStatus(visit=visit, as_of_index=self)
+
+    def update_reference(self, reference=None, deleted=None, now=None):
+        """Closes the open interval of the reference field and, if
+        not deleted, opens one for its value if changed.
+
+        Intervals are keyed as the reference model is unique, by
+        identifier, timepoint, report_datetime, model and field name;
+        an unscheduled visit's reference has the timepoint of the
+        scheduled visit.
+        """
+        now = now or get_utcnow()
+        with transaction.atomic():
+            queryset = self.reference_model_cls.objects.filter(
+                identifier=reference.identifier,
+                timepoint=reference.timepoint,
+                report_datetime=reference.report_datetime,
+                model=reference.model,
+                field_name=reference.field_name,
+                valid_to__isnull=True)
+            values = {name: getattr(reference, name) for name in self.value_fields}
+            if not deleted and queryset.filter(**values).exists():
+                return
+            queryset.update(valid_to=now)
+            if not deleted:
+                self.reference_model_cls.objects.create(
+                    identifier=reference.identifier,
+                    timepoint=reference.timepoint,
+                    report_datetime=reference.report_datetime,
+                    model=reference.model,
+                    field_name=reference.field_name,
+                    valid_from=now,
+                    **values)
+
+    def build(self, reference_model_cls=None, visit_model=None, now=None):
+        """Seeds the index from current data and returns the
+        AsOfIndexBuild.
+
+        Opens an interval, from now, for each current reference value
+        and status helper outcome of each visit not yet indexed. A
+        reference's modified datetime is not when its value was set,
+        so nothing earlier is assumed.
+        """
+        now = now or get_utcnow()
+        reference_model_cls = reference_model_cls or django_apps.get_model(
+            self.reference_models[0])
+        reference_count = self.reference_model_cls.objects.count()
+        for reference in reference_model_cls.objects.all().iterator():
+            self.update_reference(reference=reference, now=now)
+        status_count = self.status_model_cls.objects.count()
+        batch_evaluator = self.batch_evaluator_cls(visit_model=visit_model)
+        for visits in batch_evaluator.contexts(pks=batch_evaluator.visit_pks):
+            for visit in visits:
+                self.record_status(visit=visit, now=now)
+        return self.build_model_cls.objects.create(
+            built_datetime=now,
+            reference_count=self.reference_model_cls.objects.count() - reference_count,
+            status_count=self.status_model_cls.objects.count() - status_count)
+
+    def record_status(self, visit=None, status_helper_cls=None, now=None):
+        """Records the status helper outcomes for the visit, opening
+        an interval for each outcome that changed.
+        """
+        now = now or get_utcnow()
+        status_helper = status_helpers.wrap(
+            status_helper_cls or self.status_helper_cls)(visit=visit)
+        current = {
+            obj.name: obj for obj in self.status_model_cls.objects.filter(
+                valid_to__isnull=True, **self.visit_options(visit))}
+        with transaction.atomic():
+            for name in self.status_names:
+                value = json.dumps(getattr(status_helper, name, None))
+                obj = current.get(name)
+                if obj and obj.value == value:
+                    continue
+                elif obj:
+                    obj.valid_to = now
+                    obj.save(update_fields=['valid_to'])
+                self.status_model_cls.objects.create(
+                    name=name,
+                    value=value,
+                    valid_from=now,
+                    **self.visit_options(visit))
+
+
+as_of_index = AsOfIndex()
+
+
+class AsOfEvaluator:
+
+    """A class that returns the outcomes of a rule set for a visit
+    as they were, or would be, at a point in time.
+
+    Predicates read reference values and status outcomes from the
+    interval index; cached rule results, the monotonic fact index
+    and persisted baseline facts, which only hold current state,
+    are not used.
+
+    For example:
+
+        evaluator = AsOfEvaluator()
+        outcomes = evaluator.evaluate(visit=visit, as_of=report_datetime)
+    """
+
+    as_of_index = as_of_index
+
+    def __init__(self, rule_set=None):
+        self.rule_set = rule_set or RuleSet()
+
+    def evaluate(self, visit=None, as_of=None):
+        """Returns an ordered dictionary of
+        {(target_model, panel_name): Outcome, ...}.
+
+        Raises AsOfIndexError if `as_of` is before the index's
+        coverage, see AsOfIndex.coverage.
+        """
+        coverage = self.as_of_index.coverage
+        if coverage is None or as_of < coverage:
+            raise AsOfIndexError(
+                f'As-of datetime is not covered by the index. Index covers '
+                f'from {coverage}. Got {as_of}. See build_as_of_index.')
+        with self.as_of_index.as_of(as_of), evaluation_scope(visit=visit):
+            return self.rule_set.evaluate(visit=visit)
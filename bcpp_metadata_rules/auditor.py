@@ -0,0 +1,230 @@
+import csv
+
+from collections import Counter, OrderedDict, namedtuple
+from django.apps import apps as django_apps
+from django.db import transaction
+from edc_metadata import KEYED
+
+from .batch import BatchEvaluator, chunked
+from .partitions import PartitionedEvaluator
+from .rule_set import RuleSet
+
+
+Drift = namedtuple(
+    'Drift',
+    'subject_identifier visit_code target_model panel_name '
+    'expected stored rule metadata_pk')
+
+Stored = namedtuple('Stored', 'entry_status pk')
+
+
+class MetadataAuditEvaluator(BatchEvaluator):
+
+    """A batch evaluator that adds the stored metadata of each
+    visit to its outcomes, as {(target_model, panel_name): [Stored, ...]}
+    under `stored_name`.
+
+    Stored metadata is read with one query per metadata model
+    for each batch.
+    """
+
+    crf_metadata_model = 'edc_metadata.crfmetadata'
+    requisition_metadata_model = 'edc_metadata.requisitionmetadata'
+    stored_name = 'stored'
+
+    def stored(self, visits=None):
+        """Returns a dictionary of {visit_id:
+        {(target_model, panel_name): [Stored, ...]}} for the visits.
+
+        Metadata is matched to a visit by subject, visit code and
+        visit code sequence; unscheduled visits share the visit code.
+        """
+        stored = {}
+        visit_ids = {
+            (visit.subject_identifier, visit.visit_code,
+             getattr(visit, 'visit_code_sequence', None) or 0): str(visit.pk)
+            for visit in visits}
+        opts = dict(
+            subject_identifier__in={key[0] for key in visit_ids},
+            visit_code__in={key[1] for key in visit_ids})
+        fields = ['subject_identifier', 'visit_code', 'visit_code_sequence', 'model']
+        crf_rows = django_apps.get_model(self.crf_metadata_model).objects.filter(
+            **opts).values_list(*fields, 'entry_status', 'pk')
+        requisition_rows = django_apps.get_model(
+            self.requisition_metadata_model).objects.filter(**opts).values_list(
+                *fields, 'panel_name', 'entry_status', 'pk')
+        rows = ([(s, v, seq, m, None, e, pk) for s, v, seq, m, e, pk in crf_rows]
+                + list(requisition_rows))
+        for (subject_identifier, visit_code, visit_code_sequence, model, panel_name,
+             entry_status, pk) in rows:
+            visit_id = visit_ids.get(
+                (subject_identifier, visit_code, visit_code_sequence or 0))
+            if visit_id:
+                stored.setdefault(visit_id, {}).setdefault(
+                    (model, panel_name), []).append(Stored(entry_status, str(pk)))
+        return stored
+
+    def evaluate(self, visits=None):
+        stored = self.stored(visits=visits)
+        for visit_outcome in super().evaluate(visits=visits):
+            visit_outcome.outcomes.update({
+                self.stored_name: stored.get(visit_outcome.visit_id, {})})
+            yield visit_outcome
+
+
+class AuditReport:
+
+    """A class that collects the differences between the outcomes
+    of a rule set and the stored metadata.
+
+    Only stored metadata that is not KEYED and for which a rule
+    decides is compared; targets not scheduled for the visit have
+    no stored metadata and are skipped.
+    """
+
+    fieldnames = Drift._fields
+
+    def __init__(self, current=None, stored=None):
+        self.current = current or 'current'
+        self.stored = stored or MetadataAuditEvaluator.stored_name
+        self.drift = []
+        self.errors = []
+        self.visit_count = 0
+        # Counter({(target_model, panel_name, expected, stored): n})
+        self.counts = Counter()
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(visits={self.visit_count}, '
+                f'drift={len(self.drift)}, errors={len(self.errors)})')
+
+    def compare(self, visit_outcome=None):
+        """Returns a list of Drift for one VisitOutcome.
+        """
+        drift = []
+        stored = visit_outcome.outcomes.get(self.stored)
+        for (target_model, panel_name), outcome in visit_outcome.outcomes.get(
+                self.current).items():
+            for obj in stored.get((target_model, panel_name), []):
+                if obj.entry_status not in [KEYED, outcome.entry_status]:
+                    drift.append(Drift(
+                        subject_identifier=visit_outcome.subject_identifier,
+                        visit_code=visit_outcome.visit_code,
+                        target_model=target_model,
+                        panel_name=panel_name,
+                        expected=outcome.entry_status,
+                        stored=obj.entry_status,
+                        rule=outcome.rule,
+                        metadata_pk=obj.pk))
+        return drift
+
+    def add(self, visit_outcome=None):
+        """Adds and returns the drift for one VisitOutcome.
+        """
+        self.visit_count += 1
+        if visit_outcome.error:
+            self.errors.append(visit_outcome)
+            return []
+        drift = self.compare(visit_outcome)
+        self.drift.extend(drift)
+        self.counts.update(
+            [(d.target_model, d.panel_name, d.expected, d.stored) for d in drift])
+        return drift
+
+    def merge(self, report=None):
+        """Adds the drift, errors and counts of another report,
+        e.g. of a partition.
+        """
+        self.visit_count += report.visit_count
+        self.drift.extend(report.drift)
+        self.errors.extend(report.errors)
+        self.counts.update(report.counts)
+
+    def summary(self):
+        """Returns a list of lines summarizing drift per target.
+        """
+        lines = [f'Visits audited: {self.visit_count}. '
+                 f'Drift: {len(self.drift)}. Errors: {len(self.errors)}.']
+        for (target_model, panel_name, expected, stored), count in sorted(
+                self.counts.items(), key=lambda x: -x[1]):
+            target = f'{target_model}.{panel_name}' if panel_name else target_model
+            lines.append(f'  {target}: stored {stored}, expected {expected} ({count})')
+        return lines
+
+
+class MetadataAuditor:
+
+    """A class that evaluates the registered rule groups for every
+    visit and reports where stored CRF and requisition metadata
+    differ from the rules' outcomes.
+
+    Drift is yielded as each batch is evaluated. `repair` updates
+    the drifted metadata in bulk; signals are not sent.
+
+    For example:
+
+        auditor = MetadataAuditor()
+        for drift in auditor.run(processes=4):
+            ...
+        auditor.repair(auditor.report.drift)
+    """
+
+    batch_evaluator_cls = MetadataAuditEvaluator
+    partitioned_evaluator_cls = PartitionedEvaluator
+    report_cls = AuditReport
+
+    def __init__(self, rule_set=None, batch_size=None, visit_model=None):
+        self.rule_set = rule_set or RuleSet()
+        self.batch_evaluator = self.batch_evaluator_cls(
+            rule_sets=[self.rule_set],
+            batch_size=batch_size,
+            visit_model=visit_model)
+        self.report = self.report_cls(current=self.rule_set.name)
+
+    def run(self, pks=None, processes=None):
+        """Yields Drift for the visits, or all visits, if pks is None.
+        """
+        for visit_outcome in self.batch_evaluator.evaluate_parallel(
+                pks=pks, processes=processes):
+            yield from self.report.add(visit_outcome)
+
+    def run_partitioned(self, pks=None, map_areas=None, processes=None,
+                        on_partition=None):
+        """Returns a list of PartitionResult, auditing each community
+        in its own worker task. Drift is added to `report`.
+        """
+        evaluator = self.partitioned_evaluator_cls(
+            batch_evaluator=self.batch_evaluator,
+            report_cls=self.report_cls,
+            report_kwargs=dict(current=self.rule_set.name))
+        report, results = evaluator.run(
+            pks=pks, map_areas=map_areas, processes=processes,
+            on_partition=on_partition)
+        self.report.merge(report)
+        return results
+
+    def repair(self, drift=None):
+        """Sets the entry status of drifted metadata to the expected
+        entry status and returns the number of rows updated.
+
+        Metadata KEYED since the audit is not changed.
+        """
+        pks = OrderedDict()
+        for d in drift:
+            metadata_model = (self.batch_evaluator.crf_metadata_model
+                              if d.panel_name is None
+                              else self.batch_evaluator.requisition_metadata_model)
+            pks.setdefault((metadata_model, d.expected), []).append(d.metadata_pk)
+        updated = 0
+        with transaction.atomic():
+            for (metadata_model, entry_status), metadata_pks in pks.items():
+                model_cls = django_apps.get_model(metadata_model)
+                for batch in chunked(metadata_pks, self.batch_evaluator.batch_size):
+                    updated += model_cls.objects.filter(pk__in=batch).exclude(
+                        entry_status=KEYED).update(entry_status=entry_status)
+        return updated
+
+    def to_csv(self, f=None, drift=None):
+        writer = csv.writer(f)
+        writer.writerow(self.report.fieldnames)
+        for d in drift:
+            writer.writerow(d)
@@ -0,0 +1,88 @@
+from django.apps import apps as django_apps
+from django.core.exceptions import ObjectDoesNotExist
+from edc_metadata import REQUIRED
+
+from .side_effects import side_effects
+from .subject_arrays import subject_arrays
+
+
+class BaselineFactsCache:
+
+    """A class that persists a subject's baseline status facts
+    the first time they are needed for a follow-up visit.
+
+    Follow-up visits then read `defaulter_at_baseline` and
+    `naive_at_baseline` without the status helper walking the
+    baseline history.
+
+    Facts are only cached once the baseline is final, that is, no
+    baseline status CRF is still required; until then the status
+    helper is returned. A cached entry is deleted if a baseline
+    status CRF is edited, see signals.
+    """
+
+    model = 'bcpp_metadata_rules.baselinefacts'
+    crf_metadata_model = 'edc_metadata.crfmetadata'
+    app_label = 'bcpp_subject'
+    baseline_visit_codes = ['T0', 'E0']
+    fact_names = ['defaulter_at_baseline', 'naive_at_baseline']
+    # CRFs the status helper reads baseline status from
+    source_models = [
+        'hivtestinghistory', 'hivtestreview', 'hivresult',
+        'hivresultdocumentation', 'elisahivresult', 'hivcareadherence']
+    reference_models = ['edc_reference.reference']
+    subject_arrays = subject_arrays
+
+    @property
+    def model_cls(self):
+        return django_apps.get_model(self.model)
+
+    @property
+    def crf_metadata_model_cls(self):
+        return django_apps.get_model(self.crf_metadata_model)
+
+    @property
+    def reference_names(self):
+        return [f'{self.app_label}.{model}' for model in self.source_models]
+
+    def get(self, visit=None, status_helper_cls=None):
+        """Returns an object with the baseline facts as attributes.
+        """
+        if visit.visit_code in self.baseline_visit_codes:
+            return status_helper_cls(visit=visit)
+        obj = self.subject_arrays.baseline_facts(visit.subject_identifier)
+        if obj:
+            return obj
+        try:
+            obj = self.model_cls.objects.get(subject_identifier=visit.subject_identifier)
+        except ObjectDoesNotExist:
+            status_helper = status_helper_cls(visit=visit)
+            if not (side_effects.allowed
+                    and self.is_final(visit.subject_identifier)):
+                return status_helper
+            obj, _ = self.model_cls.objects.get_or_create(
+                subject_identifier=visit.subject_identifier,
+                defaults={name: getattr(status_helper, name) for name in self.fact_names})
+        return obj
+
+    def is_final(self, subject_identifier=None):
+        """Returns True if the subject's baseline metadata exists and
+        no baseline status CRF is still required.
+        """
+        metadata = self.crf_metadata_model_cls.objects.filter(
+            subject_identifier=subject_identifier,
+            visit_code__in=self.baseline_visit_codes)
+        return (metadata.exists() and not metadata.filter(
+            model__in=self.reference_names, entry_status=REQUIRED).exists())
+
+    def invalidate(self, reference=None):
+        """Deletes the cached facts if the reference is for a
+        baseline status CRF.
+        """
+        if (reference.timepoint in self.baseline_visit_codes
+                and reference.model in self.reference_names):
+            self.model_cls.objects.filter(
+                subject_identifier=reference.identifier).delete()
+
+
+baseline_facts = BaselineFactsCache()
@@ -0,0 +1,203 @@
+from collections import OrderedDict, namedtuple
+from django.apps import apps as django_apps
+from django.db import connections
+from functools import lru_cache
+from multiprocessing import Pool
+
+from .manifest import REFERENCE
+from .reference_values import reference_values
+from .rule_set import RuleSet
+from .scope import evaluation_scope
+from .subject_arrays import subject_arrays
+from .visit_context import VisitContext
+
+
+VisitOutcome = namedtuple(
+    'VisitOutcome',
+    'visit_id subject_identifier visit_code survey_schedule outcomes error')
+
+
+def chunked(items, size):
+    """Yields lists of at most `size` items.
+    """
+    items = list(items)
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+@lru_cache(maxsize=None)
+def get_rule_set(module_name=None, app_label=None, name=None):
+    """Returns a RuleSet, once per process, for a worker.
+    """
+    if module_name:
+        return RuleSet.from_module(
+            module_name=module_name, app_label=app_label, name=name)
+    return RuleSet(app_label=app_label, name=name)
+
+
+def evaluate_batch(options):
+    """Evaluates a batch of visits in a worker process.
+
+    `options` is a picklable tuple of (evaluator_cls, rule_set specs,
+    visit model, visit pks).
+    """
+    evaluator_cls, specs, visit_model, pks = options
+    rule_sets = [get_rule_set(*spec) for spec in specs]
+    evaluator = evaluator_cls(rule_sets=rule_sets, visit_model=visit_model)
+    return list(evaluator.evaluate_pks(pks))
+
+
+class BatchEvaluator:
+
+    """A class that evaluates one or more rule sets for many visits
+    in batches, optionally spread over processes.
+
+    Nothing is written to the metadata tables.
+
+    For example:
+
+        evaluator = BatchEvaluator(rule_sets=[RuleSet()])
+        for visit_outcome in evaluator.evaluate_parallel(pks, processes=4):
+            visit_outcome.outcomes['current']
+    """
+
+    batch_size = 500
+    visit_model = 'bcpp_subject.subjectvisit'
+    reference_values = reference_values
+    subject_arrays = subject_arrays
+    # set to None to evaluate visit model instances
+    visit_context_cls = VisitContext
+
+    def __init__(self, rule_sets=None, batch_size=None, visit_model=None):
+        self.rule_sets = rule_sets or [RuleSet()]
+        self.batch_size = batch_size or self.batch_size
+        self.visit_model = visit_model or self.visit_model
+        self._reference_collections = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rule_sets={self.rule_sets})'
+
+    @property
+    def visit_model_cls(self):
+        return django_apps.get_model(self.visit_model)
+
+    @property
+    def visit_pks(self):
+        """Returns a list of all visit pks ordered by subject.
+        """
+        return list(self.visit_model_cls.objects.all().order_by(
+            'subject_identifier', 'report_datetime').values_list('pk', flat=True))
+
+    def batches(self, pks=None):
+        """Yields lists of visit model instances.
+        """
+        for batch in chunked(pks, self.batch_size):
+            yield list(self.visit_model_cls.objects.filter(pk__in=batch).order_by(
+                'subject_identifier', 'report_datetime'))
+
+    def contexts(self, pks=None):
+        """Yields lists of visit contexts, without instantiating
+        visit models, or of visit model instances if
+        `visit_context_cls` is None.
+        """
+        if not self.visit_context_cls:
+            yield from self.batches(pks)
+        else:
+            fields = self.visit_context_cls.fields
+            for batch in chunked(pks, self.batch_size):
+                yield [self.visit_context_cls(*values)
+                       for values in self.visit_model_cls.objects.filter(
+                           pk__in=batch).order_by(
+                               'subject_identifier', 'report_datetime').values_list(
+                                   *fields)]
+
+    @property
+    def reference_collections(self):
+        """Returns a list of the predicate collections that declare
+        typed reference values and are used by reference predicates,
+        according to the rule sets' manifests.
+        """
+        if self._reference_collections is None:
+            self._reference_collections = []
+            for rule_set in self.rule_sets:
+                manifest = rule_set.manifest
+                if REFERENCE in manifest.kinds:
+                    for collection in manifest.collections:
+                        if (getattr(collection, 'reference_field_types', None)
+                                and collection not in self._reference_collections):
+                            self._reference_collections.append(collection)
+        return self._reference_collections
+
+    def prepare(self, visits=None):
+        """Hook to warm caches for a batch of visits before the
+        batch is evaluated.
+
+        Within a reference values prefetch, the declared reference
+        values of all visits are loaded with one query per predicate
+        collection.
+        """
+        for collection in self.reference_collections:
+            self.reference_values.preload(
+                visits=visits,
+                reference_model_cls=collection.reference_model_cls,
+                field_types=collection.reference_field_types)
+
+    def evaluate(self, visits=None):
+        """Yields a VisitOutcome for each visit.
+        """
+        with self.reference_values.prefetch():
+            self.prepare(visits=visits)
+            visit_outcomes = [self.evaluate_visit(visit) for visit in visits]
+        yield from visit_outcomes
+
+    def evaluate_pks(self, pks=None):
+        for visits in self.contexts(pks):
+            yield from self.evaluate(visits=visits)
+
+    def evaluate_visit(self, visit=None):
+        """Returns a VisitOutcome with the outcomes of each rule set.
+
+        An exception raised for one visit is returned on the
+        VisitOutcome instead of stopping the batch.
+        """
+        outcomes = OrderedDict()
+        error = None
+        try:
+            with evaluation_scope(visit=visit):
+                for rule_set in self.rule_sets:
+                    outcomes.update({rule_set.name: rule_set.evaluate(visit=visit)})
+        except Exception as e:
+            error = f'{e.__class__.__name__}: {e}'
+        return VisitOutcome(
+            visit_id=str(visit.pk),
+            subject_identifier=visit.subject_identifier,
+            visit_code=visit.visit_code,
+            survey_schedule=visit.survey_schedule,
+            outcomes=outcomes,
+            error=error)
+
+    def evaluate_parallel(self, pks=None, processes=None):
+        """Yields a VisitOutcome for each visit, evaluating batches
+        in a pool of worker processes.
+
+        Rule sets are rebuilt in each worker from their module, so
+        only registered rule sets or those loaded with
+        `RuleSet.from_module` may be evaluated in parallel.
+
+        Per-subject facts are loaded once, before the workers are
+        forked, see SubjectArrays.
+        """
+        pks = self.visit_pks if pks is None else pks
+        if processes == 1:
+            yield from self.evaluate_pks(pks)
+        else:
+            specs = [(rule_set.module_name, rule_set.app_label, rule_set.name)
+                     for rule_set in self.rule_sets]
+            batches = [(self.__class__, specs, self.visit_model, batch)
+                       for batch in chunked(pks, self.batch_size)]
+            with self.subject_arrays.backfill():
+                # forked workers may not share the parent's connections
+                connections.close_all()
+                with Pool(processes=processes) as pool:
+                    for visit_outcomes in pool.imap_unordered(evaluate_batch, batches):
+                        yield from visit_outcomes
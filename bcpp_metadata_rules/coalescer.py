@@ -0,0 +1,207 @@
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.apps import apps as django_apps
+from django.db import transaction
+from functools import partial
+
+from .batch import BatchEvaluator
+
+
+class SyncImport:
+
+    """A class that collects the visits whose metadata rules were
+    triggered during a sync import and runs the rules once per
+    visit, in batches, when the import is done.
+
+    See RuleRunCoalescer.sync_import.
+    """
+
+    batch_size = 500
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or self.batch_size
+        self.visits = OrderedDict()
+        self.errors = []
+        self.run_count = 0
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(visits={len(self.visits)}, '
+                f'errors={len(self.errors)})')
+
+    def add(self, visit=None, evaluator_cls=None, app_label=None):
+        self.visits.update({
+            (visit._meta.label_lower, str(visit.pk)): (evaluator_cls, app_label)})
+
+    def flush(self, batch_evaluator_cls=None):
+        """Runs the rules once for each visit, refetching visits in
+        batches. The reference values of each batch are preloaded,
+        see BatchEvaluator.prepare.
+
+        A failure is recorded in `errors` and does not stop the
+        other visits.
+        """
+        groups = OrderedDict()
+        while self.visits:
+            (visit_model, pk), options = self.visits.popitem(last=False)
+            groups.setdefault((visit_model, ) + options, []).append(pk)
+        for (visit_model, evaluator_cls, app_label), pks in groups.items():
+            batch_evaluator = batch_evaluator_cls(
+                visit_model=visit_model, batch_size=self.batch_size)
+            for visits in batch_evaluator.batches(pks=pks):
+                with batch_evaluator.reference_values.prefetch():
+                    batch_evaluator.prepare(visits=visits)
+                    for visit in visits:
+                        self.run(visit, visit_model=visit_model,
+                                 evaluator_cls=evaluator_cls, app_label=app_label)
+
+    def run(self, visit=None, visit_model=None, evaluator_cls=None, app_label=None):
+        try:
+            with transaction.atomic():
+                evaluator_cls(visit=visit, app_label=app_label).run()
+        except Exception as e:
+            self.errors.append(
+                (visit_model, str(visit.pk), f'{e.__class__.__name__}: {e}'))
+        self.run_count += 1
+
+
+class RuleRunCoalescer:
+
+    """A class that collects the visits whose metadata rules were
+    triggered within a transaction and runs the rules once per
+    visit when the transaction commits.
+
+    Outside of an atomic block there is nothing to coalesce and
+    `add` returns False so the caller runs the rules immediately,
+    unless in `sync_import`.
+    """
+
+    batch_evaluator_cls = BatchEvaluator
+    sync_import_cls = SyncImport
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return (app_config.coalesce_rule_runs
+                or getattr(self._local, 'depth', 0) > 0
+                or self.importing is not None)
+
+    @property
+    def importing(self):
+        """Returns the active SyncImport or None.
+        """
+        return getattr(self._local, 'importing', None)
+
+    def pending(self, using=None):
+        """Returns the ordered dictionary of dirty visits for
+        the connection.
+        """
+        try:
+            return self._local.pending.setdefault(using, OrderedDict())
+        except AttributeError:
+            self._local.pending = {}
+            return self.pending(using=using)
+
+    def add(self, visit=None, evaluator_cls=None, app_label=None, using=None):
+        """Marks the visit as dirty and returns True, or returns False
+        if not in a transaction.
+        """
+        if self.importing is not None:
+            self.importing.add(
+                visit=visit, evaluator_cls=evaluator_cls, app_label=app_label)
+            return True
+        if not transaction.get_connection(using).in_atomic_block:
+            return False
+        if not self.flush_registered(using=using):
+            # a new transaction; visits of a rolled back one are discarded
+            self.discard(using=using)
+            self._local.flushes[using] = partial(self.flush, using=using)
+            transaction.on_commit(self._local.flushes[using], using=using)
+        key = (visit._meta.label_lower, visit.pk)
+        pending = self.pending(using=using)
+        pending.pop(key, None)
+        pending.update({key: (visit, evaluator_cls, app_label)})
+        return True
+
+    def flush_registered(self, using=None):
+        """Returns True if `flush` is registered to run when the
+        current transaction commits.
+
+        Django drops on_commit functions of a transaction or savepoint
+        that is rolled back.
+        """
+        try:
+            flush = self._local.flushes.get(using)
+        except AttributeError:
+            self._local.flushes = {}
+            flush = None
+        return flush is not None and any(
+            func is flush for _, func in transaction.get_connection(using).run_on_commit)
+
+    def discard(self, using=None):
+        """Discards the dirty visits for the connection.
+        """
+        self.pending(using=using).clear()
+
+    def flush(self, using=None):
+        """Runs the rules once for each dirty visit.
+
+        Visits are refetched so that the rules see the committed
+        state; a visit rolled back in an earlier transaction is
+        skipped.
+        """
+        pending = self.pending(using=using)
+        while pending:
+            _, (visit, evaluator_cls, app_label) = pending.popitem(last=False)
+            visit = visit.__class__.objects.filter(pk=visit.pk).first()
+            if visit:
+                evaluator_cls(visit=visit, app_label=app_label).run()
+
+    @contextmanager
+    def coalesce(self, using=None):
+        """Context manager that coalesces rule runs for the block
+        regardless of the app config setting.
+        """
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        try:
+            with transaction.atomic(using=using):
+                yield self
+        except Exception:
+            if not transaction.get_connection(using).in_atomic_block:
+                self.discard(using=using)
+            raise
+        finally:
+            self._local.depth -= 1
+
+    @contextmanager
+    def sync_import(self, batch_size=None):
+        """Context manager that suppresses rule runs for the block,
+        e.g. while transactions from a field device are consumed,
+        and then runs the rules once for each affected visit.
+
+        Yields the SyncImport; check its `errors` after the block.
+
+        For example:
+
+            with coalescer.sync_import() as sync_import:
+                consume_incoming_transactions()
+            for visit_model, pk, error in sync_import.errors:
+                ...
+        """
+        if self.importing is not None:
+            yield self.importing
+        else:
+            self._local.importing = self.sync_import_cls(batch_size=batch_size)
+            try:
+                yield self._local.importing
+            finally:
+                # visits saved before an import error still get their rule runs
+                sync_import, self._local.importing = self._local.importing, None
+                sync_import.flush(batch_evaluator_cls=self.batch_evaluator_cls)
+
+
+coalescer = RuleRunCoalescer()
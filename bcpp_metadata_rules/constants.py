@@ -0,0 +1,11 @@
+PENDING = 'pending'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+QUEUE_STATUS = (
+    (PENDING, 'Pending'),
+    (PROCESSING, 'Processing'),
+    (DONE, 'Done'),
+    (FAILED, 'Failed'),
+)
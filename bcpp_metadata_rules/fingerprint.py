@@ -0,0 +1,121 @@
+import hashlib
+import inspect
+
+from django.apps import apps as django_apps
+from edc_metadata_rules import P, PF
+from functools import lru_cache
+from pkg_resources import DistributionNotFound, get_distribution
+
+# distributions whose code, other than the predicates themselves,
+# decides rule results, e.g. the status helper.
+salt_distributions = ['bcpp-metadata-rules', 'bcpp-status']
+
+
+@lru_cache(maxsize=None)
+def deploy_salt():
+    """Returns the app config's `rule_fingerprint_salt` or the
+    installed versions of `salt_distributions`, once per process.
+
+    Code a predicate calls is not part of its digest; a deployment
+    that upgrades it changes the salt instead.
+    """
+    app_config = django_apps.get_app_config('bcpp_metadata_rules')
+    if app_config.rule_fingerprint_salt is not None:
+        return app_config.rule_fingerprint_salt
+    versions = []
+    for name in salt_distributions:
+        try:
+            versions.append(f'{name}=={get_distribution(name).version}')
+        except DistributionNotFound:
+            pass
+    return ','.join(versions)
+
+
+def const_digest(const=None):
+    """Returns a repr of a code constant that is the same in every
+    process.
+
+    The repr of a frozenset follows the order of its members' hashes,
+    which for strings is randomized per process; members are sorted.
+    """
+    if isinstance(const, frozenset):
+        return f'frozenset({sorted(const_digest(member) for member in const)})'
+    elif isinstance(const, tuple):
+        return f'({", ".join(const_digest(member) for member in const)},)'
+    return repr(const)
+
+
+def code_digest(code=None):
+    """Returns a list of the parts of a code object, and of the
+    code objects nested in it, that change when the code is edited.
+    """
+    parts = [code.co_code, code.co_names]
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            parts.extend(code_digest(const))
+        else:
+            parts.append(const_digest(const))
+    return parts
+
+
+def predicate_digest(predicate=None):
+    """Returns a list of the parts of a predicate that change
+    when the predicate is edited.
+
+    For a function or method, the parts are its name and the
+    code of the function itself, not of functions it calls.
+    """
+    if isinstance(predicate, P):
+        return ['P', predicate.attr, predicate.operator, repr(predicate.expected_value)]
+    elif isinstance(predicate, PF):
+        return ['PF', list(predicate.attrs)] + code_digest(predicate.func.__code__)
+    func = inspect.unwrap(getattr(predicate, '__func__', predicate))
+    try:
+        return [func.__qualname__] + code_digest(func.__code__)
+    except AttributeError:
+        # a callable object; may not be stable across processes
+        return [repr(predicate)]
+
+
+def rule_digest(rule=None):
+    digest = [
+        str(rule),
+        rule.__class__.__name__,
+        rule._logic.consequence,
+        rule._logic.alternative,
+        rule.target_models,
+        # a lazily imported panel by its path, so that it is not imported
+        [getattr(panel, 'dotted_path', None) or panel.name
+         for panel in getattr(rule, 'target_panels', None) or []],
+        getattr(rule, 'survey_schedules', []),
+        getattr(rule, 'exclude_survey_schedules', [])]
+    return digest + predicate_digest(rule._logic.predicate)
+
+
+def sha256(parts=None):
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part if isinstance(part, bytes) else repr(part).encode())
+    return hasher.hexdigest()
+
+
+def rule_fingerprint(rule=None):
+    """Returns a stable hash of a rule's definition, including the
+    code of its predicate, salted per deployment, see `deploy_salt`.
+    """
+    return sha256([deploy_salt()] + rule_digest(rule))
+
+
+def rule_groups_fingerprint(rule_groups=None):
+    """Returns a stable hash of the definitions of all rules of
+    the rule groups, in order.
+    """
+    parts = []
+    for rule_group in rule_groups:
+        options = rule_group._meta.options
+        parts.extend([
+            rule_group.__name__,
+            options.get('source_model'),
+            options.get('requisition_model')])
+        parts.extend(rule_fingerprint(rule) for rule in rule_group.get_rules())
+    return sha256(parts)
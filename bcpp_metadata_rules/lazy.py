@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+
+def lazy_import(dotted_path=None):
+    """Returns a proxy for the object at `dotted_path` that is
+    imported on first use, e.g. of an attribute.
+
+    The proxy compares and hashes as the object. `dotted_path` is
+    readable on the proxy without importing the object.
+    """
+    obj = SimpleLazyObject(lambda: import_string(dotted_path))
+    obj.__dict__['dotted_path'] = dotted_path
+    return obj
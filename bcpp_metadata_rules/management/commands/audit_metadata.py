@@ -0,0 +1,78 @@
+import csv
+
+from django.core.management.base import BaseCommand
+from functools import partial
+
+from ...auditor import MetadataAuditor
+from ...rule_set import RuleSet
+
+
+class Command(BaseCommand):
+
+    help = ('Evaluates the registered metadata rules for every visit and '
+            'reports where stored CRF and requisition metadata differ. '
+            'Metadata is only updated with --repair.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app-label', dest='app_label', default=RuleSet.app_label)
+        parser.add_argument(
+            '--processes', dest='processes', type=int, default=None)
+        parser.add_argument(
+            '--batch-size', dest='batch_size', type=int, default=None)
+        parser.add_argument(
+            '--csv', dest='csv', default=None,
+            help='Path of a CSV file to stream drift to. Default: stdout, '
+                 'before the summary.')
+        parser.add_argument(
+            '--partition', dest='partition', action='store_true', default=False,
+            help='Audit each community (map area) in its own worker task.')
+        parser.add_argument(
+            '--map-area', dest='map_areas', action='append', default=None,
+            help='Only audit this community. Implies --partition. Repeatable.')
+        parser.add_argument(
+            '--repair', dest='repair', action='store_true', default=False,
+            help='Set drifted metadata to the expected entry status.')
+
+    def handle(self, *args, **options):
+        auditor = MetadataAuditor(
+            rule_set=RuleSet(app_label=options.get('app_label')),
+            batch_size=options.get('batch_size'))
+        f = open(options.get('csv'), 'w', newline='') if options.get('csv') else None
+        try:
+            writer = csv.writer(f or self.stdout)
+            writer.writerow(auditor.report.fieldnames)
+            if options.get('partition') or options.get('map_areas'):
+                results = auditor.run_partitioned(
+                    map_areas=options.get('map_areas'),
+                    processes=options.get('processes'),
+                    on_partition=partial(self.write_partition, writer=writer))
+                failed = [result for result in results if result.failed]
+            else:
+                for drift in auditor.run(processes=options.get('processes')):
+                    writer.writerow(drift)
+                failed = []
+        finally:
+            if f:
+                f.close()
+        for line in auditor.report.summary():
+            self.stdout.write(line)
+        for visit_outcome in auditor.report.errors:
+            self.stderr.write(
+                f'{visit_outcome.subject_identifier} {visit_outcome.visit_code}: '
+                f'{visit_outcome.error}')
+        for result in failed:
+            self.stderr.write(f'{result.map_area}: FAILED\n{result.error}')
+        if options.get('repair'):
+            updated = auditor.repair(auditor.report.drift)
+            self.stdout.write(f'Repaired {updated} metadata.')
+
+    def write_partition(self, result=None, writer=None):
+        """Streams the drift of a partition as it completes.
+        """
+        if not result.failed:
+            writer.writerows(result.report.drift)
+        status = 'FAILED' if result.failed else 'done'
+        self.stderr.write(
+            f'{result.map_area}: {status}, {result.visit_count} visits '
+            f'in {result.elapsed:.1f}s')
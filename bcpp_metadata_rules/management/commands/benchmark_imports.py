@@ -0,0 +1,66 @@
+import json
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from statistics import median
+
+
+SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from bcpp_metadata_rules.rule_set import RuleSet
+rule_set = RuleSet()
+t2 = time.perf_counter()
+print(json.dumps({'setup': t1 - t0, 'rule_set': t2 - t1}))
+"""
+
+
+class Command(BaseCommand):
+
+    help = ('Measures, in fresh interpreters, the time to set up Django, '
+            'which imports the metadata rules, and to build the rule set.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', dest='repeat', type=int, default=5)
+        parser.add_argument(
+            '--importtime', dest='importtime', type=int, default=0,
+            help='Also list the N slowest imports (cumulative). Python 3.7+.')
+
+    def run_script(self, *args):
+        completed = subprocess.run(
+            [sys.executable, *args, '-c', SCRIPT],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if completed.returncode:
+            raise CommandError(completed.stderr)
+        return completed
+
+    def handle(self, *args, **options):
+        timings = []
+        for _ in range(options.get('repeat')):
+            timings.append(json.loads(
+                self.run_script().stdout.strip().splitlines()[-1]))
+        for name in ['setup', 'rule_set']:
+            values = [timing[name] for timing in timings]
+            self.stdout.write(
+                f'{name}: median {median(values) * 1000:.1f}ms, '
+                f'min {min(values) * 1000:.1f}ms ({len(values)} runs)')
+        if options.get('importtime'):
+            if sys.version_info < (3, 7):
+                raise CommandError('-X importtime requires Python 3.7+.')
+            imports = []
+            for line in self.run_script('-X', 'importtime').stderr.splitlines():
+                # e.g. 'import time:       341 |       1270 |   bcpp_metadata_rules'
+                try:
+                    _, cumulative_us, module = line.split(':', 1)[1].split('|')
+                    imports.append((int(cumulative_us), module.strip()))
+                except (IndexError, ValueError):
+                    continue
+            for cumulative_us, module in sorted(imports, reverse=True)[
+                    :options.get('importtime')]:
+                self.stdout.write(f'{cumulative_us / 1000:>10.1f}ms  {module}')
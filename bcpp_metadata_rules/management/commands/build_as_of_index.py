@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...as_of import as_of_index
+
+
+class Command(BaseCommand):
+
+    help = ('Seeds the as-of interval index from the current reference '
+            'values and status helper outcomes of every visit.')
+
+    def handle(self, *args, **options):
+        build = as_of_index.build()
+        self.stdout.write(
+            f'reference intervals opened: {build.reference_count}, '
+            f'status intervals opened: {build.status_count}, '
+            f'covered from: {build.built_datetime}')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...metadata_matrix import MetadataMatrix, MetadataMatrixError
+from ...rule_set import RuleSet
+
+
+class Command(BaseCommand):
+
+    help = ('Evaluates the registered metadata rules for every visit '
+            'and writes the outcomes as a bitset matrix. '
+            'Metadata is not updated.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', help='Path of the JSON file to write the matrix to.')
+        parser.add_argument(
+            '--app-label', dest='app_label', default=RuleSet.app_label)
+        parser.add_argument(
+            '--processes', dest='processes', type=int, default=None)
+        parser.add_argument(
+            '--batch-size', dest='batch_size', type=int, default=None)
+        parser.add_argument(
+            '--count', dest='count', nargs='*', default=None,
+            help='Target models or panel names. Reports per visit code how '
+                 'many visits require all of them.')
+
+    def handle(self, *args, **options):
+        matrix = MetadataMatrix.from_rule_set(
+            rule_set=RuleSet(app_label=options.get('app_label')),
+            processes=options.get('processes'),
+            batch_size=options.get('batch_size'))
+        with open(options.get('output'), 'w') as f:
+            matrix.dump(f)
+        self.stdout.write(
+            f'Wrote {len(matrix.rows)} visits x {len(matrix.targets)} targets '
+            f'to {options.get("output")}. Errors: {len(matrix.errors)}.')
+        if options.get('count'):
+            try:
+                counts = matrix.counts_by_visit_code(*options.get('count'))
+            except MetadataMatrixError as e:
+                raise CommandError(e)
+            for visit_code, count in counts.items():
+                self.stdout.write(f'{visit_code}: {count}')
@@ -0,0 +1,51 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...requisition_forecast import RequisitionForecast
+
+
+class Command(BaseCommand):
+
+    help = ('Forecasts the requisition panels required per community and '
+            'day for upcoming appointments. Metadata is not updated.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', dest='start', default=None,
+            help='First day to forecast as YYYY-MM-DD. Default: today.')
+        parser.add_argument(
+            '--days', dest='days', type=int, default=7)
+        parser.add_argument(
+            '--app-label', dest='app_label', default=RequisitionForecast.app_label)
+        parser.add_argument(
+            '--batch-size', dest='batch_size', type=int, default=None)
+        parser.add_argument(
+            '--csv', dest='csv', default=None,
+            help='Path of a CSV file to write the forecast to.')
+
+    def handle(self, *args, **options):
+        start = None
+        if options.get('start'):
+            try:
+                start = timezone.make_aware(
+                    datetime.strptime(options.get('start'), '%Y-%m-%d'))
+            except ValueError as e:
+                raise CommandError(e)
+        forecast = RequisitionForecast(
+            start=start,
+            days=options.get('days'),
+            app_label=options.get('app_label'),
+            batch_size=options.get('batch_size'))
+        demand = forecast.run()
+        for row in demand:
+            self.stdout.write(
+                f'{row.map_area} {row.appt_date} {row.panel_name}: {row.count}')
+        for visit_outcome in forecast.errors:
+            self.stderr.write(
+                f'{visit_outcome.subject_identifier} {visit_outcome.visit_code}: '
+                f'{visit_outcome.error}')
+        if options.get('csv'):
+            with open(options.get('csv'), 'w', newline='') as f:
+                forecast.to_csv(f, demand=demand)
+            self.stdout.write(f'Wrote {len(demand)} rows to {options.get("csv")}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from ...rule_set import RuleSet
+
+
+class Command(BaseCommand):
+
+    help = ('Prints the data sources of the predicate of each registered '
+            'metadata rule, declared or detected.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app-label', dest='app_label', default=RuleSet.app_label)
+
+    def handle(self, *args, **options):
+        manifest = RuleSet(app_label=options.get('app_label')).manifest
+        for line in manifest.summary():
+            self.stdout.write(line)
+        reference_names = manifest.reference_names
+        self.stdout.write(
+            'Reference names: ' + (', '.join(sorted(reference_names))
+                                   if reference_names is not None else 'not known'))
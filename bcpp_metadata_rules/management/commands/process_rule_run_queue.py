@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...metadata_rule_evaluator import MetadataRuleEvaluator
+from ...rule_run_queue import rule_run_queue
+
+
+class Command(BaseCommand):
+
+    help = 'Runs the metadata rules for visits queued by the rule run queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', dest='batch_size', type=int, default=100)
+        parser.add_argument(
+            '--sleep', dest='sleep', type=float, default=2.0,
+            help='Seconds to wait when the queue is empty.')
+        parser.add_argument(
+            '--once', dest='once', action='store_true', default=False,
+            help='Drain the queue and exit.')
+        parser.add_argument(
+            '--timeout', dest='timeout', type=int, default=None,
+            help='Seconds after which an item still processing is re-queued.')
+
+    def handle(self, *args, **options):
+        while True:
+            reclaimed = rule_run_queue.reclaim(timeout=options.get('timeout'))
+            if reclaimed:
+                self.stdout.write(f'Re-queued {reclaimed} timed out items.')
+            items = rule_run_queue.claim(batch_size=options.get('batch_size'))
+            if items:
+                rule_run_queue.process(
+                    items=items, evaluator_cls=MetadataRuleEvaluator)
+                self.stdout.write(f'Processed {len(items)} queued visits.')
+            elif options.get('once'):
+                break
+            else:
+                time.sleep(options.get('sleep'))
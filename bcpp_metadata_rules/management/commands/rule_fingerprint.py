@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ...fingerprint import rule_fingerprint
+from ...rule_set import RuleSet
+
+
+class Command(BaseCommand):
+
+    help = ('Prints the fingerprint of the registered metadata rules and, '
+            'with --verbosity 2, of each rule.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app-label', dest='app_label', default=RuleSet.app_label)
+
+    def handle(self, *args, **options):
+        rule_set = RuleSet(app_label=options.get('app_label'))
+        self.stdout.write(f'{rule_set.app_label}: {rule_set.fingerprint}')
+        if options.get('verbosity') > 1:
+            for rule in rule_set.rules:
+                self.stdout.write(f'  {rule_fingerprint(rule)} {rule}')
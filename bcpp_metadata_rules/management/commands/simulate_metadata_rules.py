@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...rule_set import RuleSet, RuleSetError
+from ...simulator import RuleSetSimulator
+
+
+class Command(BaseCommand):
+
+    help = ('Evaluates the current and a proposed set of metadata rules '
+            'for every visit and reports where the outcomes differ. '
+            'Metadata is not updated.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'proposed',
+            help='Dotted path of the module declaring the proposed rule groups.')
+        parser.add_argument(
+            '--current', dest='current', default=None,
+            help='Dotted path of a module to use instead of the registered rules.')
+        parser.add_argument(
+            '--app-label', dest='app_label', default=RuleSet.app_label)
+        parser.add_argument(
+            '--processes', dest='processes', type=int, default=None)
+        parser.add_argument(
+            '--batch-size', dest='batch_size', type=int, default=None)
+        parser.add_argument(
+            '--csv', dest='csv', default=None,
+            help='Path of a CSV file to write each flip to.')
+        parser.add_argument(
+            '--partition', dest='partition', action='store_true', default=False,
+            help='Evaluate each community (map area) in its own worker task.')
+        parser.add_argument(
+            '--map-area', dest='map_areas', action='append', default=None,
+            help='Only evaluate this community. Implies --partition. Repeatable.')
+
+    def handle(self, *args, **options):
+        app_label = options.get('app_label')
+        try:
+            proposed = RuleSet.from_module(
+                module_name=options.get('proposed'), app_label=app_label)
+            if options.get('current'):
+                current = RuleSet.from_module(
+                    module_name=options.get('current'), app_label=app_label)
+            else:
+                current = RuleSet(app_label=app_label)
+        except RuleSetError as e:
+            raise CommandError(e)
+        simulator = RuleSetSimulator(
+            current=current, proposed=proposed,
+            batch_size=options.get('batch_size'))
+        if options.get('partition') or options.get('map_areas'):
+            report, results = simulator.run_partitioned(
+                map_areas=options.get('map_areas'),
+                processes=options.get('processes'),
+                on_partition=self.write_partition)
+            failed = [result for result in results if result.failed]
+        else:
+            report = simulator.run(processes=options.get('processes'))
+            failed = []
+        for line in report.summary():
+            self.stdout.write(line)
+        for visit_outcome in report.errors:
+            self.stderr.write(
+                f'{visit_outcome.subject_identifier} {visit_outcome.visit_code}: '
+                f'{visit_outcome.error}')
+        for result in failed:
+            self.stderr.write(f'{result.map_area}: FAILED\n{result.error}')
+        if options.get('csv'):
+            with open(options.get('csv'), 'w', newline='') as f:
+                report.to_csv(f)
+            self.stdout.write(f'Wrote {len(report.flips)} flips to {options.get("csv")}')
+
+    def write_partition(self, result=None):
+        status = 'FAILED' if result.failed else 'done'
+        self.stdout.write(
+            f'{result.map_area}: {status}, {result.visit_count} visits '
+            f'in {result.elapsed:.1f}s')
@@ -0,0 +1,38 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...warm_up import CacheWarmUp
+
+
+class Command(BaseCommand):
+
+    help = ('Precomputes the per-subject status facts and indexes the '
+            'metadata rules need for the day\'s new appointments.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', dest='start', default=None,
+            help='First day as YYYY-MM-DD. Default: now.')
+        parser.add_argument(
+            '--days', dest='days', type=int, default=1)
+        parser.add_argument(
+            '--batch-size', dest='batch_size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        start = None
+        if options.get('start'):
+            try:
+                start = timezone.make_aware(
+                    datetime.strptime(options.get('start'), '%Y-%m-%d'))
+            except ValueError as e:
+                raise CommandError(e)
+        warm_up = CacheWarmUp(
+            start=start,
+            days=options.get('days'),
+            batch_size=options.get('batch_size'))
+        counts = warm_up.run()
+        for name in ['visits', 'monotonic_facts', 'baseline_facts', 'statuses']:
+            self.stdout.write(f'{name}: {counts[name]}')
+        for subject_identifier, visit_code, error in warm_up.errors:
+            self.stderr.write(f'{subject_identifier} {visit_code}: {error}')
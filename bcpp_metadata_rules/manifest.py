@@ -0,0 +1,194 @@
+import dis
+import inspect
+
+from collections import OrderedDict, namedtuple
+from edc_metadata_rules import P, PF
+
+
+STATUS = 'status'
+REGISTRATION = 'registration'
+REFERENCE = 'reference'
+VISIT = 'visit'
+# fields of the rule group's source model instance, e.g. for P and PF
+SOURCE = 'source'
+
+Source = namedtuple('Source', 'kind name field_name')
+
+
+def status(name=None):
+    return Source(STATUS, name, None)
+
+
+def registration(field_name=None):
+    return Source(REGISTRATION, 'edc_registration.registeredsubject', field_name)
+
+
+def reference(name=None, field_name=None):
+    return Source(REFERENCE, name, field_name)
+
+
+def visit_field(field_name=None):
+    return Source(VISIT, None, field_name)
+
+
+def depends_on(*sources):
+    """Decorator that declares the data sources of a predicate,
+    e.g.:
+
+        @depends_on(status('final_hiv_status'), visit_field('survey_schedule'))
+        def func_requires_hic_enrollment(self, visit, **kwargs):
+            ...
+
+    The function itself is returned; see PredicateManifest.
+    """
+    def decorator(func):
+        func.sources = tuple(sources)
+        return func
+    return decorator
+
+
+# names used by predicates of Predicates for each kind of source,
+# for predicates that do not declare their sources.
+DETECTED_NAMES = {
+    'status_helper_cls': STATUS,
+    'baseline_facts': STATUS,
+    'gender': REGISTRATION,
+    'registered_subject_model_cls': REGISTRATION,
+    'baseline': STATUS,
+    'value': REFERENCE,
+    'has_value': REFERENCE,
+    'exists': REFERENCE,
+    'exists_any': REFERENCE,
+    'reference_model_cls': REFERENCE}
+
+# attributes of a predicate collection that are not data sources
+IGNORED_NAMES = {
+    'app_label', 'as_of', 'names', 'visit_model', 'reference_models',
+    'reference_field_types', 'reference_value_fields', 'requisition_panels'}
+
+
+def detect(func=None):
+    """Returns a tuple of the sources of an undeclared predicate
+    function, detected from its code.
+
+    Detected reference and status sources are not named. Any other
+    attribute of `self`, e.g. a helper method, may read anything and
+    is detected as an unnamed reference source.
+    """
+    sources = OrderedDict()
+    previous = None
+    for instruction in dis.get_instructions(func):
+        if instruction.opname in ['LOAD_ATTR', 'LOAD_METHOD']:
+            kind = DETECTED_NAMES.get(instruction.argval)
+            if kind:
+                sources.update({Source(kind, None, None): None})
+            elif (previous and previous.opname == 'LOAD_FAST'
+                    and previous.argval == 'self'
+                    and instruction.argval not in IGNORED_NAMES):
+                sources.update({Source(REFERENCE, None, None): None})
+            if previous and previous.opname == 'LOAD_FAST' and previous.argval == 'visit':
+                sources.update({visit_field(instruction.argval): None})
+        previous = instruction
+    return tuple(sources)
+
+
+class PredicateManifest:
+
+    """A class of the data sources of the predicates of a list of
+    rules.
+
+    The manifest is used to schedule work by kind of source, e.g.
+    the batch evaluator prefetches the declared reference values of
+    a batch of visits with one query, and the rule result cache is
+    only invalidated by references the rules read.
+
+    For example:
+
+        manifest = PredicateManifest(rules=RuleSet().rules)
+        manifest.kinds
+        >>> {'reference', 'status', 'registration', 'visit', 'source'}
+    """
+
+    def __init__(self, rules=None):
+        self._rules = list(rules or [])
+        self.rules = OrderedDict()
+        for rule in self._rules:
+            self.rules.update({str(rule): self.sources(rule)})
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rules={len(self.rules)})'
+
+    @staticmethod
+    def sources(rule=None):
+        """Returns a tuple of the sources of a rule's predicate.
+        """
+        predicate = rule._logic.predicate
+        if isinstance(predicate, P):
+            return (Source(SOURCE, rule.source_model, predicate.attr), )
+        elif isinstance(predicate, PF):
+            return tuple(Source(SOURCE, rule.source_model, attr)
+                         for attr in predicate.attrs)
+        func = inspect.unwrap(getattr(predicate, '__func__', predicate))
+        try:
+            return func.sources
+        except AttributeError:
+            try:
+                return detect(func)
+            except TypeError:
+                # a callable object
+                return (Source(REFERENCE, None, None), Source(STATUS, None, None))
+
+    @property
+    def kinds(self):
+        return {source.kind for sources in self.rules.values() for source in sources}
+
+    def by_kind(self, kind=None):
+        """Returns an ordered dictionary of {rule_name: sources} of the
+        rules with a source of this kind.
+        """
+        return OrderedDict(
+            (name, sources) for name, sources in self.rules.items()
+            if kind in [source.kind for source in sources])
+
+    @property
+    def reference_names(self):
+        """Returns the set of reference names read by the rules,
+        including source models and, if any reference is read, the
+        visit model of each predicate collection, or None if any is
+        not known.
+        """
+        names = set()
+        for sources in self.rules.values():
+            for source in sources:
+                if source.kind in [REFERENCE, SOURCE]:
+                    if source.name is None:
+                        return None
+                    names.add(source.name)
+        if REFERENCE in self.kinds:
+            names.update(
+                collection.visit_model for collection in self.collections
+                if getattr(collection, 'visit_model', None))
+        return names
+
+    @property
+    def collections(self):
+        """Returns a list of the predicate collection instances of
+        the rules' predicates, e.g. [Predicates()].
+        """
+        collections = []
+        for rule in self._rules:
+            collection = getattr(rule._logic.predicate, '__self__', None)
+            if collection is not None and collection not in collections:
+                collections.append(collection)
+        return collections
+
+    def summary(self):
+        """Returns a list of lines, one per rule.
+        """
+        lines = []
+        for name, sources in self.rules.items():
+            described = ', '.join(
+                '.'.join(str(part) for part in source if part is not None)
+                for source in sources) or 'none'
+            lines.append(f'{name}: {described}')
+        return lines
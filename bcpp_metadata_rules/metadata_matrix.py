@@ -0,0 +1,188 @@
+import json
+
+from collections import OrderedDict, defaultdict, namedtuple
+from edc_metadata import REQUIRED
+
+from .batch import BatchEvaluator
+from .rule_set import RuleSet
+
+
+MatrixRow = namedtuple('MatrixRow', 'visit_id subject_identifier visit_code')
+
+
+def bit_count(bits):
+    return bin(bits).count('1')
+
+
+def set_bit(bitmap=None, index=None):
+    """Sets bit `index` of a little-endian bytearray bitmap.
+    """
+    position = index >> 3
+    if position >= len(bitmap):
+        bitmap.extend(bytes(position - len(bitmap) + 1))
+    bitmap[position] |= 1 << (index & 7)
+
+
+class MetadataMatrixError(Exception):
+    pass
+
+
+class MetadataMatrix:
+
+    """A class that holds computed rule outcomes as a matrix of
+    visits x targets packed into bitsets.
+
+    Each row is a visit. For each target, (target_model, panel_name),
+    and entry status there is one int whose bit `n` is set if the
+    entry status of row `n` is that entry status. Counts and
+    intersections are bitwise operations on ints; the metadata
+    tables are not queried.
+
+    Rows are added to bytearray bitmaps and converted to ints once,
+    when first queried.
+
+    For example:
+
+        matrix = MetadataMatrix.from_rule_set(RuleSet(), processes=4)
+        matrix.count(
+            'bcpp_subject.pimacd4', 'Viral Load', visit_code='T1')
+    """
+
+    def __init__(self, targets=None, rule_set_name=None):
+        self.targets = list(targets or [])
+        self.rule_set_name = rule_set_name or 'current'
+        self.rows = []
+        self.errors = []
+        # {(target_model, panel_name, entry_status): bitmap}
+        self._bitmaps = defaultdict(bytearray)
+        # {visit_code: bitmap}
+        self._visit_code_bitmaps = defaultdict(bytearray)
+        self._bits = None
+        self._visit_codes = None
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(rows={len(self.rows)}, '
+                f'targets={len(self.targets)})')
+
+    @classmethod
+    def from_rule_set(cls, rule_set=None, pks=None, processes=None,
+                      batch_size=None, visit_model=None):
+        """Returns a matrix of the rule set's outcomes for the visits,
+        or all visits if pks is None.
+        """
+        rule_set = rule_set or RuleSet()
+        matrix = cls(targets=rule_set.targets, rule_set_name=rule_set.name)
+        batch_evaluator = BatchEvaluator(
+            rule_sets=[rule_set], batch_size=batch_size, visit_model=visit_model)
+        for visit_outcome in batch_evaluator.evaluate_parallel(
+                pks=pks, processes=processes):
+            matrix.add(visit_outcome)
+        return matrix
+
+    def add(self, visit_outcome=None):
+        """Adds a row for a VisitOutcome.
+        """
+        if visit_outcome.error:
+            self.errors.append(visit_outcome)
+            return
+        index = len(self.rows)
+        self.rows.append(MatrixRow(
+            visit_id=visit_outcome.visit_id,
+            subject_identifier=visit_outcome.subject_identifier,
+            visit_code=visit_outcome.visit_code))
+        set_bit(self._visit_code_bitmaps[visit_outcome.visit_code], index)
+        for target, outcome in visit_outcome.outcomes.get(self.rule_set_name).items():
+            if target not in self.targets:
+                self.targets.append(target)
+            set_bit(self._bitmaps[target + (outcome.entry_status, )], index)
+        self._bits = None
+        self._visit_codes = None
+
+    @property
+    def bits(self):
+        """Returns a dictionary of
+        {(target_model, panel_name, entry_status): bits}.
+        """
+        if self._bits is None:
+            self._bits = {key: int.from_bytes(bitmap, 'little')
+                          for key, bitmap in self._bitmaps.items()}
+        return self._bits
+
+    @property
+    def visit_codes(self):
+        """Returns a dictionary of {visit_code: bits}.
+        """
+        if self._visit_codes is None:
+            self._visit_codes = {key: int.from_bytes(bitmap, 'little')
+                                 for key, bitmap in self._visit_code_bitmaps.items()}
+        return self._visit_codes
+
+    def target(self, name=None):
+        """Returns the (target_model, panel_name) for a target model
+        or panel name.
+        """
+        if isinstance(name, tuple):
+            return name
+        targets = [
+            (target_model, panel_name) for target_model, panel_name in self.targets
+            if name == panel_name or (not panel_name and name == target_model)]
+        if len(targets) != 1:
+            raise MetadataMatrixError(
+                f'Expected one target for \'{name}\'. Got {targets}.')
+        return targets[0]
+
+    def select(self, *names, entry_status=None, visit_code=None):
+        """Returns the bits of rows where every target has the
+        entry status, REQUIRED by default.
+        """
+        bits = (1 << len(self.rows)) - 1
+        if visit_code:
+            bits &= self.visit_codes.get(visit_code, 0)
+        for name in names:
+            bits &= self.bits.get(self.target(name) + (entry_status or REQUIRED, ), 0)
+        return bits
+
+    def count(self, *names, entry_status=None, visit_code=None):
+        """Returns the number of rows where every target has the
+        entry status, REQUIRED by default.
+        """
+        return bit_count(self.select(
+            *names, entry_status=entry_status, visit_code=visit_code))
+
+    def counts_by_visit_code(self, *names, entry_status=None):
+        """Returns an ordered dictionary of {visit_code: count}.
+        """
+        return OrderedDict(
+            (visit_code, self.count(*names, entry_status=entry_status,
+                                    visit_code=visit_code))
+            for visit_code in sorted(self.visit_codes))
+
+    def rows_for(self, bits=None):
+        """Returns the list of rows for the bits set.
+        """
+        return [row for index, row in enumerate(self.rows) if bits >> index & 1]
+
+    def dump(self, f=None):
+        """Writes the matrix as JSON, bitsets as hex strings.
+        """
+        json.dump(dict(
+            rule_set_name=self.rule_set_name,
+            targets=self.targets,
+            rows=self.rows,
+            bits=[list(key) + [hex(bits)] for key, bits in self.bits.items()]), f)
+
+    @classmethod
+    def load(cls, f=None):
+        data = json.load(f)
+        matrix = cls(
+            targets=[tuple(target) for target in data['targets']],
+            rule_set_name=data['rule_set_name'])
+        for index, row in enumerate(data['rows']):
+            row = MatrixRow(*row)
+            matrix.rows.append(row)
+            set_bit(matrix._visit_code_bitmaps[row.visit_code], index)
+        for target_model, panel_name, entry_status, bits in data['bits']:
+            bits = int(bits, 16)
+            matrix._bitmaps[(target_model, panel_name, entry_status)] = bytearray(
+                bits.to_bytes((bits.bit_length() + 7) // 8, 'little'))
+        return matrix
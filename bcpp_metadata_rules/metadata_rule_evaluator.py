@@ -0,0 +1,64 @@
+from edc_metadata_rules import MetadataRuleEvaluator as BaseMetadataRuleEvaluator
+
+from .as_of import as_of_index
+from .coalescer import coalescer
+from .rule_run_queue import rule_run_queue
+from .scope import evaluation_scope
+from .visit_rule_run_lock import VisitRuleRunLock
+
+
+class MetadataRuleEvaluator(BaseMetadataRuleEvaluator):
+
+    """A metadata rule evaluator that defers rule runs to the
+    rule run queue or coalesces rule runs within a transaction.
+
+    Rule runs for the same visit may be serialized, see VisitRuleRunLock.
+
+    Declare on the visit model:
+
+        class SubjectVisit(..., CreatesMetadataModelMixin, ...):
+
+            metadata_rule_evaluator_cls = MetadataRuleEvaluator
+    """
+
+    as_of_index = as_of_index
+    coalescer = coalescer
+    rule_run_queue = rule_run_queue
+    visit_lock_cls = VisitRuleRunLock
+
+    def evaluate_rules(self):
+        """Called by the visit model's `run_metadata_rules`.
+        """
+        if self.rule_run_queue.enabled:
+            self.rule_run_queue.enqueue(visit=self.visit, app_label=self.app_label)
+        elif not (self.coalescer.enabled and self.coalescer.add(
+                visit=self.visit, evaluator_cls=self.__class__,
+                app_label=self.app_label)):
+            self.run()
+
+    def run(self):
+        """Runs all rule groups for the visit now unless, if rule
+        runs are locked, superseded by a newer run for the same visit.
+        """
+        lock = self.visit_lock_cls(
+            visit=self.visit, app_label=self.app_label, evaluator_cls=self.__class__)
+        if not lock.enabled:
+            self.run_rule_groups()
+        else:
+            with lock:
+                if not lock.superseded:
+                    self.run_rule_groups()
+                    lock.complete()
+
+    def run_rule_groups(self):
+        """Runs all rule groups for the visit.
+
+        Reference values and cached rule results are loaded once
+        for all rule groups, see evaluation_scope. The status
+        outcomes of the visit are recorded if the as-of index is
+        enabled.
+        """
+        with evaluation_scope(visit=self.visit):
+            super().evaluate_rules()
+            if self.as_of_index.enabled:
+                self.as_of_index.record_status(visit=self.visit)
@@ -1,12 +1,21 @@
-from bcpp_labs.labs import microtube_panel, rdb_panel, viral_load_panel, elisa_panel, venous_panel
+from bcpp_community.surveys import BCPP_YEAR_3
 from edc_constants.constants import NO, YES, POS, NEG, FEMALE, IND, NOT_SURE
 from edc_metadata import NOT_REQUIRED, REQUIRED
-from edc_metadata_rules import CrfRuleGroup, CrfRule, RequisitionRuleGroup
-from edc_metadata_rules import register, RequisitionRule, P, PF
+from edc_metadata_rules import CrfRuleGroup, RequisitionRuleGroup
+from edc_metadata_rules import register, P, PF
 
+from .lazy import lazy_import
 from .predicates import Predicates
+from .rules import CrfRule, RequisitionRule
 
 
+# panels are imported from bcpp_labs when the rules first use them
+microtube_panel = lazy_import('bcpp_labs.labs.microtube_panel')
+rdb_panel = lazy_import('bcpp_labs.labs.rdb_panel')
+viral_load_panel = lazy_import('bcpp_labs.labs.viral_load_panel')
+elisa_panel = lazy_import('bcpp_labs.labs.elisa_panel')
+venous_panel = lazy_import('bcpp_labs.labs.venous_panel')
+
 pc = Predicates()
 
 app_label = 'bcpp_subject'
@@ -342,7 +351,8 @@ class BaseCrfRuleGroup(CrfRuleGroup):
         predicate=pc.func_requires_hic_enrollment,
         consequence=REQUIRED,
         alternative=NOT_REQUIRED,
-        target_models=[f'{app_label}.hicenrollment'])
+        target_models=[f'{app_label}.hicenrollment'],
+        exclude_survey_schedules=[BCPP_YEAR_3])
 
     class Meta:
         abstract = True
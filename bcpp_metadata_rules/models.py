@@ -1,3 +1,296 @@
+from django.db import models
+from edc_base.model_mixins import BaseUuidModel
+from edc_base.utils import get_utcnow
+
+from .constants import PENDING, QUEUE_STATUS
+
+
+class RuleRunQueueItem(BaseUuidModel):
+
+    """A visit whose metadata rules are waiting to be run
+    by the queue worker.
+
+    See rule_run_queue.
+    """
+
+    visit_model = models.CharField(max_length=250)
+
+    visit_id = models.CharField(max_length=50)
+
+    subject_identifier = models.CharField(max_length=50)
+
+    visit_code = models.CharField(max_length=25)
+
+    app_label = models.CharField(max_length=50)
+
+    status = models.CharField(
+        max_length=25,
+        choices=QUEUE_STATUS,
+        default=PENDING,
+        db_index=True)
+
+    queued_datetime = models.DateTimeField(default=get_utcnow)
+
+    started_datetime = models.DateTimeField(null=True)
+
+    done_datetime = models.DateTimeField(null=True)
+
+    worker = models.CharField(max_length=50, null=True)
+
+    error = models.TextField(null=True)
+
+    # "visit_model.visit_id" while pending, otherwise None, so that
+    # a visit has at most one pending item.
+    pending_key = models.CharField(max_length=300, null=True, unique=True)
+
+    def __str__(self):
+        return (f'{self.subject_identifier}@{self.visit_code} '
+                f'{self.status} {self.queued_datetime}')
+
+    class Meta:
+        ordering = ('queued_datetime', )
+        index_together = [
+            ['subject_identifier', 'visit_code', 'status'],
+            ['visit_model', 'visit_id', 'status']]
+
+
+class VisitRuleRun(BaseUuidModel):
+
+    """Counts rule runs requested and completed for a visit.
+
+    The row is locked while the rules for the visit run.
+    See visit_rule_run_lock.
+    """
+
+    visit_model = models.CharField(max_length=250)
+
+    visit_id = models.CharField(max_length=50)
+
+    requested = models.IntegerField(default=0)
+
+    completed = models.IntegerField(default=0)
+
+    completed_datetime = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'{self.visit_model} {self.visit_id} {self.completed}/{self.requested}'
+
+    class Meta:
+        unique_together = ['visit_model', 'visit_id']
+
+
+class MonotonicFact(BaseUuidModel):
+
+    """An index of the first report_datetime a monotonic fact
+    is True for a subject, e.g. circumcised.
+
+    `first_true_datetime` is None if the fact is not True at
+    any visit. See monotonic.
+    """
+
+    subject_identifier = models.CharField(max_length=50)
+
+    name = models.CharField(max_length=250)
+
+    first_true_datetime = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'{self.subject_identifier} {self.name} {self.first_true_datetime}'
+
+    class Meta:
+        unique_together = ['subject_identifier', 'name']
+
+
+class BaselineFacts(BaseUuidModel):
+
+    """Status facts at baseline that do not change once the
+    baseline visit is complete.
+
+    See baseline_facts.
+    """
+
+    subject_identifier = models.CharField(max_length=50, unique=True)
+
+    defaulter_at_baseline = models.NullBooleanField()
+
+    naive_at_baseline = models.NullBooleanField()
+
+    def __str__(self):
+        return self.subject_identifier
+
+
+class SubjectInputVersion(BaseUuidModel):
+
+    """A counter incremented whenever data a predicate may read
+    for the subject changes.
+
+    See rule_results.
+    """
+
+    subject_identifier = models.CharField(max_length=50, unique=True)
+
+    version = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.subject_identifier} {self.version}'
+
+
+class CachedRuleResult(BaseUuidModel):
+
+    """The result of running a rule for a visit given the version
+    of the rule definition and of the subject's input data.
+
+    See rule_results.
+    """
+
+    rule_fingerprint = models.CharField(max_length=64)
+
+    subject_identifier = models.CharField(max_length=50)
+
+    visit_code = models.CharField(max_length=25)
+
+    visit_code_sequence = models.IntegerField(default=0)
+
+    report_datetime = models.DateTimeField()
+
+    input_version = models.IntegerField()
+
+    # JSON list of [target_model, entry_status]
+    result = models.TextField()
+
+    def __str__(self):
+        return (f'{self.subject_identifier} {self.visit_code}.'
+                f'{self.visit_code_sequence} {self.rule_fingerprint}')
+
+    class Meta:
+        unique_together = [
+            'rule_fingerprint', 'subject_identifier', 'visit_code',
+            'visit_code_sequence', 'report_datetime']
+        index_together = [
+            'subject_identifier', 'visit_code', 'visit_code_sequence',
+            'report_datetime']
+
+
+class IntervalQuerySet(models.QuerySet):
+
+    def as_of(self, as_of=None):
+        """Returns the intervals valid at `as_of`.
+        """
+        return self.filter(
+            models.Q(valid_to__isnull=True) | models.Q(valid_to__gt=as_of),
+            valid_from__lte=as_of)
+
+
+class ReferenceInterval(BaseUuidModel):
+
+    """A value of a reference field and the interval during which
+    the reference held it.
+
+    Declares the fields of the reference model so that, filtered
+    `as_of` a datetime, it can be queried in its place.
+    `valid_to` is None for the current value. See as_of.
+    """
+
+    identifier = models.CharField(max_length=50)
+
+    timepoint = models.CharField(max_length=50)
+
+    report_datetime = models.DateTimeField()
+
+    model = models.CharField(max_length=250)
+
+    field_name = models.CharField(max_length=50)
+
+    value_str = models.CharField(max_length=50, null=True)
+
+    value_int = models.IntegerField(null=True)
+
+    value_date = models.DateField(null=True)
+
+    value_datetime = models.DateTimeField(null=True)
+
+    value_uuid = models.UUIDField(null=True)
+
+    valid_from = models.DateTimeField()
+
+    valid_to = models.DateTimeField(null=True)
+
+    objects = IntervalQuerySet.as_manager()
+
+    def __str__(self):
+        return (f'{self.identifier}@{self.timepoint} {self.model}.'
+                f'{self.field_name}={self.value} [{self.valid_from}, {self.valid_to})')
+
+    @property
+    def value(self):
+        for value in [self.value_str, self.value_int, self.value_date,
+                      self.value_datetime, self.value_uuid]:
+            if value is not None:
+                return value
+        return None
+
+    class Meta:
+        index_together = [
+            ['identifier', 'timepoint', 'model', 'valid_from', 'valid_to'],
+            ['identifier', 'model', 'field_name', 'valid_from', 'valid_to']]
+
+
+class StatusInterval(BaseUuidModel):
+
+    """A status helper outcome for a visit and the interval during
+    which the status helper returned it.
+
+    Recorded when the rules for the visit run. See as_of.
+    """
+
+    subject_identifier = models.CharField(max_length=50)
+
+    visit_code = models.CharField(max_length=25)
+
+    visit_code_sequence = models.IntegerField(default=0)
+
+    name = models.CharField(max_length=50)
+
+    # JSON value
+    value = models.CharField(max_length=250, null=True)
+
+    valid_from = models.DateTimeField()
+
+    valid_to = models.DateTimeField(null=True)
+
+    objects = IntervalQuerySet.as_manager()
+
+    def __str__(self):
+        return (f'{self.subject_identifier}@{self.visit_code} {self.name}={self.value} '
+                f'[{self.valid_from}, {self.valid_to})')
+
+    class Meta:
+        index_together = [
+            ['subject_identifier', 'visit_code', 'visit_code_sequence',
+             'valid_from', 'valid_to']]
+
+
+class AsOfIndexBuild(BaseUuidModel):
+
+    """A run of `build_as_of_index`.
+
+    The index covers as-of datetimes from the first build. See as_of.
+    """
+
+    built_datetime = models.DateTimeField(default=get_utcnow)
+
+    reference_count = models.IntegerField(default=0)
+
+    status_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return (f'{self.built_datetime} references={self.reference_count} '
+                f'statuses={self.status_count}')
+
+    class Meta:
+        ordering = ['built_datetime']
+
+
 # from django.conf import settings
 #
 # if settings.APP_NAME == 'bcpp_metadata_rules':
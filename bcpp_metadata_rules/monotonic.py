@@ -0,0 +1,133 @@
+from collections import namedtuple
+from django.apps import apps as django_apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from functools import wraps
+
+from .side_effects import side_effects
+
+
+MonotonicFactSpec = namedtuple(
+    'MonotonicFactSpec', 'name reference_name field_name value')
+
+
+class MonotonicFactIndex:
+
+    """A class that maintains a per-subject index of the first
+    report_datetime a monotonic fact is True.
+
+    A fact is monotonic if once True at a visit it is True at every
+    later visit, e.g. circumcised or enrolled to HIC. Given the index,
+    a predicate answers with one indexed lookup instead of walking
+    the subject's reference history.
+
+    The index is built per subject on first use and updated by the
+    reference model's post_save and post_delete signals.
+    """
+
+    model = 'bcpp_metadata_rules.monotonicfact'
+    reference_models = ['edc_reference.reference']
+
+    def __init__(self):
+        self.specs = {}
+
+    @property
+    def model_cls(self):
+        return django_apps.get_model(self.model)
+
+    def register(self, reference_name=None, field_name=None, value=None):
+        spec = MonotonicFactSpec(
+            name=f'{reference_name}.{field_name}',
+            reference_name=reference_name,
+            field_name=field_name,
+            value=value)
+        self.specs.update({spec.name: spec})
+        return spec
+
+    def first_true(self, subject_identifier=None, spec=None, reference_model_cls=None):
+        """Returns the first report_datetime the fact is True or None.
+        """
+        try:
+            obj = self.model_cls.objects.get(
+                subject_identifier=subject_identifier, name=spec.name)
+        except ObjectDoesNotExist:
+            obj = self.build(
+                subject_identifier=subject_identifier, spec=spec,
+                reference_model_cls=reference_model_cls)
+        return obj.first_true_datetime
+
+    def build(self, subject_identifier=None, spec=None, reference_model_cls=None):
+        """Returns the index entry after finding the earliest reference
+        where the fact is True.
+
+        The entry is not saved if side effects are suppressed.
+        """
+        reference = reference_model_cls.objects.filter(
+            identifier=subject_identifier,
+            model=spec.reference_name,
+            field_name=spec.field_name,
+            value_str=spec.value).order_by('report_datetime').first()
+        first_true_datetime = reference.report_datetime if reference else None
+        if not side_effects.allowed:
+            return self.model_cls(
+                subject_identifier=subject_identifier, name=spec.name,
+                first_true_datetime=first_true_datetime)
+        obj, _ = self.model_cls.objects.get_or_create(
+            subject_identifier=subject_identifier,
+            name=spec.name,
+            defaults=dict(first_true_datetime=first_true_datetime))
+        return obj
+
+    def update(self, reference=None, created=None, deleted=None):
+        """Updates the index for a saved or deleted reference
+        model instance.
+
+        An index entry that may no longer be correct, that is, one
+        that may have been derived from an existing reference whose
+        value is no longer True, is deleted and rebuilt on next use.
+        """
+        spec = self.specs.get(f'{reference.model}.{reference.field_name}')
+        if spec:
+            report_datetime = reference.report_datetime
+            queryset = self.model_cls.objects.filter(
+                subject_identifier=reference.identifier, name=spec.name)
+            if not deleted and reference.value == spec.value:
+                queryset.filter(
+                    Q(first_true_datetime__isnull=True)
+                    | Q(first_true_datetime__gte=report_datetime)).update(
+                        first_true_datetime=report_datetime)
+                queryset.filter(first_true_datetime__lt=report_datetime).delete()
+            elif not created:
+                queryset.filter(first_true_datetime=report_datetime).delete()
+
+
+monotonic_facts = MonotonicFactIndex()
+
+
+def monotonic(reference_name=None, field_name=None, value=None, index=None):
+    """Decorator for a predicate `func(self, visit)` that returns True
+    if `field_name` equals `value` at or before the visit.
+
+    The decorated predicate answers from the monotonic fact index.
+    If the predicate collection's `monotonic_fact_index` is None, or
+    its `as_of` is set, the decorated method is called instead.
+    """
+    index = index or monotonic_facts
+    spec = index.register(
+        reference_name=reference_name, field_name=field_name, value=value)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, visit, **kwargs):
+            if (getattr(self, 'monotonic_fact_index', None) is None
+                    or getattr(self, 'as_of', None)):
+                return func(self, visit, **kwargs)
+            first_true_datetime = self.monotonic_fact_index.first_true(
+                subject_identifier=visit.subject_identifier,
+                spec=spec,
+                reference_model_cls=self.reference_model_cls)
+            return (first_true_datetime is not None
+                    and first_true_datetime <= visit.report_datetime)
+        wrapper.monotonic_fact = spec
+        return wrapper
+    return decorator
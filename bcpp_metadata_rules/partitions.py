@@ -0,0 +1,129 @@
+import time
+import traceback
+
+from collections import OrderedDict, namedtuple
+from django.db import connections
+from multiprocessing import Pool
+
+from .batch import get_rule_set
+
+
+PartitionResult = namedtuple(
+    'PartitionResult', 'map_area visit_count failed error elapsed report')
+
+
+def get_map_area(survey_schedule=None):
+    """Returns the map area of a survey schedule field value,
+    e.g. 'bcpp-survey.bcpp-year-2.otse' -> 'otse'.
+    """
+    return (survey_schedule or '').split('.')[-1] or None
+
+
+def evaluate_partition(options):
+    """Evaluates the visits of one partition in a worker process
+    and returns a PartitionResult.
+
+    An exception stops only this partition.
+    """
+    (batch_evaluator_cls, specs, visit_model, batch_size,
+     report_cls, report_kwargs, map_area, pks) = options
+    started = time.time()
+    report = report_cls(**report_kwargs)
+    visit_count = 0
+    try:
+        batch_evaluator = batch_evaluator_cls(
+            rule_sets=[get_rule_set(*spec) for spec in specs],
+            batch_size=batch_size,
+            visit_model=visit_model)
+        for visit_outcome in batch_evaluator.evaluate_pks(pks):
+            report.add(visit_outcome)
+            visit_count += 1
+    except Exception:
+        return PartitionResult(
+            map_area=map_area, visit_count=visit_count, failed=True,
+            error=traceback.format_exc(), elapsed=time.time() - started,
+            report=None)
+    return PartitionResult(
+        map_area=map_area, visit_count=visit_count, failed=False,
+        error=None, elapsed=time.time() - started, report=report)
+
+
+class PartitionedEvaluator:
+
+    """A class that evaluates visits partitioned by community (map
+    area), one partition per worker task.
+
+    Each partition collects its own report; reports of the
+    partitions that did not fail are merged. A slow or failing
+    partition does not hold back or stop the others.
+
+    For example:
+
+        evaluator = PartitionedEvaluator(
+            batch_evaluator=BatchEvaluator(rule_sets=[current, proposed]),
+            report_cls=SimulationReport,
+            report_kwargs=dict(current='current', proposed='proposed'))
+        report, results = evaluator.run(processes=4, on_partition=print)
+    """
+
+    def __init__(self, batch_evaluator=None, report_cls=None, report_kwargs=None):
+        self.batch_evaluator = batch_evaluator
+        self.report_cls = report_cls
+        self.report_kwargs = report_kwargs or {}
+
+    def partitions(self, pks=None, map_areas=None):
+        """Returns an ordered dictionary of {map_area: [pk, ...]}.
+        """
+        queryset = self.batch_evaluator.visit_model_cls.objects.all()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        partitions = OrderedDict()
+        for pk, survey_schedule in queryset.order_by(
+                'survey_schedule', 'subject_identifier', 'report_datetime').values_list(
+                    'pk', 'survey_schedule'):
+            map_area = get_map_area(survey_schedule)
+            if not map_areas or map_area in map_areas:
+                partitions.setdefault(map_area, []).append(pk)
+        return partitions
+
+    def tasks(self, pks=None, map_areas=None):
+        specs = [(rule_set.module_name, rule_set.app_label, rule_set.name)
+                 for rule_set in self.batch_evaluator.rule_sets]
+        return [(self.batch_evaluator.__class__, specs,
+                 self.batch_evaluator.visit_model, self.batch_evaluator.batch_size,
+                 self.report_cls, self.report_kwargs, map_area, partition_pks)
+                for map_area, partition_pks in self.partitions(
+                    pks=pks, map_areas=map_areas).items()]
+
+    def run(self, pks=None, map_areas=None, processes=None, on_partition=None):
+        """Returns a tuple of (merged report, [PartitionResult, ...]).
+
+        `on_partition` is called with each PartitionResult as the
+        partition completes.
+        """
+        tasks = self.tasks(pks=pks, map_areas=map_areas)
+        report = self.report_cls(**self.report_kwargs)
+        results = []
+        if processes == 1:
+            partition_results = (evaluate_partition(task) for task in tasks)
+            results = self.collect(report, partition_results, on_partition)
+        else:
+            with self.batch_evaluator.subject_arrays.backfill():
+                # forked workers may not share the parent's connections
+                connections.close_all()
+                with Pool(processes=processes) as pool:
+                    results = self.collect(
+                        report, pool.imap_unordered(evaluate_partition, tasks),
+                        on_partition)
+        return report, results
+
+    @staticmethod
+    def collect(report=None, partition_results=None, on_partition=None):
+        results = []
+        for result in partition_results:
+            if not result.failed:
+                report.merge(result.report)
+            results.append(result._replace(report=None))
+            if on_partition:
+                on_partition(results[-1])
+        return results
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from django.apps import apps as django_apps
+from django.db import transaction
+
+
+class PredicateReads:
+
+    """A class that sends the reads of predicates to a replica
+    database while evaluating rules for a visit.
+
+    Set the app config's `predicate_read_database` to the replica
+    alias and add PredicateReadRouter to DATABASE_ROUTERS.
+
+    Consistency guard: a subject written by this thread is read
+    from the primary while in a transaction, since the replica
+    cannot have uncommitted data, and for `predicate_read_lag`
+    seconds after, to allow for replication lag.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def database(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return app_config.predicate_read_database
+
+    @property
+    def alias(self):
+        """Returns the alias reads are routed to or None.
+        """
+        return getattr(self._local, 'alias', None)
+
+    @property
+    def lag(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return app_config.predicate_read_lag
+
+    @property
+    def written_subjects(self):
+        """Returns a dictionary of {subject_identifier: time committed},
+        time is None until the transaction commits.
+        """
+        try:
+            return self._local.written_subjects
+        except AttributeError:
+            self._local.written_subjects = {}
+            return self._local.written_subjects
+
+    def written(self, instance=None, using=None):
+        """Records a subject written by this thread.
+        """
+        if self.database:
+            subject_identifier = (getattr(instance, 'subject_identifier', None)
+                                  or getattr(instance, 'identifier', None))
+            if subject_identifier:
+                written_subjects = self.written_subjects
+                if transaction.get_connection(using).in_atomic_block:
+                    written_subjects[subject_identifier] = None
+
+                    def committed():
+                        written_subjects[subject_identifier] = time.monotonic()
+                    transaction.on_commit(committed, using=using)
+                else:
+                    written_subjects[subject_identifier] = time.monotonic()
+
+    def is_consistent(self, subject_identifier=None):
+        """Returns True if the replica may be read for the subject.
+        """
+        try:
+            committed = self.written_subjects[subject_identifier]
+        except KeyError:
+            return True
+        if committed is None:
+            if transaction.get_connection().in_atomic_block:
+                # written in the current transaction
+                return False
+            # otherwise rolled back
+        elif time.monotonic() - committed < self.lag:
+            return False
+        del self.written_subjects[subject_identifier]
+        return True
+
+    @contextmanager
+    def replica(self, visit=None):
+        """Routes predicate reads within the block to the replica
+        unless the guard fails for the visit's subject.
+        """
+        previous = self.alias
+        alias = self.database
+        if alias and not self.is_consistent(visit.subject_identifier):
+            alias = None
+        self._local.alias = alias
+        try:
+            yield alias
+        finally:
+            self._local.alias = previous
+
+
+predicate_reads = PredicateReads()
@@ -1,145 +1,347 @@
+import sys
+
 from bcpp_community.surveys import BCPP_YEAR_3
 from bcpp_labs.constants import MICROTUBE
-from bcpp_status.status_db_helper import StatusDbHelper
-from decimal import Decimal
+from datetime import date, datetime
+from django.apps import apps as django_apps
+from django.db.models import Q
 from edc_constants.constants import POS, NEG, NO, YES, FEMALE, NAIVE, DEFAULTER, ON_ART
 from edc_metadata_rules import PredicateCollection
-from edc_registration.models import RegisteredSubject
-from edc_reference import get_reference_name
+from django.utils.module_loading import import_string
+from edc_reference import get_reference_name, site_reference_configs
+from uuid import UUID
+
+from .as_of import as_of_index
+from .baseline_facts import baseline_facts
+from .manifest import depends_on, reference, registration, status, visit_field
+from .monotonic import monotonic, monotonic_facts
+from .reference_values import CHOICE, INTEGER, reference_values
+from .status_cache import status_cache, status_helpers
+from .subject_arrays import subject_arrays
 
 
 class Predicates(PredicateCollection):
 
     app_label = 'bcpp_subject'
     visit_model = 'bcpp_subject.subjectvisit'
-    status_helper_cls = StatusDbHelper
+    registered_subject_model = 'edc_registration.registeredsubject'
+    status_helper = 'bcpp_status.status_db_helper.StatusDbHelper'
+    monotonic_fact_index = monotonic_facts
+    baseline_facts = baseline_facts
+    as_of_index = as_of_index
+    status_cache = status_cache
+    status_helpers = status_helpers
+    reference_values = reference_values
+    subject_arrays = subject_arrays
+    reference_value_fields = [
+        'value_str', 'value_int', 'value_date', 'value_datetime', 'value_uuid']
+    reference_field_types = {
+        f'{app_label}.sexualbehaviour': {
+            'last_year_partners': INTEGER},
+        f'{app_label}.hivtestinghistory': {
+            'has_tested': CHOICE,
+            'has_record': CHOICE},
+        get_reference_name(f'{app_label}.subjectrequisition', MICROTUBE): {
+            'panel_name': CHOICE,
+            'is_drawn': CHOICE,
+            'reason_not_drawn': CHOICE}}
+    # models read by predicates and, for requisitions, their panels;
+    # see `names`.
+    reference_models = [
+        'anonymousconsent', 'circumcision', 'hicenrollment',
+        'hivtestinghistory', 'sexualbehaviour']
+    requisition_panels = {'subjectrequisition': [MICROTUBE]}
+    # set by a subclass that declares `status_helper_cls`
+    _declared_status_helper_cls = None
+
+    def __init_subclass__(cls, **kwargs):
+        """Keeps a status helper class declared on a subclass, e.g.
+        `status_helper_cls = StatusDbHelper`, as the default, so that
+        it is still wrapped by the status helper property.
+        """
+        super().__init_subclass__(**kwargs)
+        declared = cls.__dict__.get('status_helper_cls')
+        if declared is not None and not isinstance(declared, property):
+            cls._declared_status_helper_cls = declared
+            del cls.status_helper_cls
+
+    def __init__(self):
+        # resolved on first use so that importing metadata_rules
+        # does not load models or the status helper.
+        self._reference_model_cls = None
+        self._registered_subject_model_cls = None
+        self._status_helper_cls = self._declared_status_helper_cls
+        self.names = self.resolve_names()
+
+    def resolve_names(self):
+        """Returns a dictionary of interned reference names, keyed by
+        model name or (model name, panel name), for example:
+
+            {'circumcision': 'bcpp_subject.circumcision',
+             ('subjectrequisition', MICROTUBE): get_reference_name(
+                'bcpp_subject.subjectrequisition', MICROTUBE)}
+
+        Built once, when initialized, for use by the predicates.
+        """
+        names = {model: sys.intern(f'{self.app_label}.{model}')
+                 for model in self.reference_models}
+        for model, panel_names in self.requisition_panels.items():
+            for panel_name in panel_names:
+                names.update({(model, panel_name): sys.intern(get_reference_name(
+                    f'{self.app_label}.{model}', panel_name))})
+        return names
+
+    @property
+    def as_of(self):
+        """Returns the datetime of an as-of evaluation or None.
+        """
+        return self.as_of_index.as_of_datetime if self.as_of_index else None
 
+    @property
+    def reference_model_cls(self):
+        if not self._reference_model_cls:
+            self._reference_model_cls = django_apps.get_model(
+                site_reference_configs.get_reference_model(self.visit_model))
+        if self.as_of:
+            return self.as_of_index.reference_model_for(self._reference_model_cls)
+        return self._reference_model_cls
+
+    @property
+    def registered_subject_model_cls(self):
+        if not self._registered_subject_model_cls:
+            self._registered_subject_model_cls = django_apps.get_model(
+                self.registered_subject_model)
+        return self._registered_subject_model_cls
+
+    @property
+    def status_helper_cls(self):
+        if not self._status_helper_cls:
+            self._status_helper_cls = import_string(self.status_helper)
+        status_helper_cls = self._status_helper_cls
+        if self.as_of:
+            status_helper_cls = self.as_of_index.status_helper_for(status_helper_cls)
+        elif self.status_cache and self.status_cache.enabled:
+            status_helper_cls = self.status_cache.wrap(status_helper_cls)
+        return self.status_helpers.wrap(status_helper_cls, as_of=self.as_of)
+
+    @status_helper_cls.setter
+    def status_helper_cls(self, status_helper_cls):
+        """Sets the status helper class, wrapped when read as above.
+        """
+        self._status_helper_cls = status_helper_cls
+
+    def value(self, visit=None, reference_name=None, field_name=None):
+        """Returns the typed value of a reference field at the visit
+        or None.
+
+        The field type must be declared in `reference_field_types`.
+        """
+        return self.reference_values.for_visit(
+            visit=visit,
+            reference_model_cls=self.reference_model_cls,
+            field_types=self.reference_field_types).get(
+                reference_name=reference_name, field_name=field_name)
+
+    def has_value(self, visit=None, reference_name=None, field_name=None, value=None):
+        """Returns True if any reference of the field at the visit
+        has the value.
+
+        The field type must be declared in `reference_field_types`.
+        """
+        return self.reference_values.for_visit(
+            visit=visit,
+            reference_model_cls=self.reference_model_cls,
+            field_types=self.reference_field_types).has(
+                reference_name=reference_name, field_name=field_name, value=value)
+
+    def exists_any(self, reference_name=None, subject_identifier=None,
+                   field_name=None, value=None, report_datetime__gte=None,
+                   report_datetime__lte=None):
+        """Returns True if the subject has a reference for the field
+        with any value, or the given value, optionally within the
+        report_datetime bounds.
+
+        Unlike `exists`, does not build the subject's refsets; the
+        query stops at the first match.
+        """
+        opts = dict(
+            identifier=subject_identifier,
+            model=reference_name,
+            field_name=field_name)
+        if report_datetime__gte:
+            opts.update(report_datetime__gte=report_datetime__gte)
+        if report_datetime__lte:
+            opts.update(report_datetime__lte=report_datetime__lte)
+        queryset = self.reference_model_cls.objects.filter(**opts)
+        if value is None:
+            q = Q()
+            for name in self.reference_value_fields:
+                q |= Q(**{f'{name}__isnull': False})
+            queryset = queryset.filter(q)
+        else:
+            queryset = queryset.filter(**{self.reference_value_field(value): value})
+        return queryset.exists()
+
+    @staticmethod
+    def reference_value_field(value=None):
+        """Returns the name of the reference model field that
+        stores a value of this type.
+        """
+        if isinstance(value, datetime):
+            return 'value_datetime'
+        elif isinstance(value, date):
+            return 'value_date'
+        elif isinstance(value, int):
+            return 'value_int'
+        elif isinstance(value, UUID):
+            return 'value_uuid'
+        return 'value_str'
+
+    @monotonic(f'{app_label}.circumcision', 'circumcised', YES)
     def is_circumcised(self, visit):
         """Returns True if circumcised before or at visit
         report datetime.
         """
         return self.exists(
-            reference_name=f'{self.app_label}.circumcision',
+            reference_name=self.names['circumcision'],
             subject_identifier=visit.subject_identifier,
             report_datetime__lte=visit.report_datetime,
             field_name='circumcised',
             value=YES)
 
+    @monotonic(f'{app_label}.hicenrollment', 'hic_permission', YES)
     def is_hic_enrolled(self, visit):
         """Returns True if subject is enrolled to Hic.
         """
         return self.exists(
-            reference_name=f'{self.app_label}.hicenrollment',
+            reference_name=self.names['hicenrollment'],
             subject_identifier=visit.subject_identifier,
             report_datetime__lte=visit.report_datetime,
             field_name='hic_permission',
             value=YES)
 
+    def gender(self, visit):
+        """Returns the subject's gender, from the backfill arrays
+        if loaded.
+        """
+        gender = self.subject_arrays.gender(visit.subject_identifier)
+        if gender is None:
+            gender = self.registered_subject_model_cls.objects.get(
+                subject_identifier=visit.subject_identifier).gender
+        return gender
+
+    def baseline(self, visit):
+        """Returns an object with the baseline facts as attributes,
+        from the status helper if evaluating as of a datetime.
+        """
+        if self.as_of:
+            return self.status_helper_cls(visit=visit)
+        return self.baseline_facts.get(
+            visit=visit, status_helper_cls=self.status_helper_cls)
+
+    @depends_on(registration('gender'))
     def func_is_female(self, visit, **kwargs):
-        registered_subject = RegisteredSubject.objects.get(
-            subject_identifier=visit.subject_identifier)
-        return registered_subject.gender == FEMALE
+        return self.gender(visit) == FEMALE
 
     def _has_last_year_partners(self, visit, partner_count=None):
-        values = self.exists(
-            reference_name=f'{self.app_label}.sexualbehaviour',
-            subject_identifier=visit.subject_identifier,
-            report_datetime=visit.report_datetime,
+        value = self.value(
+            visit=visit,
+            reference_name=self.names['sexualbehaviour'],
             field_name='last_year_partners')
-        value = values[0] or 0
-        try:
-            value = int(value)
-        except ValueError:
-            value = int(Decimal(value))
-        return value >= partner_count
+        return (value or 0) >= partner_count
 
+    @depends_on(reference(f'{app_label}.sexualbehaviour', 'last_year_partners'))
     def func_requires_recent_partner(self, visit, **kwargs):
         return self._has_last_year_partners(visit, partner_count=1)
 
+    @depends_on(reference(f'{app_label}.sexualbehaviour', 'last_year_partners'))
     def func_requires_second_partner_forms(self, visit, **kwargs):
         return self._has_last_year_partners(visit, partner_count=2)
 
+    @depends_on(reference(f'{app_label}.sexualbehaviour', 'last_year_partners'))
     def func_requires_third_partner_forms(self, visit, **kwargs):
         return self._has_last_year_partners(visit, partner_count=3)
 
+    @depends_on(
+        reference(get_reference_name(f'{app_label}.subjectrequisition', MICROTUBE),
+                  'panel_name'),
+        reference(get_reference_name(f'{app_label}.subjectrequisition', MICROTUBE),
+                  'is_drawn'),
+        reference(get_reference_name(f'{app_label}.subjectrequisition', MICROTUBE),
+                  'reason_not_drawn'))
     def func_requires_venous(self, visit, **kwargs):
-        reference_name = get_reference_name(
-            f'{self.app_label}.subjectrequisition', MICROTUBE)
-        panel_name = self.exists(
-            reference_name=reference_name,
-            subject_identifier=visit.subject_identifier,
-            report_datetime=visit.report_datetime,
-            field_name='panel_name',
-            value=MICROTUBE)
-        is_drawn = self.exists(
-            reference_name=reference_name,
-            subject_identifier=visit.subject_identifier,
-            report_datetime=visit.report_datetime,
-            field_name='is_drawn',
-            value=NO)
-        reason_not_drawn = self.exists(
-            reference_name=reference_name,
-            subject_identifier=visit.subject_identifier,
-            report_datetime=visit.report_datetime,
-            field_name='reason_not_drawn',
-            value='collection_failed')
-        return panel_name and is_drawn and reason_not_drawn
+        reference_name = self.names[('subjectrequisition', MICROTUBE)]
+        return (
+            self.has_value(visit=visit, reference_name=reference_name,
+                           field_name='panel_name', value=MICROTUBE)
+            and self.has_value(visit=visit, reference_name=reference_name,
+                               field_name='is_drawn', value=NO)
+            and self.has_value(visit=visit, reference_name=reference_name,
+                               field_name='reason_not_drawn',
+                               value='collection_failed'))
 
+    @depends_on(reference(f'{app_label}.hivtestinghistory', 'has_tested'))
     def func_requires_hivuntested(self, visit, **kwargs):
-        return self.exists(
-            reference_name=f'{self.app_label}.hivtestinghistory',
-            subject_identifier=visit.subject_identifier,
-            report_datetime=visit.report_datetime,
+        return self.has_value(
+            visit=visit,
+            reference_name=self.names['hivtestinghistory'],
             field_name='has_tested',
             value=NO)
 
+    @depends_on(reference(f'{app_label}.hivtestinghistory', 'has_record'))
     def func_requires_hivtestreview(self, visit, **kwargs):
-        return self.exists(
-            reference_name=f'{self.app_label}.hivtestinghistory',
-            subject_identifier=visit.subject_identifier,
-            report_datetime=visit.report_datetime,
+        return self.has_value(
+            visit=visit,
+            reference_name=self.names['hivtestinghistory'],
             field_name='has_record',
             value=YES)
 
+    @depends_on(reference(f'{app_label}.anonymousconsent', 'consent_datetime'))
     def func_anonymous_member(self, visit, **kwargs):
-        values = self.exists(
-            reference_name=f'{self.app_label}.anonymousconsent',
+        return self.exists_any(
+            reference_name=self.names['anonymousconsent'],
             subject_identifier=visit.subject_identifier,
             field_name='consent_datetime')
-        return [v for v in values if v is not None]
 
+    @depends_on(status('defaulter_at_baseline'), status('naive_at_baseline'))
     def func_requires_hivlinkagetocare(self, visit, **kwargs):
         """Returns True if participant is a defaulter now or at baseline,
         is naive now or at baseline.
         """
-        status_helper = self.status_helper_cls(visit=visit)
-        if status_helper.defaulter_at_baseline:
+        baseline = self.baseline(visit)
+        if baseline.defaulter_at_baseline:
             return True
-        elif status_helper.naive_at_baseline:
+        elif baseline.naive_at_baseline:
             return True
         return False
 
+    @depends_on(status('final_arv_status'))
     def func_art_defaulter(self, visit, **kwargs):
         """Returns True is a participant is a defaulter.
         """
         status_helper = self.status_helper_cls(visit=visit)
         return status_helper.final_arv_status == DEFAULTER
 
+    @depends_on(status('final_arv_status'))
     def func_art_naive(self, visit, **kwargs):
         """Returns True if the participant art naive.
         """
         status_helper = self.status_helper_cls(visit=visit)
         return status_helper.final_arv_status == NAIVE
 
+    @depends_on(status('final_arv_status'))
     def func_on_art(self, visit, **kwargs):
         """Returns True if the participant is on art.
         """
         return self.status_helper_cls(visit=visit).final_arv_status == ON_ART
 
+    @depends_on(status('final_hiv_status'))
     def func_requires_todays_hiv_result(self, visit, **kwargs):
         status_helper = self.status_helper_cls(visit=visit)
         return status_helper.final_hiv_status != POS
 
+    @depends_on(status('final_hiv_status'), status('final_arv_status'),
+                status('naive_at_baseline'))
     def func_requires_pima_cd4(self, visit, **kwargs):
         """Returns True if subject is POS and ART naive.
 
@@ -148,14 +350,17 @@ class Predicates(PredicateCollection):
         status_helper = self.status_helper_cls(visit=visit)
         return (status_helper.final_hiv_status == POS
                 and (status_helper.final_arv_status == NAIVE
-                     or status_helper.naive_at_baseline))
+                     or self.baseline(visit).naive_at_baseline))
 
+    @depends_on(status('known_positive'))
     def func_known_hiv_pos(self, visit, **kwargs):
         """Returns True if participant is NOT newly diagnosed POS.
         """
         status_helper = self.status_helper_cls(visit=visit)
         return status_helper.known_positive
 
+    @depends_on(status('final_hiv_status'), visit_field('survey_schedule'),
+                reference(f'{app_label}.hicenrollment', 'hic_permission'))
     def func_requires_hic_enrollment(self, visit, **kwargs):
         """If the participant is tested HIV NEG and was not HIC
         enrolled then HIC is REQUIRED.
@@ -168,6 +373,7 @@ class Predicates(PredicateCollection):
         return (status_helper.final_hiv_status == NEG
                 and not self.is_hic_enrolled(visit))
 
+    @depends_on(status('final_hiv_status'))
     def func_requires_microtube(self, visit, **kwargs):
         """Returns True to trigger the Microtube requisition
         if not POS.
@@ -175,22 +381,24 @@ class Predicates(PredicateCollection):
         status_helper = self.status_helper_cls(visit=visit)
         return status_helper.final_hiv_status != POS
 
+    @depends_on(status('final_hiv_status'))
     def func_hiv_positive(self, visit, **kwargs):
         """Returns True if the participant is known or newly
         diagnosed HIV positive.
         """
         return self.status_helper_cls(visit=visit).final_hiv_status == POS
 
+    @depends_on(registration('gender'),
+                reference(f'{app_label}.circumcision', 'circumcised'))
     def func_requires_circumcision(self, visit, **kwargs):
         """Return True if male is not reported as circumcised.
         """
         # TODO: we dont need to circumcise if POS??
-        registered_subject = RegisteredSubject.objects.get(
-            subject_identifier=visit.subject_identifier)
-        if registered_subject.gender == FEMALE:
+        if self.gender(visit) == FEMALE:
             return False
         return not self.is_circumcised(visit)
 
+    @depends_on(status('final_hiv_status'))
     def func_requires_rbd(self, visit, **kwargs):
         """Returns True if subject is POS.
         """
@@ -198,6 +406,7 @@ class Predicates(PredicateCollection):
             return True
         return False
 
+    @depends_on(status('final_hiv_status'))
     def func_requires_vl(self, visit, **kwargs):
         """Returns True if subject is POS.
         """
@@ -0,0 +1,196 @@
+import threading
+
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+
+INTEGER = 'integer'
+DECIMAL = 'decimal'
+DATE = 'date'
+CHOICE = 'choice'
+
+
+def parse_integer(value):
+    """Returns an integer or None if not a number.
+    """
+    try:
+        return int(Decimal(str(value)))
+    except (InvalidOperation, OverflowError, ValueError):
+        return None
+
+
+def parse_decimal(value):
+    """Returns a Decimal or None if not a finite number.
+    """
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def parse_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def parse_choice(value):
+    return str(value)
+
+
+class ReferenceValueError(Exception):
+    pass
+
+
+class VisitReferenceValues:
+
+    """A class of the typed values of the declared reference fields
+    for one visit.
+
+    References are matched on the visit's report_datetime, as
+    references of unscheduled visits share the visit code. All
+    declared fields are loaded with one query and each value is
+    parsed once, when loaded. A value that cannot be parsed, e.g.
+    text in a numeric field, is missing.
+
+    If `references` is None, the visit's references are queried.
+
+    `field_types` is a dictionary of
+    {reference_name: {field_name: field_type, ...}, ...}.
+    """
+
+    parsers = {
+        INTEGER: parse_integer,
+        DECIMAL: parse_decimal,
+        DATE: parse_date,
+        CHOICE: parse_choice}
+
+    def __init__(self, visit=None, reference_model_cls=None, field_types=None,
+                 references=None):
+        self.subject_identifier = visit.subject_identifier
+        self.report_datetime = visit.report_datetime
+        self.field_types = field_types
+        self.values = defaultdict(tuple)
+        if references is None:
+            references = reference_model_cls.objects.filter(
+                identifier=self.subject_identifier,
+                report_datetime=self.report_datetime,
+                model__in=list(field_types))
+        for reference in references:
+            field_type = field_types[reference.model].get(reference.field_name)
+            if field_type and reference.value is not None:
+                value = self.parsers[field_type](reference.value)
+                if value is not None:
+                    self.values[(reference.model, reference.field_name)] += (value, )
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(subject_identifier='
+                f'\'{self.subject_identifier}\', '
+                f'report_datetime={self.report_datetime!r})')
+
+    def all(self, reference_name=None, field_name=None):
+        """Returns a tuple of the typed values of the field, one per
+        reference.
+        """
+        try:
+            self.field_types[reference_name][field_name]
+        except KeyError:
+            raise ReferenceValueError(
+                f'Reference field type not declared. Got '
+                f'\'{reference_name}.{field_name}\'.')
+        return self.values.get((reference_name, field_name), ())
+
+    def get(self, reference_name=None, field_name=None):
+        """Returns the first typed value or None.
+        """
+        values = self.all(reference_name=reference_name, field_name=field_name)
+        return values[0] if values else None
+
+    def has(self, reference_name=None, field_name=None, value=None):
+        """Returns True if any reference of the field has the value.
+        """
+        return value in self.all(reference_name=reference_name, field_name=field_name)
+
+
+class ReferenceValues:
+
+    """A class that returns the typed reference values for a visit.
+
+    Within `prefetch` each visit's values are loaded once and shared
+    by every predicate; outside of it they are loaded per call.
+
+    For example:
+
+        with reference_values.prefetch():
+            ...  # run the rules for one or more visits
+    """
+
+    visit_values_cls = VisitReferenceValues
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def cache(self):
+        """Returns the prefetch cache for this thread or None.
+        """
+        return getattr(self._local, 'cache', None)
+
+    @contextmanager
+    def prefetch(self):
+        if self.cache is not None:
+            yield self.cache
+        else:
+            self._local.cache = {}
+            try:
+                yield self._local.cache
+            finally:
+                self._local.cache = None
+
+    def key(self, visit=None, reference_model_cls=None, field_types=None):
+        return (reference_model_cls, id(field_types),
+                visit.subject_identifier, visit.report_datetime)
+
+    def preload(self, visits=None, reference_model_cls=None, field_types=None):
+        """Loads the values for a batch of visits into the prefetch
+        cache with one query.
+
+        Does nothing outside of `prefetch`.
+        """
+        if self.cache is None:
+            return
+        references = defaultdict(list)
+        for reference in reference_model_cls.objects.filter(
+                identifier__in={visit.subject_identifier for visit in visits},
+                report_datetime__in={visit.report_datetime for visit in visits},
+                model__in=list(field_types)):
+            references[(reference.identifier, reference.report_datetime)].append(
+                reference)
+        for visit in visits:
+            self.cache.update({
+                self.key(visit, reference_model_cls, field_types): self.visit_values_cls(
+                    visit=visit, reference_model_cls=reference_model_cls,
+                    field_types=field_types,
+                    references=references.get(
+                        (visit.subject_identifier, visit.report_datetime), []))})
+
+    def for_visit(self, visit=None, reference_model_cls=None, field_types=None):
+        """Returns a VisitReferenceValues for the visit.
+        """
+        if self.cache is None:
+            return self.visit_values_cls(
+                visit=visit, reference_model_cls=reference_model_cls,
+                field_types=field_types)
+        key = self.key(visit, reference_model_cls, field_types)
+        try:
+            visit_values = self.cache[key]
+        except KeyError:
+            visit_values = self.visit_values_cls(
+                visit=visit, reference_model_cls=reference_model_cls,
+                field_types=field_types)
+            self.cache.update({key: visit_values})
+        return visit_values
+
+
+reference_values = ReferenceValues()
@@ -0,0 +1,79 @@
+import csv
+
+from collections import Counter, namedtuple
+from edc_metadata import REQUIRED
+from edc_metadata_rules import RequisitionRuleGroup, site_metadata_rules
+
+from .appointments import ScheduledAppointments
+from .batch import BatchEvaluator
+from .partitions import get_map_area
+from .rule_set import RuleSet
+
+
+Demand = namedtuple('Demand', 'map_area appt_date panel_name count')
+
+
+class RequisitionForecast:
+
+    """A class that forecasts requisition panels per community and
+    day for upcoming appointments.
+
+    Only the registered requisition rule groups are evaluated, in
+    batches, for a VisitContext built from each new appointment as
+    if the visit were reported at the appointment datetime.
+    Panels required by the rules are counted; nothing is written.
+
+    For example:
+
+        forecast = RequisitionForecast(days=7)
+        for demand in forecast.run():
+            ...
+    """
+
+    app_label = 'bcpp_subject'
+    appointments_cls = ScheduledAppointments
+    batch_evaluator_cls = BatchEvaluator
+    fieldnames = Demand._fields
+    map_area = staticmethod(get_map_area)
+
+    def __init__(self, start=None, days=None, app_label=None, batch_size=None):
+        self.app_label = app_label or self.app_label
+        self.rule_set = RuleSet(
+            rule_groups=[
+                rule_group for rule_group in site_metadata_rules.registry.get(
+                    self.app_label, [])
+                if issubclass(rule_group, RequisitionRuleGroup)],
+            app_label=self.app_label,
+            name='requisitions')
+        self.batch_evaluator = self.batch_evaluator_cls(
+            rule_sets=[self.rule_set], batch_size=batch_size)
+        self.scheduled = self.appointments_cls(
+            start=start, days=days, batch_size=self.batch_evaluator.batch_size)
+        self.counts = Counter()
+        self.errors = []
+
+    def run(self):
+        """Returns a list of Demand sorted by map area, date and
+        panel name.
+        """
+        for visits in self.scheduled.contexts():
+            appt_dates = {str(visit.pk): (self.map_area(visit.survey_schedule),
+                                          visit.report_datetime.date())
+                          for visit in visits}
+            for visit_outcome in self.batch_evaluator.evaluate(visits=visits):
+                if visit_outcome.error:
+                    self.errors.append(visit_outcome)
+                    continue
+                map_area, appt_date = appt_dates[visit_outcome.visit_id]
+                for (_, panel_name), outcome in visit_outcome.outcomes[
+                        self.rule_set.name].items():
+                    if outcome.entry_status == REQUIRED:
+                        self.counts.update([(map_area, appt_date, panel_name)])
+        return [Demand(*key, count=count) for key, count in sorted(
+            self.counts.items(), key=lambda x: [str(v) for v in x[0]])]
+
+    def to_csv(self, f=None, demand=None):
+        writer = csv.writer(f)
+        writer.writerow(self.fieldnames)
+        for row in demand:
+            writer.writerow(row)
@@ -0,0 +1,27 @@
+from .predicate_reads import predicate_reads
+
+
+class PredicateReadRouter:
+
+    """A database router that sends reads of the data predicates
+    use to the replica while `predicate_reads.replica` is active.
+
+    Models of this app are not routed; they are read then written
+    while rules are evaluated.
+    """
+
+    app_labels = ['edc_reference', 'edc_registration', 'bcpp_status']
+
+    def db_for_read(self, model, **hints):
+        if predicate_reads.alias and model._meta.app_label in self.app_labels:
+            return predicate_reads.alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,179 @@
+import json
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.apps import apps as django_apps
+from django.db.models import F
+from edc_metadata_rules import site_metadata_rules
+
+from .manifest import STATUS, PredicateManifest
+from .side_effects import side_effects
+from .status_cache import status_cache
+
+
+class RuleResultCache:
+
+    """A class that persists the result of each rule for a visit,
+    keyed by the rule's fingerprint and the version of the
+    subject's input data.
+
+    The input version is incremented by signals whenever a
+    reference or the registered subject is saved or deleted. A
+    cached result is used only if neither the rule definition nor
+    the subject's data changed since it was computed, e.g. when
+    unchanged visits are re-evaluated after a deployment.
+
+    Enabled by the app config's `cache_rule_results`. Versions are
+    incremented whether or not it is enabled so that results cached
+    before it was disabled are not used once it is enabled again.
+
+    Results are keyed by visit code, sequence and report datetime
+    so that unscheduled visits do not share them. Results of offline
+    evaluation are not persisted, see side_effects.
+
+    Within `prefetch` the version and cached results of a visit
+    are loaded once for all rules.
+
+    A reference only increments the version if the registered rules
+    read it, according to their PredicateManifest.
+    """
+
+    model = 'bcpp_metadata_rules.cachedruleresult'
+    version_model = 'bcpp_metadata_rules.subjectinputversion'
+    # models whose instances are saved with `identifier` or
+    # `subject_identifier`; see signals.
+    input_models = ['edc_reference.reference', 'edc_registration.registeredsubject']
+    app_label = 'bcpp_subject'
+    manifest_cls = PredicateManifest
+    status_cache = status_cache
+
+    def __init__(self):
+        self._local = threading.local()
+        self._manifest_key = None
+        self._input_reference_names = None
+
+    @property
+    def enabled(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return app_config.cache_rule_results
+
+    @property
+    def model_cls(self):
+        return django_apps.get_model(self.model)
+
+    @property
+    def version_model_cls(self):
+        return django_apps.get_model(self.version_model)
+
+    @property
+    def cache(self):
+        return getattr(self._local, 'cache', None)
+
+    @contextmanager
+    def prefetch(self):
+        if self.cache is not None:
+            yield self.cache
+        else:
+            self._local.cache = {}
+            try:
+                yield self._local.cache
+            finally:
+                self._local.cache = None
+
+    def input_reference_names(self):
+        """Returns the set of reference names read by the registered
+        rules, directly or through the status helper, or None if
+        not known.
+        """
+        rule_groups = site_metadata_rules.registry.get(self.app_label, [])
+        key = tuple(id(rule_group) for rule_group in rule_groups)
+        if key != self._manifest_key:
+            manifest = self.manifest_cls(
+                rules=[rule for rule_group in rule_groups
+                       for rule in rule_group.get_rules()])
+            names = manifest.reference_names
+            if names is not None and STATUS in manifest.kinds:
+                names |= set(self.status_cache.reference_names)
+            self._manifest_key, self._input_reference_names = key, names
+        return self._input_reference_names
+
+    def is_input(self, instance=None):
+        """Returns True if saving or deleting the model instance,
+        one of `input_models`, may change a rule result.
+        """
+        if hasattr(instance, 'field_name'):
+            # a reference
+            names = self.input_reference_names()
+            return names is None or instance.model in names
+        return True
+
+    def version(self, subject_identifier=None):
+        return self.version_model_cls.objects.filter(
+            subject_identifier=subject_identifier).values_list(
+                'version', flat=True).first() or 0
+
+    def bump(self, subject_identifier=None):
+        """Increments the subject's input version.
+        """
+        updated = self.version_model_cls.objects.filter(
+            subject_identifier=subject_identifier).update(version=F('version') + 1)
+        if not updated:
+            obj, created = self.version_model_cls.objects.get_or_create(
+                subject_identifier=subject_identifier, defaults=dict(version=1))
+            if not created:
+                self.bump(subject_identifier)
+
+    @staticmethod
+    def visit_options(visit=None):
+        """Returns an ordered dictionary of the fields that key a
+        visit's cached results.
+        """
+        return OrderedDict([
+            ('subject_identifier', visit.subject_identifier),
+            ('visit_code', visit.visit_code),
+            ('visit_code_sequence', getattr(visit, 'visit_code_sequence', None) or 0),
+            ('report_datetime', visit.report_datetime)])
+
+    def load(self, visit=None):
+        """Returns a tuple of (input version, {rule_fingerprint: result})
+        for the visit.
+        """
+        opts = self.visit_options(visit)
+        key = tuple(opts.values())
+        try:
+            return self.cache[key]
+        except (KeyError, TypeError):
+            version = self.version(visit.subject_identifier)
+            results = {
+                rule_fingerprint: OrderedDict(json.loads(result))
+                for rule_fingerprint, result in self.model_cls.objects.filter(
+                    input_version=version, **opts).values_list(
+                        'rule_fingerprint', 'result')}
+            if self.cache is not None:
+                self.cache[key] = (version, results)
+            return version, results
+
+    def get(self, rule=None, visit=None):
+        """Returns the cached result of the rule or None.
+        """
+        _, results = self.load(visit=visit)
+        return results.get(rule.fingerprint)
+
+    def set(self, rule=None, visit=None, result=None):
+        """Persists the result of the rule unless side effects are
+        suppressed.
+        """
+        if not side_effects.allowed:
+            return
+        version, results = self.load(visit=visit)
+        self.model_cls.objects.update_or_create(
+            rule_fingerprint=rule.fingerprint,
+            defaults=dict(
+                input_version=version,
+                result=json.dumps(list(result.items()))),
+            **self.visit_options(visit))
+        results[rule.fingerprint] = result
+
+
+rule_results = RuleResultCache()
@@ -0,0 +1,174 @@
+import uuid
+
+from datetime import timedelta
+from django.apps import apps as django_apps
+from django.db import transaction
+from edc_base.utils import get_utcnow
+
+from .batch import BatchEvaluator
+from .constants import PENDING, PROCESSING, DONE, FAILED
+
+
+class RuleRunQueue:
+
+    """A class that defers metadata rule runs to a DB-backed queue
+    drained by a worker, see management command
+    `process_rule_run_queue`.
+
+    A visit has at most one pending item; saving more CRFs for
+    the visit before the worker gets to it does not add items.
+
+    An item processing for longer than `processing_timeout` seconds,
+    e.g. claimed by a worker that crashed, is reclaimed, see `reclaim`.
+    """
+
+    model = 'bcpp_metadata_rules.rulerunqueueitem'
+    batch_evaluator_cls = BatchEvaluator
+    processing_timeout = 600
+
+    @property
+    def enabled(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return app_config.defer_rule_runs
+
+    @property
+    def model_cls(self):
+        return django_apps.get_model(self.model)
+
+    def enqueue(self, visit=None, app_label=None):
+        """Adds a pending item for the visit, if not already pending.
+        """
+        return self.add(
+            visit_model=visit._meta.label_lower,
+            visit_id=str(visit.pk),
+            subject_identifier=visit.subject_identifier,
+            visit_code=visit.visit_code,
+            app_label=app_label or visit._meta.app_label)
+
+    def add(self, visit_model=None, visit_id=None, subject_identifier=None,
+            visit_code=None, app_label=None):
+        # unique while pending; get_or_create gets the item created
+        # by a concurrent save.
+        obj, _ = self.model_cls.objects.get_or_create(
+            pending_key=f'{visit_model}.{visit_id}',
+            defaults=dict(
+                visit_model=visit_model,
+                visit_id=visit_id,
+                subject_identifier=subject_identifier,
+                visit_code=visit_code,
+                app_label=app_label))
+        return obj
+
+    def pending_since(self, visit_model=None, visit_id=None):
+        """Returns the datetime the oldest pending item for the
+        visit was queued or None.
+
+        If not None, the visit's metadata may be stale.
+        """
+        obj = self.model_cls.objects.filter(
+            visit_model=visit_model,
+            visit_id=visit_id,
+            status__in=[PENDING, PROCESSING]).order_by('queued_datetime').first()
+        return obj.queued_datetime if obj else None
+
+    def is_stale(self, visit=None):
+        return bool(self.pending_since(
+            visit_model=visit._meta.label_lower, visit_id=str(visit.pk)))
+
+    def claim(self, batch_size=None):
+        """Marks up to batch_size pending items as processing by
+        this worker and returns them.
+        """
+        worker = uuid.uuid4().hex
+        pks = list(self.model_cls.objects.filter(status=PENDING).order_by(
+            'queued_datetime').values_list('pk', flat=True)[:batch_size])
+        # only items still pending are claimed; another worker
+        # may have claimed some of them in the meantime.
+        self.model_cls.objects.filter(pk__in=pks, status=PENDING).update(
+            status=PROCESSING, pending_key=None, worker=worker,
+            started_datetime=get_utcnow())
+        return list(self.model_cls.objects.filter(worker=worker, status=PROCESSING))
+
+    def reclaim(self, timeout=None):
+        """Marks items processing for more than `timeout` seconds as
+        failed, re-queues their visits and returns the number
+        reclaimed.
+        """
+        started = get_utcnow() - timedelta(seconds=timeout or self.processing_timeout)
+        reclaimed = 0
+        for item in self.model_cls.objects.filter(
+                status=PROCESSING, started_datetime__lt=started):
+            with transaction.atomic():
+                # only if not finished in the meantime
+                if self.model_cls.objects.filter(pk=item.pk, status=PROCESSING).update(
+                        status=FAILED, error='Timed out. Re-queued.',
+                        done_datetime=get_utcnow()):
+                    self.add(
+                        visit_model=item.visit_model,
+                        visit_id=item.visit_id,
+                        subject_identifier=item.subject_identifier,
+                        visit_code=item.visit_code,
+                        app_label=item.app_label)
+                    reclaimed += 1
+        return reclaimed
+
+    def process(self, items=None, evaluator_cls=None):
+        """Runs the rules for the visits of the claimed items, loading
+        visits in batches.
+
+        The reference values of each batch are preloaded, see
+        BatchEvaluator.prepare.
+
+        A failure is recorded on the item and does not stop the batch.
+        """
+        items_by_model = {}
+        for item in items:
+            items_by_model.setdefault(item.visit_model, []).append(item)
+        for visit_model, model_items in items_by_model.items():
+            batch_evaluator = self.batch_evaluator_cls(
+                visit_model=visit_model, batch_size=len(model_items))
+            items_by_visit = {item.visit_id: item for item in model_items}
+            for visits in batch_evaluator.batches(pks=list(items_by_visit)):
+                with batch_evaluator.reference_values.prefetch():
+                    batch_evaluator.prepare(visits=visits)
+                    for visit in visits:
+                        item = items_by_visit.pop(str(visit.pk))
+                        self.run_item(item, visit=visit, evaluator_cls=evaluator_cls)
+            for item in items_by_visit.values():
+                # visit deleted since queued
+                self.finish(item, status=DONE)
+
+    def run_item(self, item=None, visit=None, evaluator_cls=None):
+        try:
+            with transaction.atomic():
+                evaluator_cls(visit=visit, app_label=item.app_label).run()
+        except Exception as e:
+            self.finish(item, status=FAILED, error=f'{e.__class__.__name__}: {e}')
+        else:
+            self.finish(item, status=DONE)
+
+    def finish(self, item=None, status=None, error=None):
+        item.status = status
+        item.error = error
+        item.done_datetime = get_utcnow()
+        item.save(update_fields=['status', 'error', 'done_datetime'])
+
+    def run_now(self, visit=None, evaluator_cls=None):
+        """Runs the rules for a visit with a pending item now, for
+        example, before showing the visit's metadata.
+
+        This is the synchronous fallback if the worker is behind
+        or not running.
+        """
+        worker = uuid.uuid4().hex
+        self.model_cls.objects.filter(
+            visit_model=visit._meta.label_lower, visit_id=str(visit.pk),
+            status=PENDING).update(
+                status=PROCESSING, pending_key=None, worker=worker,
+                started_datetime=get_utcnow())
+        item = self.model_cls.objects.filter(worker=worker, status=PROCESSING).first()
+        if item:
+            self.run_item(item, visit=visit, evaluator_cls=evaluator_cls)
+
+
+rule_run_queue = RuleRunQueue()
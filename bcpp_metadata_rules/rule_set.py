@@ -0,0 +1,266 @@
+from collections import OrderedDict, namedtuple
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.utils.module_loading import import_module
+from edc_metadata_rules import site_metadata_rules
+
+from .fingerprint import rule_groups_fingerprint
+from .manifest import PredicateManifest
+from .scope import evaluation_scope
+from .side_effects import side_effects
+
+
+Outcome = namedtuple('Outcome', 'entry_status rule')
+
+
+class RuleSetError(Exception):
+    pass
+
+
+class RuleSet:
+
+    """A class that evaluates the rules of a list of rule groups
+    for a visit without updating metadata.
+
+    Rule groups and rules are evaluated in the same order as when
+    metadata is updated; that is, for a target model and panel
+    the last rule to return an entry status decides.
+
+    Rules are pruned per survey schedule, see `plan`; plans are
+    built once per RuleSet, on first use. If the app config names a
+    `rule_plan_cache`, the compiled plans are kept in that cache,
+    keyed by the fingerprint of the rule groups, and loaded by later
+    processes; a changed rule changes the fingerprint.
+
+    For example:
+
+        rule_set = RuleSet(app_label='bcpp_subject')
+        outcomes = rule_set.evaluate(visit=subject_visit)
+        outcomes.get(('bcpp_subject.pimacd4', None))
+        >>> Outcome(entry_status='REQUIRED', rule='SubjectVisitRuleGroup.pima_cd4')
+    """
+
+    app_label = 'bcpp_subject'
+
+    def __init__(self, rule_groups=None, app_label=None, name=None, module_name=None):
+        self.app_label = app_label or self.app_label
+        self.module_name = module_name
+        self.name = name or module_name or 'current'
+        if rule_groups is None:
+            rule_groups = site_metadata_rules.registry.get(self.app_label, [])
+        self.rule_groups = list(rule_groups)
+        self._fingerprint = None
+        self._plans = {}
+        self._loaded = False
+        self._manifest = None
+        self._resolved = {}
+        self._rule_groups = {
+            rule: rule_group for rule_group in self.rule_groups
+            for rule in rule_group.get_rules()}
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(name=\'{self.name}\', '
+                f'app_label=\'{self.app_label}\')')
+
+    @classmethod
+    def from_module(cls, module_name=None, app_label=None, name=None):
+        """Returns a RuleSet for the rule groups registered with the
+        `site` declared in a module.
+
+        The module should not register with the global site, e.g.:
+
+            site = SiteMetadataRules()
+
+            @register(site=site)
+            class CrfRuleGroup1(CrfRuleGroup):
+                ...
+        """
+        module = import_module(module_name)
+        try:
+            site = getattr(module, 'site')
+        except AttributeError:
+            raise RuleSetError(
+                f'Module does not declare a rule group site. Expected '
+                f'attribute \'site\'. Got module \'{module_name}\'.')
+        app_label = app_label or cls.app_label
+        return cls(
+            rule_groups=site.registry.get(app_label, []),
+            app_label=app_label,
+            name=name,
+            module_name=module_name)
+
+    @property
+    def fingerprint(self):
+        """Returns the fingerprint of the rule groups, computed once.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = rule_groups_fingerprint(self.rule_groups)
+        return self._fingerprint
+
+    @property
+    def cache(self):
+        """Returns the cache named by the app config's `rule_plan_cache`
+        or None.
+        """
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        if app_config.rule_plan_cache:
+            return caches[app_config.rule_plan_cache]
+        return None
+
+    @property
+    def cache_key(self):
+        return f'bcpp_metadata_rules.rule_set.{self.fingerprint}'
+
+    def compile(self):
+        """Returns a picklable dictionary of the plan for each
+        survey schedule declared on rules, rules by name.
+        """
+        return {survey_schedule: [(str(rule), result)
+                                  for rule, result in self.plan(survey_schedule)]
+                for survey_schedule in [None] + self.survey_schedules}
+
+    def load(self):
+        """Loads the compiled plans for the fingerprint from the
+        cache, if any, or compiles and caches them.
+        """
+        self._loaded = True
+        cache = self.cache
+        if cache is None:
+            return
+        compiled = cache.get(self.cache_key)
+        if compiled is None:
+            cache.set(self.cache_key, self.compile(), None)
+        else:
+            rules = {str(rule): rule for rule in self.rules}
+            self._plans = {
+                survey_schedule: [(rules[name], result) for name, result in plan]
+                for survey_schedule, plan in compiled.items()}
+
+    @property
+    def rules(self):
+        """Returns a list of rules in the order evaluated.
+        """
+        rules = []
+        for rule_group in self.rule_groups:
+            rules.extend(rule_group.get_rules())
+        return rules
+
+    @property
+    def manifest(self):
+        """Returns the PredicateManifest of the rules.
+        """
+        if self._manifest is None:
+            self._manifest = PredicateManifest(rules=self.rules)
+        return self._manifest
+
+    @property
+    def survey_schedules(self):
+        """Returns a list of the survey schedules declared on rules.
+        """
+        survey_schedules = []
+        for rule in self.rules:
+            for survey_schedule in (getattr(rule, 'survey_schedules', [])
+                                    + getattr(rule, 'exclude_survey_schedules', [])):
+                if survey_schedule not in survey_schedules:
+                    survey_schedules.append(survey_schedule)
+        return survey_schedules
+
+    def plan(self, survey_schedule=None):
+        """Returns a list of (rule, result) for visits in the survey
+        schedule.
+
+        `result` is None if the rule must be run, otherwise the
+        result of a rule that does not apply to the survey schedule.
+        """
+        if not self._loaded:
+            self.load()
+        try:
+            plan = self._plans[survey_schedule]
+        except KeyError:
+            plan = []
+            for rule in self.rules:
+                try:
+                    applies = rule.applies_to(survey_schedule)
+                except AttributeError:
+                    applies = True
+                plan.append((rule, None if applies else rule.not_applicable_result))
+            self._plans.update({survey_schedule: plan})
+        return plan
+
+    @property
+    def targets(self):
+        """Returns a list of (target_model, panel_name) tuples
+        in the order first referenced by a rule.
+        """
+        targets = OrderedDict()
+        for rule in self.rules:
+            for target_model in rule.target_models:
+                for panel_name in self.panel_names(rule):
+                    targets.update({(target_model, panel_name): None})
+        return list(targets)
+
+    def resolve(self, rule=None):
+        """Returns a tuple of (rule name, panel names) for a rule,
+        resolved once per rule.
+
+        Panel names are those of a requisition rule's panels or [None].
+        """
+        try:
+            return self._resolved[rule]
+        except KeyError:
+            try:
+                panel_names = [panel.name for panel in rule.target_panels]
+            except AttributeError:
+                panel_names = [None]
+            self._resolved[rule] = (str(rule), panel_names)
+            return self._resolved[rule]
+
+    def panel_names(self, rule):
+        """Returns the panel names for a requisition rule or [None].
+        """
+        return self.resolve(rule)[1]
+
+    def scheduled(self, rule_group=None, visit=None):
+        """Returns the set of CRF models, or of requisition panel
+        names, the rule group updates metadata for at the visit, as
+        filtered by `crfs_for_visit` and `requisitions_for_visit`.
+
+        Returns None if the visit has no visit schedule, e.g. a
+        VisitContext built without one; nothing is filtered.
+        """
+        if getattr(visit, 'visit', None) is None:
+            return None
+        if hasattr(rule_group, 'requisitions_for_visit'):
+            return {requisition.panel.name
+                    for requisition in rule_group.requisitions_for_visit(visit)}
+        return {crf.model for crf in rule_group.crfs_for_visit(visit)}
+
+    def evaluate(self, visit=None):
+        """Returns an ordered dictionary of
+        {(target_model, panel_name): Outcome, ...} for the visit.
+
+        Rules that return no entry status and targets not scheduled
+        for the visit are not included. Nothing derived while
+        evaluating is persisted, see side_effects.
+        """
+        outcomes = OrderedDict()
+        scheduled = {}
+        with side_effects.suppress(), evaluation_scope(visit=visit):
+            for rule, result in self.plan(visit.survey_schedule):
+                if result is None:
+                    result = rule.run(visit=visit)
+                name, panel_names = self.resolve(rule)
+                rule_group = self._rule_groups[rule]
+                if rule_group not in scheduled:
+                    scheduled[rule_group] = self.scheduled(rule_group, visit)
+                for target_model, entry_status in result.items():
+                    if entry_status is None:
+                        continue
+                    for panel_name in panel_names:
+                        if (scheduled[rule_group] is not None
+                                and (panel_name or target_model)
+                                not in scheduled[rule_group]):
+                            continue
+                        outcomes.update({
+                            (target_model, panel_name): Outcome(entry_status, name)})
+        return outcomes
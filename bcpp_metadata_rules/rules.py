@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from edc_metadata import DO_NOTHING
+from edc_metadata_rules import CrfRule as BaseCrfRule
+from edc_metadata_rules import RequisitionRule as BaseRequisitionRule
+
+from .as_of import as_of_index
+from .fingerprint import rule_fingerprint
+from .rule_results import rule_results
+
+
+class SurveyScheduleRuleMixin:
+
+    """A mixin for rules that only apply to some survey schedules.
+
+    For a visit in a survey schedule the rule does not apply to,
+    the rule returns its alternative without calling the predicate.
+
+    For example:
+
+        hic_enrollment = CrfRule(
+            predicate=pc.func_requires_hic_enrollment,
+            consequence=REQUIRED,
+            alternative=NOT_REQUIRED,
+            target_models=[f'{app_label}.hicenrollment'],
+            exclude_survey_schedules=[BCPP_YEAR_3])
+    """
+
+    rule_results = rule_results
+    as_of_index = as_of_index
+
+    def __init__(self, survey_schedules=None, exclude_survey_schedules=None, **kwargs):
+        self.survey_schedules = survey_schedules or []
+        self.exclude_survey_schedules = exclude_survey_schedules or []
+        self._fingerprint = None
+        super().__init__(**kwargs)
+
+    @property
+    def fingerprint(self):
+        """Returns the hash of this rule's definition.
+
+        Not available until the rule group metaclass sets the
+        rule's name and group.
+        """
+        if not self._fingerprint:
+            self._fingerprint = rule_fingerprint(self)
+        return self._fingerprint
+
+    def applies_to(self, survey_schedule=None):
+        """Returns True if the rule applies to visits in the
+        survey schedule.
+        """
+        if survey_schedule in self.exclude_survey_schedules:
+            return False
+        return not self.survey_schedules or survey_schedule in self.survey_schedules
+
+    @property
+    def not_applicable_result(self):
+        """Returns the result of `run` for a visit the rule does not
+        apply to.
+        """
+        alternative = self._logic.alternative
+        entry_status = None if alternative == DO_NOTHING else alternative
+        return OrderedDict(
+            (target_model, entry_status) for target_model in self.target_models)
+
+    def run(self, visit=None):
+        if not self.applies_to(visit.survey_schedule):
+            return self.not_applicable_result
+        if not self.rule_results.enabled or self.as_of_index.as_of_datetime:
+            return super().run(visit=visit)
+        result = self.rule_results.get(rule=self, visit=visit)
+        if result is None:
+            result = super().run(visit=visit)
+            self.rule_results.set(rule=self, visit=visit, result=result)
+        return result
+
+
+class CrfRule(SurveyScheduleRuleMixin, BaseCrfRule):
+    pass
+
+
+class RequisitionRule(SurveyScheduleRuleMixin, BaseRequisitionRule):
+    pass
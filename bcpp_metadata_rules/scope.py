@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from .predicate_reads import predicate_reads
+from .reference_values import reference_values
+from .rule_results import rule_results
+from .status_cache import status_helpers
+
+
+@contextmanager
+def evaluation_scope(visit=None):
+    """A context manager for evaluating the rules for a visit.
+
+    Within the block the visit's reference values, status helper and
+    cached rule results are loaded once and predicate reads may be
+    routed to a replica.
+    """
+    with reference_values.prefetch(), rule_results.prefetch(), \
+            status_helpers.prefetch(), predicate_reads.replica(visit=visit):
+        yield
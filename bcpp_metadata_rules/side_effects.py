@@ -0,0 +1,46 @@
+import threading
+
+from contextlib import contextmanager
+
+from .predicate_reads import predicate_reads
+
+
+class SideEffects:
+
+    """A class that decides if facts derived while evaluating rules
+    may be persisted.
+
+    Offline evaluation, e.g. the simulator, forecast, auditor and
+    as-of evaluator, reads what it needs and writes nothing; see
+    RuleSet.evaluate. Nor are facts persisted while predicate reads
+    are routed to a replica, which may lag the primary.
+
+    For example:
+
+        with side_effects.suppress():
+            ...
+        side_effects.allowed
+        >>> True
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def allowed(self):
+        """Returns True if derived facts may be persisted.
+        """
+        return not getattr(self._local, 'depth', 0) and predicate_reads.alias is None
+
+    @contextmanager
+    def suppress(self):
+        """Nothing derived within the block is persisted.
+        """
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.depth -= 1
+
+
+side_effects = SideEffects()
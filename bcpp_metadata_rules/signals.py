@@ -0,0 +1,109 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .as_of import as_of_index
+from .baseline_facts import baseline_facts
+from .monotonic import monotonic_facts
+from .predicate_reads import predicate_reads
+from .predicates import Predicates  # noqa: registers the monotonic facts
+from .rule_results import rule_results
+from .status_cache import status_cache
+
+
+@receiver(post_save, weak=False, dispatch_uid='monotonic_facts_on_post_save')
+def monotonic_facts_on_post_save(sender, instance, raw, created, using,
+                                 update_fields, **kwargs):
+    """Updates the monotonic fact index when a reference is saved,
+    for example, when circumcision or hicenrollment is saved.
+    """
+    if sender._meta.label_lower in monotonic_facts.reference_models:
+        monotonic_facts.update(reference=instance, created=created)
+
+
+@receiver(post_delete, weak=False, dispatch_uid='monotonic_facts_on_post_delete')
+def monotonic_facts_on_post_delete(sender, instance, using, **kwargs):
+    if sender._meta.label_lower in monotonic_facts.reference_models:
+        monotonic_facts.update(reference=instance, deleted=True)
+
+
+@receiver(post_save, weak=False, dispatch_uid='baseline_facts_on_post_save')
+def baseline_facts_on_post_save(sender, instance, raw, created, using,
+                                update_fields, **kwargs):
+    """Invalidates cached baseline facts when a baseline status
+    CRF is edited.
+    """
+    if sender._meta.label_lower in baseline_facts.reference_models:
+        baseline_facts.invalidate(reference=instance)
+
+
+@receiver(post_delete, weak=False, dispatch_uid='baseline_facts_on_post_delete')
+def baseline_facts_on_post_delete(sender, instance, using, **kwargs):
+    if sender._meta.label_lower in baseline_facts.reference_models:
+        baseline_facts.invalidate(reference=instance)
+
+
+@receiver(post_save, weak=False, dispatch_uid='status_cache_on_post_save')
+def status_cache_on_post_save(sender, instance, raw, created, using,
+                              update_fields, **kwargs):
+    """Increments the subject's status version when a status CRF
+    is edited.
+    """
+    if sender._meta.label_lower in status_cache.reference_models:
+        status_cache.invalidate(reference=instance)
+
+
+@receiver(post_delete, weak=False, dispatch_uid='status_cache_on_post_delete')
+def status_cache_on_post_delete(sender, instance, using, **kwargs):
+    if sender._meta.label_lower in status_cache.reference_models:
+        status_cache.invalidate(reference=instance)
+
+
+@receiver(post_save, weak=False, dispatch_uid='rule_results_on_post_save')
+def rule_results_on_post_save(sender, instance, raw, created, using,
+                              update_fields, **kwargs):
+    """Increments the subject's input version so that cached rule
+    results for the subject are not used.
+    """
+    if (sender._meta.label_lower in rule_results.input_models
+            and rule_results.is_input(instance)):
+        rule_results.bump(
+            getattr(instance, 'subject_identifier', None) or instance.identifier)
+
+
+@receiver(post_delete, weak=False, dispatch_uid='rule_results_on_post_delete')
+def rule_results_on_post_delete(sender, instance, using, **kwargs):
+    if (sender._meta.label_lower in rule_results.input_models
+            and rule_results.is_input(instance)):
+        rule_results.bump(
+            getattr(instance, 'subject_identifier', None) or instance.identifier)
+
+
+@receiver(post_save, weak=False, dispatch_uid='as_of_index_on_post_save')
+def as_of_index_on_post_save(sender, instance, raw, created, using,
+                             update_fields, **kwargs):
+    """Opens an interval for a reference's new value.
+    """
+    if (sender._meta.label_lower in as_of_index.reference_models
+            and as_of_index.enabled):
+        as_of_index.update_reference(reference=instance)
+
+
+@receiver(post_delete, weak=False, dispatch_uid='as_of_index_on_post_delete')
+def as_of_index_on_post_delete(sender, instance, using, **kwargs):
+    if (sender._meta.label_lower in as_of_index.reference_models
+            and as_of_index.enabled):
+        as_of_index.update_reference(reference=instance, deleted=True)
+
+
+@receiver(post_save, weak=False, dispatch_uid='predicate_reads_on_post_save')
+def predicate_reads_on_post_save(sender, instance, raw, created, using,
+                                 update_fields, **kwargs):
+    """Records the subject so that its reads are not routed to a
+    replica that may not have the data yet.
+    """
+    predicate_reads.written(instance=instance, using=using)
+
+
+@receiver(post_delete, weak=False, dispatch_uid='predicate_reads_on_post_delete')
+def predicate_reads_on_post_delete(sender, instance, using, **kwargs):
+    predicate_reads.written(instance=instance, using=using)
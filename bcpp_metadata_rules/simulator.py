@@ -0,0 +1,147 @@
+import csv
+
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+
+from .batch import BatchEvaluator
+from .partitions import PartitionedEvaluator
+from .rule_set import RuleSet
+
+
+Flip = namedtuple(
+    'Flip',
+    'subject_identifier visit_code target_model panel_name '
+    'current proposed current_rule proposed_rule')
+
+
+class SimulationReport:
+
+    """A class that collects the differences between the outcomes
+    of the current and the proposed rule sets.
+
+    An entry status of None means no rule in that rule set
+    decides the target model/panel for the visit.
+    """
+
+    fieldnames = Flip._fields
+
+    def __init__(self, current=None, proposed=None):
+        self.current = current or 'current'
+        self.proposed = proposed or 'proposed'
+        self.flips = []
+        self.errors = []
+        self.visit_count = 0
+        # {visit_code: Counter({(target_model, panel_name, current, proposed): n})}
+        self.counts = defaultdict(Counter)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(visits={self.visit_count}, '
+                f'flips={len(self.flips)}, errors={len(self.errors)})')
+
+    def add(self, visit_outcome=None):
+        """Adds the flips for one VisitOutcome.
+        """
+        self.visit_count += 1
+        if visit_outcome.error:
+            self.errors.append(visit_outcome)
+            return
+        current = visit_outcome.outcomes.get(self.current)
+        proposed = visit_outcome.outcomes.get(self.proposed)
+        targets = OrderedDict.fromkeys(list(current) + list(proposed))
+        for target_model, panel_name in targets:
+            before = current.get((target_model, panel_name))
+            after = proposed.get((target_model, panel_name))
+            before_status = before.entry_status if before else None
+            after_status = after.entry_status if after else None
+            if before_status != after_status:
+                self.flips.append(Flip(
+                    subject_identifier=visit_outcome.subject_identifier,
+                    visit_code=visit_outcome.visit_code,
+                    target_model=target_model,
+                    panel_name=panel_name,
+                    current=before_status,
+                    proposed=after_status,
+                    current_rule=before.rule if before else None,
+                    proposed_rule=after.rule if after else None))
+                self.counts[visit_outcome.visit_code].update(
+                    [(target_model, panel_name, before_status, after_status)])
+
+    def merge(self, report=None):
+        """Adds the flips, errors and counts of another report,
+        e.g. of a partition.
+        """
+        self.visit_count += report.visit_count
+        self.flips.extend(report.flips)
+        self.errors.extend(report.errors)
+        for visit_code, counter in report.counts.items():
+            self.counts[visit_code].update(counter)
+
+    def summary(self):
+        """Returns a list of lines summarizing flips per visit code.
+        """
+        lines = [f'Visits evaluated: {self.visit_count}. '
+                 f'Flips: {len(self.flips)}. Errors: {len(self.errors)}.']
+        for visit_code in sorted(self.counts):
+            lines.append(f'{visit_code}:')
+            for (target_model, panel_name, before, after), count in sorted(
+                    self.counts[visit_code].items(), key=lambda x: -x[1]):
+                target = f'{target_model}.{panel_name}' if panel_name else target_model
+                lines.append(f'  {target}: {before} -> {after} ({count})')
+        return lines
+
+    def to_csv(self, f=None):
+        writer = csv.writer(f)
+        writer.writerow(self.fieldnames)
+        for flip in self.flips:
+            writer.writerow(flip)
+
+
+class RuleSetSimulator:
+
+    """A class that evaluates the current and a proposed rule set
+    over the cohort and reports visits where they differ.
+
+    For example:
+
+        simulator = RuleSetSimulator(
+            proposed=RuleSet.from_module('bcpp_subject.proposed_rules'))
+        report = simulator.run(processes=4)
+        print('\\n'.join(report.summary()))
+    """
+
+    batch_evaluator_cls = BatchEvaluator
+    partitioned_evaluator_cls = PartitionedEvaluator
+    report_cls = SimulationReport
+
+    def __init__(self, current=None, proposed=None, batch_size=None, visit_model=None):
+        self.current = current or RuleSet()
+        self.proposed = proposed
+        if self.current.name == self.proposed.name:
+            self.proposed.name = f'{self.proposed.name}-proposed'
+        self.batch_evaluator = self.batch_evaluator_cls(
+            rule_sets=[self.current, self.proposed],
+            batch_size=batch_size,
+            visit_model=visit_model)
+
+    def run(self, pks=None, processes=None):
+        """Returns a SimulationReport for the visits, or all
+        visits, if pks is None.
+        """
+        report = self.report_cls(
+            current=self.current.name, proposed=self.proposed.name)
+        for visit_outcome in self.batch_evaluator.evaluate_parallel(
+                pks=pks, processes=processes):
+            report.add(visit_outcome)
+        return report
+
+    def run_partitioned(self, pks=None, map_areas=None, processes=None,
+                        on_partition=None):
+        """Returns a tuple of (SimulationReport, [PartitionResult, ...])
+        evaluating each community in its own worker task.
+        """
+        evaluator = self.partitioned_evaluator_cls(
+            batch_evaluator=self.batch_evaluator,
+            report_cls=self.report_cls,
+            report_kwargs=dict(current=self.current.name, proposed=self.proposed.name))
+        return evaluator.run(
+            pks=pks, map_areas=map_areas, processes=processes,
+            on_partition=on_partition)
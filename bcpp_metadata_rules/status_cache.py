@@ -0,0 +1,199 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from functools import partial
+
+from .baseline_facts import BaselineFactsCache
+from .side_effects import side_effects
+
+
+class CachedStatus:
+
+    """A class that answers the status helper attributes for a
+    visit from the status cache, instantiating the status helper
+    only for attributes not yet cached.
+
+    Other attributes are read from the status helper itself.
+
+    Used in place of the status helper, see StatusCache.wrap.
+    """
+
+    def __init__(self, visit=None, status_helper_cls=None, status_cache=None):
+        self.visit = visit
+        self.status_helper_cls = status_helper_cls
+        self.status_cache = status_cache
+        self._status_helper = None
+        self._key = None
+        self._values = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(visit={self.visit})'
+
+    def _helper(self):
+        if not self._status_helper:
+            self._status_helper = self.status_helper_cls(visit=self.visit)
+        return self._status_helper
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(
+                f'\'{self.__class__.__name__}\' object has no attribute \'{name}\'')
+        if name not in self.status_cache.names:
+            return getattr(self._helper(), name)
+        if self._values is None:
+            self._key = self.status_cache.key(self.visit)
+            self._values = self.status_cache.cache.get(self._key) or {}
+        try:
+            return self._values[name]
+        except KeyError:
+            self._values[name] = getattr(self._helper(), name)
+            if side_effects.allowed:
+                self.status_cache.cache.set(
+                    self._key, self._values, self.status_cache.timeout)
+            return self._values[name]
+
+
+class StatusCache:
+
+    """A class that shares the status helper's outcomes for a visit
+    across processes through a Django cache, e.g. between web
+    workers and background jobs.
+
+    Entries are keyed by subject, visit code, visit code sequence,
+    report datetime and the subject's status version. The version
+    is incremented by signals whenever a reference for a status CRF
+    is saved or deleted so that all of the subject's cached statuses
+    are replaced at once.
+
+    Enabled by naming a cache in the app config's `status_cache`.
+    """
+
+    # status helper attributes read by predicates
+    names = ['final_hiv_status', 'final_arv_status', 'known_positive',
+             'defaulter_at_baseline', 'naive_at_baseline']
+    app_label = BaselineFactsCache.app_label
+    # CRFs the status helper reads status from
+    source_models = BaselineFactsCache.source_models
+    reference_models = ['edc_reference.reference']
+    cached_status_cls = CachedStatus
+    prefix = 'bcpp_metadata_rules.status'
+
+    @property
+    def app_config(self):
+        return django_apps.get_app_config('bcpp_metadata_rules')
+
+    @property
+    def enabled(self):
+        return bool(self.app_config.status_cache)
+
+    @property
+    def cache(self):
+        return caches[self.app_config.status_cache]
+
+    @property
+    def timeout(self):
+        return self.app_config.status_cache_timeout
+
+    @property
+    def reference_names(self):
+        return [f'{self.app_label}.{model}' for model in self.source_models]
+
+    def version_key(self, subject_identifier=None):
+        return f'{self.prefix}.version.{subject_identifier}'
+
+    def version(self, subject_identifier=None):
+        """Returns the subject's status version.
+
+        A missing version starts from the current time in ms so that
+        entries keyed by an evicted version are not used again.
+        """
+        key = self.version_key(subject_identifier)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, int(time.time() * 1000), None)
+            version = self.cache.get(key)
+        return version
+
+    def key(self, visit=None):
+        version = self.version(visit.subject_identifier)
+        visit_code_sequence = getattr(visit, 'visit_code_sequence', None) or 0
+        return (f'{self.prefix}.{visit.subject_identifier}.{visit.visit_code}.'
+                f'{visit_code_sequence}.{visit.report_datetime.timestamp()}.{version}')
+
+    def bump(self, subject_identifier=None):
+        """Increments the subject's status version.
+        """
+        try:
+            self.cache.incr(self.version_key(subject_identifier))
+        except ValueError:
+            self.version(subject_identifier)
+
+    def invalidate(self, reference=None):
+        """Increments the subject's status version if the reference
+        is for a status CRF.
+        """
+        if self.enabled and reference.model in self.reference_names:
+            self.bump(reference.identifier)
+
+    def wrap(self, status_helper_cls=None):
+        """Returns a callable to use in place of the status helper
+        class, e.g. `wrap(StatusDbHelper)(visit=visit).final_hiv_status`.
+        """
+        return partial(
+            self.cached_status_cls, status_helper_cls=status_helper_cls,
+            status_cache=self)
+
+
+class SharedStatusHelpers:
+
+    """A class that builds the status helper once per visit for all
+    status predicates of the rules evaluated within `prefetch`.
+
+    Helpers are shared per visit and as-of datetime, so an as-of
+    evaluation within the block does not get the current helper.
+
+    Outside of `prefetch` each predicate builds its own.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def cache(self):
+        return getattr(self._local, 'cache', None)
+
+    @contextmanager
+    def prefetch(self):
+        if self.cache is not None:
+            yield self.cache
+        else:
+            self._local.cache = {}
+            try:
+                yield self._local.cache
+            finally:
+                self._local.cache = None
+
+    def get(self, visit=None, status_helper_cls=None, as_of=None):
+        key = (visit.subject_identifier, visit.visit_code,
+               getattr(visit, 'visit_code_sequence', None) or 0,
+               visit.report_datetime, as_of)
+        try:
+            return self.cache[key]
+        except KeyError:
+            self.cache[key] = status_helper_cls(visit=visit)
+            return self.cache[key]
+
+    def wrap(self, status_helper_cls=None, as_of=None):
+        """Returns a callable to use in place of the status helper
+        class or, outside of `prefetch`, the class.
+        """
+        if self.cache is None:
+            return status_helper_cls
+        return partial(self.get, status_helper_cls=status_helper_cls, as_of=as_of)
+
+
+status_cache = StatusCache()
+status_helpers = SharedStatusHelpers()
@@ -0,0 +1,161 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from django.apps import apps as django_apps
+from edc_constants.constants import FEMALE, MALE
+from multiprocessing import RawArray
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python < 3.8
+    shared_memory = None
+
+
+SubjectBaselineFacts = namedtuple(
+    'SubjectBaselineFacts', 'defaulter_at_baseline naive_at_baseline')
+
+# one byte per subject per column
+GENDER = 0
+BASELINE = 1
+COLUMNS = 2
+
+GENDER_CODES = {MALE: 1, FEMALE: 2}
+GENDERS = {code: gender for gender, code in GENDER_CODES.items()}
+
+# two bits per baseline fact, (known, value)
+DEFAULTER_KNOWN = 1
+DEFAULTER = 2
+NAIVE_KNOWN = 4
+NAIVE = 8
+
+
+class SubjectArrays:
+
+    """A class that packs per-subject facts for the whole cohort
+    into one byte buffer shared by the processes of a backfill.
+
+    The buffer is loaded once in the parent before workers are
+    forked. Workers read a subject's gender and baseline facts
+    from the buffer instead of each querying the same rows.
+
+    The buffer is in `multiprocessing.shared_memory` if available,
+    otherwise in a `multiprocessing.RawArray`; both are shared
+    with forked workers without copying.
+
+    For example:
+
+        with subject_arrays.backfill():
+            ...  # fork workers and evaluate
+
+    Outside of `backfill` nothing is loaded and callers query
+    as usual.
+    """
+
+    registered_subject_model = 'edc_registration.registeredsubject'
+    baseline_facts_model = 'bcpp_metadata_rules.baselinefacts'
+
+    def __init__(self):
+        self.index = None
+        self.buffer = None
+        self._shared_memory = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(subjects={len(self.index or [])})'
+
+    @property
+    def enabled(self):
+        return self.index is not None
+
+    @contextmanager
+    def backfill(self):
+        if self.enabled:
+            yield self
+        else:
+            self.preload()
+            try:
+                yield self
+            finally:
+                self.release()
+
+    def preload(self):
+        """Loads the facts for all registered subjects.
+        """
+        registered_subject_model_cls = django_apps.get_model(
+            self.registered_subject_model)
+        baseline_facts_model_cls = django_apps.get_model(self.baseline_facts_model)
+        index = {}
+        genders = []
+        for subject_identifier, gender in (
+                registered_subject_model_cls.objects.values_list(
+                    'subject_identifier', 'gender').order_by('subject_identifier')):
+            index[subject_identifier] = len(genders)
+            genders.append(GENDER_CODES.get(gender, 0))
+        buffer = self.allocate(len(genders) * COLUMNS)
+        for position, code in enumerate(genders):
+            buffer[position * COLUMNS + GENDER] = code
+        for subject_identifier, defaulter, naive in (
+                baseline_facts_model_cls.objects.values_list(
+                    'subject_identifier', 'defaulter_at_baseline', 'naive_at_baseline')):
+            position = index.get(subject_identifier)
+            if position is not None:
+                buffer[position * COLUMNS + BASELINE] = self.pack_baseline(
+                    defaulter, naive)
+        self.index = index
+        self.buffer = buffer
+
+    def allocate(self, size=None):
+        """Returns a writable zero-filled byte buffer.
+        """
+        if shared_memory:
+            self._shared_memory = shared_memory.SharedMemory(
+                create=True, size=max(size, 1))
+            buffer = self._shared_memory.buf
+            buffer[:size] = bytes(size)
+            return buffer
+        return memoryview(RawArray('B', max(size, 1))).cast('B')
+
+    def release(self):
+        self.index = None
+        self.buffer = None
+        if self._shared_memory:
+            self._shared_memory.close()
+            self._shared_memory.unlink()
+            self._shared_memory = None
+
+    @staticmethod
+    def pack_baseline(defaulter=None, naive=None):
+        flags = 0
+        if defaulter is not None:
+            flags |= DEFAULTER_KNOWN | (DEFAULTER if defaulter else 0)
+        if naive is not None:
+            flags |= NAIVE_KNOWN | (NAIVE if naive else 0)
+        return flags
+
+    def _position(self, subject_identifier=None):
+        if not self.enabled:
+            return None
+        return self.index.get(subject_identifier)
+
+    def gender(self, subject_identifier=None):
+        """Returns the subject's gender or None if not loaded.
+        """
+        position = self._position(subject_identifier)
+        if position is None:
+            return None
+        return GENDERS.get(self.buffer[position * COLUMNS + GENDER])
+
+    def baseline_facts(self, subject_identifier=None):
+        """Returns a SubjectBaselineFacts or None if not loaded.
+        """
+        position = self._position(subject_identifier)
+        if position is None:
+            return None
+        flags = self.buffer[position * COLUMNS + BASELINE]
+        if not flags:
+            return None
+        return SubjectBaselineFacts(
+            defaulter_at_baseline=(
+                bool(flags & DEFAULTER) if flags & DEFAULTER_KNOWN else None),
+            naive_at_baseline=bool(flags & NAIVE) if flags & NAIVE_KNOWN else None)
+
+
+subject_arrays = SubjectArrays()
@@ -0,0 +1,159 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from django.test import TestCase
+from django.utils import timezone
+from edc_constants.constants import NEG, POS
+from edc_reference.models import Reference as ReferenceModel
+
+from ..as_of import AsOfEvaluator, AsOfIndex, AsOfIndexError, AsOfStatus
+from ..batch import BatchEvaluator
+from ..models import ReferenceInterval, StatusInterval
+from ..rule_set import RuleSet
+from ..visit_context import VisitContext
+
+
+Reference = namedtuple(
+    'Reference',
+    'identifier timepoint report_datetime model field_name value_str '
+    'value_int value_date value_datetime value_uuid')
+
+
+class StatusHelper:
+
+    final_hiv_status = NEG
+
+    def __init__(self, visit=None):
+        pass
+
+
+class VisitsBatchEvaluator(BatchEvaluator):
+
+    visits = [
+        VisitContext(subject_identifier='111111111', visit_code='T1'),
+        VisitContext(subject_identifier='111111111', visit_code='T1',
+                     visit_code_sequence=1)]
+
+    @property
+    def visit_pks(self):
+        return []
+
+    def contexts(self, pks=None):
+        yield self.visits
+
+
+class TestAsOfIndex(TestCase):
+
+    def setUp(self):
+        self.index = AsOfIndex()
+        self.t0 = datetime(2017, 1, 1, tzinfo=timezone.utc)
+        self.t1 = self.t0 + timedelta(days=30)
+        self.t2 = self.t0 + timedelta(days=60)
+        self.visit = VisitContext(subject_identifier='111111111', visit_code='T1')
+
+    def reference(self, value_str=None):
+        return Reference(
+            identifier='111111111', timepoint='T1', report_datetime=self.t0,
+            model='bcpp_subject.circumcision', field_name='circumcised',
+            value_str=value_str, value_int=None, value_date=None,
+            value_datetime=None, value_uuid=None)
+
+    def test_update_reference(self):
+        self.index.update_reference(self.reference('No'), now=self.t0)
+        self.index.update_reference(self.reference('No'), now=self.t1)
+        self.assertEqual(ReferenceInterval.objects.count(), 1)
+        self.index.update_reference(self.reference('Yes'), now=self.t1)
+        self.assertEqual(ReferenceInterval.objects.count(), 2)
+        self.assertEqual(
+            ReferenceInterval.objects.as_of(self.t0).get().value_str, 'No')
+        self.assertEqual(
+            ReferenceInterval.objects.as_of(self.t1).get().value_str, 'Yes')
+
+    def test_update_reference_unscheduled_visit(self):
+        self.index.update_reference(self.reference('No'), now=self.t0)
+        self.index.update_reference(
+            self.reference('Yes')._replace(report_datetime=self.t1), now=self.t1)
+        intervals = ReferenceInterval.objects.as_of(self.t2).order_by('report_datetime')
+        self.assertEqual(
+            [(obj.report_datetime, obj.value_str) for obj in intervals],
+            [(self.t0, 'No'), (self.t1, 'Yes')])
+
+    def test_build_unscheduled_visit(self):
+        for report_datetime, value_str in [(self.t0, 'No'), (self.t1, 'Yes')]:
+            ReferenceModel.objects.create(
+                identifier='111111111', timepoint='T1', report_datetime=report_datetime,
+                model='bcpp_subject.circumcision', field_name='circumcised',
+                datatype='CharField', value_str=value_str)
+        self.index.batch_evaluator_cls = VisitsBatchEvaluator
+        self.index.status_helper = f'{__name__}.StatusHelper'
+        self.assertEqual(self.index.build(now=self.t1).reference_count, 2)
+        self.assertEqual(ReferenceInterval.objects.as_of(self.t2).count(), 2)
+
+    def test_update_reference_deleted(self):
+        self.index.update_reference(self.reference('No'), now=self.t0)
+        self.index.update_reference(self.reference('No'), deleted=True, now=self.t1)
+        self.assertTrue(ReferenceInterval.objects.as_of(self.t0).exists())
+        self.assertFalse(ReferenceInterval.objects.as_of(self.t1).exists())
+
+    def test_record_status(self):
+        self.index.record_status(
+            visit=self.visit, status_helper_cls=StatusHelper, now=self.t0)
+        StatusHelper.final_hiv_status = POS
+        try:
+            self.index.record_status(
+                visit=self.visit, status_helper_cls=StatusHelper, now=self.t1)
+        finally:
+            StatusHelper.final_hiv_status = NEG
+        self.assertEqual(
+            StatusInterval.objects.filter(name='final_hiv_status').count(), 2)
+        with self.index.as_of(self.t0):
+            self.assertEqual(
+                AsOfStatus(visit=self.visit, as_of_index=self.index).final_hiv_status,
+                NEG)
+        with self.index.as_of(self.t2):
+            self.assertEqual(
+                AsOfStatus(visit=self.visit, as_of_index=self.index).final_hiv_status,
+                POS)
+
+    def test_status_not_recorded(self):
+        with self.index.as_of(self.t0):
+            self.assertRaises(
+                AsOfIndexError, AsOfStatus, visit=self.visit, as_of_index=self.index)
+
+    def test_as_of_restored(self):
+        with self.index.as_of(self.t0):
+            self.assertEqual(self.index.as_of_datetime, self.t0)
+            self.assertIsNot(self.index.status_helper_for(StatusHelper), StatusHelper)
+        self.assertIsNone(self.index.as_of_datetime)
+        self.assertIs(self.index.status_helper_for(StatusHelper), StatusHelper)
+
+    def test_build(self):
+        ReferenceModel.objects.create(
+            identifier='111111111', timepoint='T1', report_datetime=self.t0,
+            model='bcpp_subject.circumcision', field_name='circumcised',
+            datatype='CharField', value_str='No')
+        self.index.batch_evaluator_cls = VisitsBatchEvaluator
+        self.index.status_helper = f'{__name__}.StatusHelper'
+        build = self.index.build(now=self.t1)
+        self.assertEqual(build.reference_count, 1)
+        self.assertEqual(build.status_count, 2 * len(self.index.status_names))
+        self.assertEqual(ReferenceInterval.objects.get().valid_from, self.t1)
+        self.assertEqual(self.index.coverage, self.t1)
+        for visit in VisitsBatchEvaluator.visits:
+            with self.index.as_of(self.t2):
+                self.assertEqual(
+                    AsOfStatus(visit=visit, as_of_index=self.index).final_hiv_status,
+                    NEG)
+        self.assertEqual(self.index.build(now=self.t2).status_count, 0)
+        self.assertEqual(self.index.coverage, self.t1)
+
+    def test_evaluate_before_coverage(self):
+        evaluator = AsOfEvaluator(rule_set=RuleSet(rule_groups=[]))
+        evaluator.as_of_index = self.index
+        self.assertRaises(
+            AsOfIndexError, evaluator.evaluate, visit=self.visit, as_of=self.t1)
+        self.index.batch_evaluator_cls = VisitsBatchEvaluator
+        self.index.status_helper = f'{__name__}.StatusHelper'
+        self.index.build(now=self.t1)
+        self.assertRaises(
+            AsOfIndexError, evaluator.evaluate, visit=self.visit, as_of=self.t0)
+        self.assertEqual(evaluator.evaluate(visit=self.visit, as_of=self.t2), {})
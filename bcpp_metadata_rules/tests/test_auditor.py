@@ -0,0 +1,91 @@
+from django.test import TestCase
+from edc_metadata import KEYED, NOT_REQUIRED, REQUIRED
+from edc_metadata.models import CrfMetadata
+
+from ..auditor import (
+    AuditReport, Drift, MetadataAuditEvaluator, MetadataAuditor, Stored)
+from ..batch import VisitOutcome
+from ..rule_set import Outcome, RuleSet
+from ..visit_context import VisitContext
+
+
+class TestAuditor(TestCase):
+
+    target = ('bcpp_subject.pimacd4', None)
+
+    def visit_outcome(self, current=None, stored=None, error=None):
+        return VisitOutcome(
+            visit_id='1',
+            subject_identifier='111111111',
+            visit_code='T1',
+            survey_schedule=None,
+            outcomes={'current': current or {}, 'stored': stored or {}},
+            error=error)
+
+    def test_no_drift(self):
+        report = AuditReport()
+        report.add(self.visit_outcome(
+            current={self.target: Outcome(REQUIRED, 'A.pima_cd4')},
+            stored={self.target: [Stored(REQUIRED, '1')]}))
+        self.assertEqual(report.visit_count, 1)
+        self.assertEqual(report.drift, [])
+
+    def test_drift(self):
+        report = AuditReport()
+        drift = report.add(self.visit_outcome(
+            current={self.target: Outcome(NOT_REQUIRED, 'A.pima_cd4')},
+            stored={self.target: [Stored(REQUIRED, '1')]}))
+        self.assertEqual(drift, report.drift)
+        self.assertEqual(drift[0].expected, NOT_REQUIRED)
+        self.assertEqual(drift[0].stored, REQUIRED)
+        self.assertEqual(drift[0].rule, 'A.pima_cd4')
+        self.assertEqual(report.counts[self.target + (NOT_REQUIRED, REQUIRED)], 1)
+
+    def test_keyed_and_unscheduled_not_drift(self):
+        report = AuditReport()
+        report.add(self.visit_outcome(
+            current={self.target: Outcome(NOT_REQUIRED, 'A.pima_cd4'),
+                     ('bcpp_subject.hicenrollment', None): Outcome(
+                         REQUIRED, 'A.hic_enrollment')},
+            stored={self.target: [Stored(KEYED, '1')]}))
+        self.assertEqual(report.drift, [])
+
+    def test_error(self):
+        report = AuditReport()
+        report.add(self.visit_outcome(error='RuleEvaluatorError: ...'))
+        self.assertEqual(len(report.errors), 1)
+
+    def test_repair(self):
+        opts = dict(
+            subject_identifier='111111111', visit_schedule_name='visit_schedule',
+            schedule_name='schedule', visit_code='T1', show_order=10)
+        metadata = CrfMetadata.objects.create(
+            model='bcpp_subject.pimacd4', entry_status=REQUIRED, **opts)
+        keyed = CrfMetadata.objects.create(
+            model='bcpp_subject.hicenrollment', entry_status=KEYED, **opts)
+        auditor = MetadataAuditor(rule_set=RuleSet(rule_groups=[]))
+        drift = [Drift('111111111', 'T1', obj.model, None, NOT_REQUIRED, REQUIRED,
+                       'A.rule', str(obj.pk)) for obj in [metadata, keyed]]
+        self.assertEqual(auditor.repair(drift), 1)
+        metadata.refresh_from_db()
+        keyed.refresh_from_db()
+        self.assertEqual(metadata.entry_status, NOT_REQUIRED)
+        self.assertEqual(keyed.entry_status, KEYED)
+
+    def test_stored_by_visit(self):
+        opts = dict(
+            subject_identifier='111111111', visit_schedule_name='visit_schedule',
+            schedule_name='schedule', visit_code='T1', show_order=10,
+            model='bcpp_subject.pimacd4')
+        scheduled = CrfMetadata.objects.create(entry_status=REQUIRED, **opts)
+        unscheduled = CrfMetadata.objects.create(
+            entry_status=NOT_REQUIRED, visit_code_sequence=1, **opts)
+        visits = [
+            VisitContext(pk='1', subject_identifier='111111111', visit_code='T1'),
+            VisitContext(pk='2', subject_identifier='111111111', visit_code='T1',
+                         visit_code_sequence=1)]
+        stored = MetadataAuditEvaluator().stored(visits=visits)
+        self.assertEqual(
+            stored['1'], {self.target: [Stored(REQUIRED, str(scheduled.pk))]})
+        self.assertEqual(
+            stored['2'], {self.target: [Stored(NOT_REQUIRED, str(unscheduled.pk))]})
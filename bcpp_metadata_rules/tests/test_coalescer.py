@@ -0,0 +1,165 @@
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from edc_base.utils import get_utcnow
+from edc_registration.models import RegisteredSubject
+
+from ..batch import BatchEvaluator
+from ..coalescer import RuleRunCoalescer
+from ..predicates import Predicates
+from ..visit_context import VisitContext
+
+
+class RecordingEvaluator:
+
+    runs = []
+
+    def __init__(self, visit=None, app_label=None):
+        self.visit = visit
+
+    def run(self):
+        if self.visit.subject_identifier == 'fail':
+            raise ValueError('fail')
+        self.runs.append(self.visit.subject_identifier)
+
+
+class SubjectBatchEvaluator(BatchEvaluator):
+
+    def batches(self, pks=None):
+        yield list(self.visit_model_cls.objects.filter(pk__in=pks))
+
+
+class ReferenceReadingEvaluator:
+
+    predicates = Predicates()
+
+    def __init__(self, visit=None, app_label=None):
+        self.visit = visit
+
+    def run(self):
+        for field_name in ['has_tested', 'has_record']:
+            self.predicates.value(
+                visit=self.visit, reference_name='bcpp_subject.hivtestinghistory',
+                field_name=field_name)
+
+
+class ContextBatchEvaluator(BatchEvaluator):
+
+    report_datetime = get_utcnow()
+
+    def batches(self, pks=None):
+        yield [VisitContext(pk=obj.pk, subject_identifier=obj.subject_identifier,
+                            report_datetime=self.report_datetime)
+               for obj in self.visit_model_cls.objects.filter(pk__in=pks)]
+
+    @property
+    def reference_collections(self):
+        return [ReferenceReadingEvaluator.predicates]
+
+
+class TestCoalescer(TransactionTestCase):
+
+    def setUp(self):
+        RecordingEvaluator.runs = []
+        self.coalescer = RuleRunCoalescer()
+        self.coalescer.batch_evaluator_cls = SubjectBatchEvaluator
+        # any model instance will do as the "visit"
+        self.visit1 = RegisteredSubject.objects.create(subject_identifier='111111111')
+        self.visit2 = RegisteredSubject.objects.create(subject_identifier='222222222')
+
+    def test_not_in_transaction(self):
+        self.assertFalse(self.coalescer.add(
+            visit=self.visit1, evaluator_cls=RecordingEvaluator))
+
+    def test_runs_once_per_visit_on_commit(self):
+        with self.coalescer.coalesce():
+            for visit in [self.visit1, self.visit2, self.visit1, self.visit1]:
+                self.assertTrue(self.coalescer.add(
+                    visit=visit, evaluator_cls=RecordingEvaluator))
+            self.assertEqual(RecordingEvaluator.runs, [])
+        self.assertEqual(
+            sorted(RecordingEvaluator.runs), ['111111111', '222222222'])
+
+    def test_enabled_only_in_block(self):
+        self.assertFalse(self.coalescer.enabled)
+        with self.coalescer.coalesce():
+            self.assertTrue(self.coalescer.enabled)
+        self.assertFalse(self.coalescer.enabled)
+
+    def test_rolled_back_not_run(self):
+        try:
+            with self.coalescer.coalesce():
+                self.coalescer.add(visit=self.visit1, evaluator_cls=RecordingEvaluator)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(RecordingEvaluator.runs, [])
+        with self.coalescer.coalesce():
+            self.coalescer.add(visit=self.visit2, evaluator_cls=RecordingEvaluator)
+        self.assertEqual(RecordingEvaluator.runs, ['222222222'])
+
+    def test_rolled_back_savepoint_not_run(self):
+        with self.coalescer.coalesce():
+            try:
+                with self.coalescer.coalesce():
+                    self.coalescer.add(
+                        visit=self.visit1, evaluator_cls=RecordingEvaluator)
+                    raise ValueError
+            except ValueError:
+                pass
+            self.coalescer.add(visit=self.visit2, evaluator_cls=RecordingEvaluator)
+        self.assertEqual(RecordingEvaluator.runs, ['222222222'])
+
+    def test_flush_registered_once_per_transaction(self):
+        with self.coalescer.coalesce():
+            for visit in [self.visit1, self.visit2, self.visit1]:
+                self.coalescer.add(visit=visit, evaluator_cls=RecordingEvaluator)
+            self.assertEqual(len(connection.run_on_commit), 1)
+
+    def test_sync_import_runs_once_per_visit_after_block(self):
+        with self.coalescer.sync_import() as sync_import:
+            self.assertTrue(self.coalescer.enabled)
+            for visit in [self.visit1, self.visit2, self.visit1]:
+                # not in a transaction, still suppressed
+                self.assertTrue(self.coalescer.add(
+                    visit=visit, evaluator_cls=RecordingEvaluator))
+            self.assertEqual(RecordingEvaluator.runs, [])
+        self.assertIsNone(self.coalescer.importing)
+        self.assertEqual(
+            sorted(RecordingEvaluator.runs), ['111111111', '222222222'])
+        self.assertEqual(sync_import.run_count, 2)
+        self.assertEqual(sync_import.errors, [])
+
+    def test_sync_import_failure_does_not_stop_others(self):
+        failing = RegisteredSubject.objects.create(subject_identifier='fail')
+        with self.coalescer.sync_import() as sync_import:
+            for visit in [self.visit1, failing, self.visit2]:
+                self.coalescer.add(visit=visit, evaluator_cls=RecordingEvaluator)
+        self.assertEqual(
+            sorted(RecordingEvaluator.runs), ['111111111', '222222222'])
+        self.assertEqual(
+            sync_import.errors,
+            [('edc_registration.registeredsubject', str(failing.pk), 'ValueError: fail')])
+
+    def test_sync_import_flushed_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.coalescer.sync_import() as sync_import:
+                self.coalescer.add(visit=self.visit1, evaluator_cls=RecordingEvaluator)
+                raise ValueError('import failed')
+        self.assertIsNone(self.coalescer.importing)
+        self.assertEqual(RecordingEvaluator.runs, ['111111111'])
+        self.assertEqual(sync_import.run_count, 1)
+
+    def test_sync_import_preloads_reference_values_per_batch(self):
+        self.coalescer.batch_evaluator_cls = ContextBatchEvaluator
+        with CaptureQueriesContext(connection) as context:
+            with self.coalescer.sync_import() as sync_import:
+                for visit in [self.visit1, self.visit2]:
+                    for _ in range(2):
+                        self.coalescer.add(
+                            visit=visit, evaluator_cls=ReferenceReadingEvaluator)
+        self.assertEqual(sync_import.errors, [])
+        self.assertEqual(sync_import.run_count, 2)
+        self.assertEqual(
+            len([query for query in context.captured_queries
+                 if 'edc_reference_reference' in query['sql']]), 1)
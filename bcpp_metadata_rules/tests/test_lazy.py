@@ -0,0 +1,55 @@
+from django.test import TestCase
+from django.utils.functional import empty
+from edc_metadata import NOT_REQUIRED, REQUIRED
+
+from ..constants import PENDING
+from ..fingerprint import rule_digest
+from ..lazy import lazy_import
+from ..predicates import Predicates
+from ..rules import RequisitionRule
+
+
+def func_requires_nothing(visit, **kwargs):
+    return False
+
+
+class TestLazy(TestCase):
+
+    def test_lazy_import(self):
+        obj = lazy_import('bcpp_metadata_rules.constants.PENDING')
+        self.assertEqual(obj, PENDING)
+        self.assertEqual(hash(obj), hash(PENDING))
+
+    def test_lazy_import_digest_not_imported(self):
+        obj = lazy_import('bcpp_metadata_rules.constants.PENDING')
+        rule = RequisitionRule(
+            predicate=func_requires_nothing,
+            consequence=REQUIRED,
+            alternative=NOT_REQUIRED,
+            target_panels=[obj])
+        self.assertIn(['bcpp_metadata_rules.constants.PENDING'], rule_digest(rule))
+        self.assertTrue(obj._wrapped is empty)
+
+    def test_predicates_resolved_on_first_use(self):
+        pc = Predicates()
+        self.assertIsNone(pc._reference_model_cls)
+        self.assertIsNone(pc._status_helper_cls)
+        self.assertEqual(
+            pc.reference_model_cls._meta.label_lower, 'edc_reference.reference')
+        self.assertEqual(pc.status_helper_cls.__name__, 'StatusDbHelper')
+
+    def test_status_helper_cls_set(self):
+
+        class StatusHelper:
+            pass
+
+        class MyPredicates(Predicates):
+            status_helper_cls = StatusHelper
+
+        self.assertIsInstance(Predicates.__dict__['status_helper_cls'], property)
+        self.assertNotIn('status_helper_cls', MyPredicates.__dict__)
+        self.assertIs(MyPredicates().status_helper_cls, StatusHelper)
+        pc = Predicates()
+        pc.status_helper_cls = StatusHelper
+        self.assertIs(pc.status_helper_cls, StatusHelper)
+        self.assertIsNot(Predicates().status_helper_cls, StatusHelper)
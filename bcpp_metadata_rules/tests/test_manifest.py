@@ -0,0 +1,113 @@
+from django.test import TestCase
+from edc_metadata import NOT_REQUIRED, REQUIRED
+from edc_metadata_rules import CrfRuleGroup, P
+
+from ..manifest import (
+    REFERENCE, REGISTRATION, SOURCE, STATUS, VISIT, PredicateManifest, Source,
+    detect, reference, status)
+from ..predicates import Predicates
+from ..rules import CrfRule
+
+pc = Predicates()
+
+
+def func_undeclared(visit, **kwargs):
+    return visit.survey_schedule is None
+
+
+class MyPredicates(Predicates):
+
+    def func_calls_helper(self, visit, **kwargs):
+        return self.helper(visit) and self.names['circumcision']
+
+    def helper(self, visit):
+        return True
+
+
+class ManifestRuleGroup(CrfRuleGroup):
+
+    pos = CrfRule(
+        predicate=pc.func_hiv_positive,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_models=['hivcareadherence'])
+
+    partners = CrfRule(
+        predicate=pc.func_requires_recent_partner,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_models=['recentpartner'])
+
+    circumcised = CrfRule(
+        predicate=P('circumcised', 'eq', 'Yes'),
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_models=['circumcised'])
+
+    class Meta:
+        app_label = 'bcpp_subject'
+        source_model = 'bcpp_subject.circumcision'
+
+
+class UndeclaredRuleGroup(CrfRuleGroup):
+
+    undeclared = CrfRule(
+        predicate=func_undeclared,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_models=['hicenrollment'])
+
+    class Meta:
+        app_label = 'bcpp_subject'
+
+
+class TestManifest(TestCase):
+
+    def setUp(self):
+        self.manifest = PredicateManifest(rules=ManifestRuleGroup.get_rules())
+
+    def test_declared(self):
+        self.assertEqual(
+            self.manifest.rules['ManifestRuleGroup.pos'], (status('final_hiv_status'), ))
+        self.assertEqual(
+            self.manifest.rules['ManifestRuleGroup.partners'],
+            (reference('bcpp_subject.sexualbehaviour', 'last_year_partners'), ))
+
+    def test_source_model(self):
+        self.assertEqual(
+            self.manifest.rules['ManifestRuleGroup.circumcised'],
+            (Source(SOURCE, 'bcpp_subject.circumcision', 'circumcised'), ))
+
+    def test_kinds_and_reference_names(self):
+        self.assertEqual(self.manifest.kinds, {STATUS, REFERENCE, SOURCE})
+        self.assertEqual(
+            self.manifest.reference_names,
+            {'bcpp_subject.sexualbehaviour', 'bcpp_subject.circumcision',
+             'bcpp_subject.subjectvisit'})
+        self.assertEqual(list(self.manifest.by_kind(STATUS)), ['ManifestRuleGroup.pos'])
+        self.assertEqual(self.manifest.collections, [pc])
+
+    def test_detected(self):
+        manifest = PredicateManifest(rules=UndeclaredRuleGroup.get_rules())
+        self.assertEqual(
+            manifest.rules['UndeclaredRuleGroup.undeclared'],
+            (Source(VISIT, None, 'survey_schedule'), ))
+        self.assertEqual(
+            set(detect(Predicates._has_last_year_partners)),
+            {Source(REFERENCE, None, None)})
+        self.assertIn(Source(REGISTRATION, None, None), detect(Predicates.gender))
+
+    def test_detected_helper_unknown(self):
+        self.assertEqual(
+            detect(MyPredicates.func_calls_helper), (Source(REFERENCE, None, None), ))
+        rule = CrfRule(
+            predicate=MyPredicates().func_calls_helper,
+            consequence=REQUIRED,
+            alternative=NOT_REQUIRED,
+            target_models=['bcpp_subject.circumcised'])
+        self.assertIsNone(PredicateManifest(rules=[rule]).reference_names)
+
+    def test_every_predicate_declared(self):
+        for name in dir(Predicates):
+            if name.startswith('func_'):
+                self.assertTrue(hasattr(getattr(Predicates, name), 'sources'), name)
@@ -0,0 +1,60 @@
+from django.test import TestCase
+from edc_metadata import NOT_REQUIRED, REQUIRED
+from io import StringIO
+
+from ..batch import VisitOutcome
+from ..metadata_matrix import MetadataMatrix, MetadataMatrixError
+from ..rule_set import Outcome
+
+PIMA = ('bcpp_subject.pimacd4', None)
+VL = ('bcpp_subject.subjectrequisition', 'Viral Load')
+RBD = ('bcpp_subject.subjectrequisition', 'Research Blood Draw')
+
+
+class TestMetadataMatrix(TestCase):
+
+    def setUp(self):
+        self.matrix = MetadataMatrix(targets=[PIMA, VL, RBD])
+        for index, (visit_code, pima, vl) in enumerate([
+                ('T0', REQUIRED, REQUIRED),
+                ('T1', REQUIRED, REQUIRED),
+                ('T1', NOT_REQUIRED, REQUIRED),
+                ('T1', REQUIRED, NOT_REQUIRED)]):
+            self.matrix.add(VisitOutcome(
+                visit_id=str(index),
+                subject_identifier=f'11111111{index}',
+                visit_code=visit_code,
+                survey_schedule=None,
+                outcomes={'current': {
+                    PIMA: Outcome(pima, 'A.pima_cd4'),
+                    VL: Outcome(vl, 'B.vl_for_pos')}},
+                error=None))
+
+    def test_count(self):
+        self.assertEqual(self.matrix.count(PIMA), 3)
+        self.assertEqual(self.matrix.count(PIMA, VL), 2)
+        self.assertEqual(self.matrix.count(PIMA, VL, visit_code='T1'), 1)
+        self.assertEqual(self.matrix.count(PIMA, entry_status=NOT_REQUIRED), 1)
+        self.assertEqual(self.matrix.count(RBD), 0)
+
+    def test_target_by_name(self):
+        self.assertEqual(
+            self.matrix.count('bcpp_subject.pimacd4', 'Viral Load', visit_code='T1'), 1)
+        self.assertRaises(
+            MetadataMatrixError, self.matrix.target, 'bcpp_subject.subjectrequisition')
+
+    def test_counts_by_visit_code(self):
+        self.assertEqual(
+            dict(self.matrix.counts_by_visit_code(PIMA, VL)), {'T0': 1, 'T1': 1})
+
+    def test_rows_for(self):
+        rows = self.matrix.rows_for(self.matrix.select(PIMA, VL, visit_code='T1'))
+        self.assertEqual([row.visit_id for row in rows], ['1'])
+
+    def test_dump_and_load(self):
+        f = StringIO()
+        self.matrix.dump(f)
+        f.seek(0)
+        matrix = MetadataMatrix.load(f)
+        self.assertEqual(matrix.rows, self.matrix.rows)
+        self.assertEqual(matrix.count(PIMA, VL, visit_code='T1'), 1)
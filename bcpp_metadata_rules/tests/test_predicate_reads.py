@@ -0,0 +1,76 @@
+import time
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.test import TestCase
+from edc_constants.constants import FEMALE, MALE
+from edc_registration.models import RegisteredSubject
+
+from ..models import MonotonicFact
+from ..predicate_reads import predicate_reads
+from ..predicates import Predicates
+from ..side_effects import side_effects
+from ..visit_context import VisitContext
+
+
+class TestPredicateReads(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        self.app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        self.app_config.predicate_read_database = 'replica'
+        # the "replica" is stale
+        RegisteredSubject.objects.using('replica').create(
+            subject_identifier='111111111', gender=MALE)
+        predicate_reads.written_subjects.clear()
+        RegisteredSubject.objects.create(
+            subject_identifier='111111111', gender=FEMALE)
+        self.visit = VisitContext(subject_identifier='111111111', visit_code='T0')
+        self.pc = Predicates()
+
+    def tearDown(self):
+        self.app_config.predicate_read_database = None
+        predicate_reads.written_subjects.clear()
+
+    def test_reads_primary_outside_scope(self):
+        self.assertTrue(self.pc.func_is_female(self.visit))
+
+    def test_reads_replica(self):
+        predicate_reads.written_subjects.clear()
+        with predicate_reads.replica(visit=self.visit) as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertFalse(self.pc.func_is_female(self.visit))
+
+    def test_facts_not_persisted_from_replica(self):
+        predicate_reads.written_subjects.clear()
+        with predicate_reads.replica(visit=self.visit):
+            self.assertFalse(side_effects.allowed)
+            self.assertIsNone(self.pc.monotonic_fact_index.first_true(
+                subject_identifier='111111111',
+                spec=self.pc.is_circumcised.monotonic_fact,
+                reference_model_cls=self.pc.reference_model_cls))
+        self.assertTrue(side_effects.allowed)
+        self.assertFalse(MonotonicFact.objects.exists())
+
+    def test_guard_written_in_transaction(self):
+        with transaction.atomic():
+            RegisteredSubject.objects.get(subject_identifier='111111111').save()
+            with predicate_reads.replica(visit=self.visit) as alias:
+                self.assertIsNone(alias)
+                self.assertTrue(self.pc.func_is_female(self.visit))
+
+    def test_guard_replication_lag(self):
+        predicate_reads.written_subjects.update({'111111111': time.monotonic()})
+        with predicate_reads.replica(visit=self.visit) as alias:
+            self.assertIsNone(alias)
+        predicate_reads.written_subjects.update({'111111111': time.monotonic() - 60})
+        with predicate_reads.replica(visit=self.visit) as alias:
+            self.assertEqual(alias, 'replica')
+        self.assertNotIn('111111111', predicate_reads.written_subjects)
+
+    def test_not_configured(self):
+        self.app_config.predicate_read_database = None
+        with predicate_reads.replica(visit=self.visit) as alias:
+            self.assertIsNone(alias)
+            self.assertTrue(self.pc.func_is_female(self.visit))
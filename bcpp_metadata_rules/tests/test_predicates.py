@@ -1,3 +1,5 @@
+import sys
+
 from arrow.arrow import Arrow
 from bcpp_community.surveys import BCPP_YEAR_2, BCPP_YEAR_3
 from bcpp_metadata_rules.predicates import Predicates
@@ -7,10 +9,17 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from django.test import TestCase, tag
 from edc_constants.constants import NEG, POS, YES, NO, MALE, FEMALE
+from edc_metadata import KEYED, REQUIRED
+from edc_metadata.models import CrfMetadata
 from edc_reference import LongitudinalRefset, get_reference_name
+from edc_reference.models import Reference
 from edc_reference.tests import ReferenceTestHelper
 from edc_registration.models import RegisteredSubject
 
+from ..models import BaselineFacts, MonotonicFact
+from ..reference_values import ReferenceValueError
+from ..visit_context import VisitContext
+
 MICROTUBE = 'Microtube'
 
 
@@ -62,6 +71,13 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
         StatusHelper(visit=visit, update_history=True)
         return func(visit)
 
+    def create_baseline_metadata(self, entry_status=None):
+        return CrfMetadata.objects.create(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name='visit_schedule', schedule_name='schedule',
+            visit_code='T0', show_order=10, model=f'{self.app_label}.hivresult',
+            entry_status=entry_status)
+
     @property
     def subject_visits(self):
         return LongitudinalRefset(
@@ -71,6 +87,14 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
             reference_model_cls=self.reference_model
         ).order_by('report_datetime')
 
+    def test_names(self):
+        pc = Predicates()
+        self.assertIs(
+            pc.names['circumcision'], sys.intern(f'{self.app_label}.circumcision'))
+        self.assertEqual(
+            pc.names[('subjectrequisition', MICROTUBE)],
+            get_reference_name(f'{self.app_label}.subjectrequisition', MICROTUBE))
+
     def test_is_circumcised_none(self):
         pc = Predicates()
         self.assertFalse(pc.is_circumcised(self.subject_visits[0]))
@@ -125,6 +149,63 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
         self.assertTrue(pc.is_circumcised(self.subject_visits[0]))
         self.assertTrue(pc.is_circumcised(self.subject_visits[1]))
 
+    def test_is_circumcised_index_updated_on_save(self):
+        pc = Predicates()
+        self.assertFalse(pc.is_circumcised(self.subject_visits[1]))
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[1].report_datetime,
+            reference_name=f'{self.app_label}.circumcision',
+            visit_code=self.subject_visits[1].visit_code,
+            circumcised=YES)
+        obj = MonotonicFact.objects.get(
+            subject_identifier=self.subject_identifier,
+            name=f'{self.app_label}.circumcision.circumcised')
+        self.assertEqual(
+            obj.first_true_datetime, self.subject_visits[1].report_datetime)
+        self.assertFalse(pc.is_circumcised(self.subject_visits[0]))
+        self.assertTrue(pc.is_circumcised(self.subject_visits[1]))
+        self.assertTrue(pc.is_circumcised(self.subject_visits[2]))
+
+    def test_is_circumcised_index_kept_unless_true_value_changed(self):
+        pc = Predicates()
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[0].report_datetime,
+            reference_name=f'{self.app_label}.circumcision',
+            visit_code=self.subject_visits[0].visit_code,
+            circumcised=YES)
+        self.assertTrue(pc.is_circumcised(self.subject_visits[1]))
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[1].report_datetime,
+            reference_name=f'{self.app_label}.circumcision',
+            visit_code=self.subject_visits[1].visit_code,
+            circumcised=NO)
+        obj = MonotonicFact.objects.get(
+            subject_identifier=self.subject_identifier,
+            name=f'{self.app_label}.circumcision.circumcised')
+        self.assertEqual(
+            obj.first_true_datetime, self.subject_visits[0].report_datetime)
+        reference = Reference.objects.get(
+            identifier=self.subject_identifier,
+            report_datetime=self.subject_visits[0].report_datetime,
+            model=f'{self.app_label}.circumcision',
+            field_name='circumcised')
+        reference.value_str = NO
+        reference.save()
+        self.assertFalse(MonotonicFact.objects.filter(pk=obj.pk).exists())
+        self.assertFalse(pc.is_circumcised(self.subject_visits[1]))
+
+    def test_is_circumcised_without_index(self):
+        pc = Predicates()
+        pc.monotonic_fact_index = None
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[1].report_datetime,
+            reference_name=f'{self.app_label}.circumcision',
+            visit_code=self.subject_visits[1].visit_code,
+            circumcised=YES)
+        self.assertFalse(pc.is_circumcised(self.subject_visits[0]))
+        self.assertTrue(pc.is_circumcised(self.subject_visits[1]))
+        self.assertFalse(MonotonicFact.objects.all().exists())
+
     def test_is_hic_enrolled_yes(self):
         pc = Predicates()
         self.reference_helper.create_for_model(
@@ -206,6 +287,117 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
                 pc.func_requires_recent_partner,
                 self.subject_visits[2]))
 
+    def test_value_is_typed(self):
+        pc = Predicates()
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[0].report_datetime,
+            reference_name=f'{self.app_label}.sexualbehaviour',
+            visit_code=self.subject_visits[0].visit_code,
+            last_year_partners='2.0')
+        self.assertEqual(pc.value(
+            visit=self.subject_visits[0],
+            reference_name=f'{self.app_label}.sexualbehaviour',
+            field_name='last_year_partners'), 2)
+        self.assertIsNone(pc.value(
+            visit=self.subject_visits[1],
+            reference_name=f'{self.app_label}.sexualbehaviour',
+            field_name='last_year_partners'))
+
+    def test_value_not_a_number_is_missing(self):
+        pc = Predicates()
+        for visit, value in [(self.subject_visits[0], 'two'),
+                             (self.subject_visits[1], 'NaN')]:
+            self.reference_helper.create_for_model(
+                report_datetime=visit.report_datetime,
+                reference_name=f'{self.app_label}.sexualbehaviour',
+                visit_code=visit.visit_code,
+                last_year_partners=value)
+            self.assertIsNone(pc.value(
+                visit=visit,
+                reference_name=f'{self.app_label}.sexualbehaviour',
+                field_name='last_year_partners'))
+
+    def test_value_not_declared(self):
+        pc = Predicates()
+        self.assertRaises(
+            ReferenceValueError, pc.value,
+            visit=self.subject_visits[0],
+            reference_name=f'{self.app_label}.sexualbehaviour',
+            field_name='blah')
+
+    def test_value_prefetch_loads_visit_once(self):
+        pc = Predicates()
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[0].report_datetime,
+            reference_name=f'{self.app_label}.hivtestinghistory',
+            visit_code=self.subject_visits[0].visit_code,
+            has_tested=NO,
+            has_record=YES)
+        with pc.reference_values.prefetch():
+            with self.assertNumQueries(1):
+                self.assertTrue(pc.func_requires_hivuntested(self.subject_visits[0]))
+                self.assertTrue(pc.func_requires_hivtestreview(self.subject_visits[0]))
+                self.assertFalse(pc.func_requires_venous(self.subject_visits[0]))
+
+    def test_value_preload_loads_visits_with_one_query(self):
+        pc = Predicates()
+        visits = [self.subject_visits[index] for index in range(3)]
+        for visit in visits[:2]:
+            self.reference_helper.create_for_model(
+                report_datetime=visit.report_datetime,
+                reference_name=f'{self.app_label}.hivtestinghistory',
+                visit_code=visit.visit_code,
+                has_tested=NO)
+        with pc.reference_values.prefetch():
+            with self.assertNumQueries(1):
+                pc.reference_values.preload(
+                    visits=visits,
+                    reference_model_cls=pc.reference_model_cls,
+                    field_types=pc.reference_field_types)
+            with self.assertNumQueries(0):
+                self.assertTrue(pc.func_requires_hivuntested(visits[0]))
+                self.assertTrue(pc.func_requires_hivuntested(visits[1]))
+                self.assertFalse(pc.func_requires_hivuntested(visits[2]))
+
+    def test_visit_context(self):
+        pc = Predicates()
+        visit = self.subject_visits[0]
+        self.reference_helper.create_for_model(
+            report_datetime=visit.report_datetime,
+            reference_name=f'{self.app_label}.hivtestinghistory',
+            visit_code=visit.visit_code,
+            has_tested=NO)
+        context = VisitContext(
+            subject_identifier=visit.subject_identifier,
+            report_datetime=visit.report_datetime,
+            survey_schedule=None,
+            visit_code=visit.visit_code)
+        self.assertFalse(hasattr(context, '__dict__'))
+        self.assertEqual(context.timepoint, visit.visit_code)
+        self.assertTrue(pc.func_requires_hivuntested(context))
+        self.assertFalse(pc.is_circumcised(context))
+
+    def test_value_matches_visit_report_datetime(self):
+        """Asserts an unscheduled visit, with the same visit code,
+        does not read the scheduled visit's references.
+        """
+        pc = Predicates()
+        visit = self.subject_visits[0]
+        self.reference_helper.create_for_model(
+            report_datetime=visit.report_datetime,
+            reference_name=f'{self.app_label}.hivtestinghistory',
+            visit_code=visit.visit_code,
+            has_tested=NO)
+        unscheduled = VisitContext(
+            subject_identifier=visit.subject_identifier,
+            report_datetime=visit.report_datetime + relativedelta(days=3),
+            survey_schedule=None,
+            visit_code=visit.visit_code,
+            visit_code_sequence=1)
+        with pc.reference_values.prefetch():
+            self.assertTrue(pc.func_requires_hivuntested(visit))
+            self.assertFalse(pc.func_requires_hivuntested(unscheduled))
+
     def func_requires_recent_partner_1(self):
         pc = Predicates()
         self.reference_helper.create_for_model(
@@ -373,6 +565,47 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
                 pc.func_requires_hivlinkagetocare,
                 self.subject_visits[2]))
 
+    def test_baseline_facts_cached_for_follow_up(self):
+        pc = Predicates()
+        self.create_baseline_metadata(KEYED)
+        self.prepare_art_status(visit=self.subject_visits[0], naive=True)
+        self.run_metadata_rule(
+            pc.func_requires_hivlinkagetocare, self.subject_visits[0])
+        self.assertFalse(BaselineFacts.objects.all().exists())
+        self.assertTrue(
+            self.run_metadata_rule(
+                pc.func_requires_hivlinkagetocare, self.subject_visits[1]))
+        obj = BaselineFacts.objects.get(subject_identifier=self.subject_identifier)
+        self.assertTrue(obj.naive_at_baseline)
+
+    def test_baseline_facts_not_cached_until_final(self):
+        pc = Predicates()
+        metadata = self.create_baseline_metadata(REQUIRED)
+        self.prepare_art_status(visit=self.subject_visits[0], naive=True)
+        self.assertTrue(
+            self.run_metadata_rule(
+                pc.func_requires_hivlinkagetocare, self.subject_visits[1]))
+        self.assertFalse(BaselineFacts.objects.all().exists())
+        metadata.entry_status = KEYED
+        metadata.save()
+        self.run_metadata_rule(
+            pc.func_requires_hivlinkagetocare, self.subject_visits[1])
+        self.assertTrue(BaselineFacts.objects.all().exists())
+
+    def test_baseline_facts_invalidated_on_baseline_edit(self):
+        pc = Predicates()
+        self.create_baseline_metadata(KEYED)
+        self.run_metadata_rule(
+            pc.func_requires_hivlinkagetocare, self.subject_visits[1])
+        self.assertTrue(BaselineFacts.objects.all().exists())
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[0].report_datetime,
+            reference_name=f'{self.app_label}.hivtestreview',
+            visit_code=self.subject_visits[0].visit_code,
+            recorded_hiv_result=POS,
+            hiv_test_date=self.subject_visits[0].report_datetime.date())
+        self.assertFalse(BaselineFacts.objects.all().exists())
+
     def test_func_art_defaulter(self):
         pc = Predicates()
         self.assertFalse(
@@ -655,6 +888,27 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
             self.run_metadata_rule(
                 pc.func_anonymous_member, self.subject_visits[0]))
 
+    def test_exists_any_bounded(self):
+        pc = Predicates()
+        self.reference_helper.create_for_model(
+            report_datetime=self.subject_visits[1].report_datetime,
+            reference_name=f'{self.app_label}.anonymousconsent',
+            visit_code=self.subject_visits[1].visit_code,
+            consent_datetime=self.subject_visits[1].report_datetime)
+        opts = dict(
+            reference_name=f'{self.app_label}.anonymousconsent',
+            subject_identifier=self.subject_identifier,
+            field_name='consent_datetime')
+        self.assertTrue(pc.exists_any(**opts))
+        self.assertFalse(pc.exists_any(
+            report_datetime__lte=self.subject_visits[0].report_datetime, **opts))
+        self.assertTrue(pc.exists_any(
+            report_datetime__gte=self.subject_visits[1].report_datetime, **opts))
+        self.assertTrue(pc.exists_any(
+            value=self.subject_visits[1].report_datetime, **opts))
+        self.assertFalse(pc.exists_any(
+            value=self.subject_visits[0].report_datetime, **opts))
+
     def test_func_requires_circumcision_male(self):
         RegisteredSubject.objects.create(
             subject_identifier=self.subject_identifier,
@@ -695,7 +949,9 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
             reference_name=f'{self.app_label}.hivtestreview',
             visit_code=self.subject_visits[0].visit_code,
             recorded_hiv_result=NEG,
-            hiv_test_date=(self.subject_visits[0].report_datetime - relativedelta(days=50)).date())
+            hiv_test_date=(
+                self.subject_visits[0].report_datetime
+                - relativedelta(days=50)).date())
         self.assertTrue(
             self.run_metadata_rule(
                 pc.func_requires_microtube, self.subject_visits[0]))
@@ -708,7 +964,9 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
             reference_name=f'{self.app_label}.hivtestreview',
             visit_code=self.subject_visits[0].visit_code,
             recorded_hiv_result=POS,
-            hiv_test_date=(self.subject_visits[0].report_datetime - relativedelta(days=50)).date())
+            hiv_test_date=(
+                self.subject_visits[0].report_datetime
+                - relativedelta(days=50)).date())
         self.assertFalse(
             self.run_metadata_rule(
                 pc.func_requires_microtube, self.subject_visits[0]))
@@ -735,13 +993,17 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
             reference_name=f'{self.app_label}.hivtestreview',
             visit_code=self.subject_visits[0].visit_code,
             recorded_hiv_result=NEG,
-            hiv_test_date=(self.subject_visits[0].report_datetime - relativedelta(days=50)).date())
+            hiv_test_date=(
+                self.subject_visits[0].report_datetime
+                - relativedelta(days=50)).date())
         self.reference_helper.create_for_model(
             report_datetime=self.subject_visits[1].report_datetime,
             reference_name=f'{self.app_label}.hivtestreview',
             visit_code=self.subject_visits[1].visit_code,
             recorded_hiv_result=NEG,
-            hiv_test_date=(self.subject_visits[1].report_datetime - relativedelta(days=50)).date())
+            hiv_test_date=(
+                self.subject_visits[1].report_datetime
+                - relativedelta(days=50)).date())
         self.assertTrue(
             self.run_metadata_rule(
                 pc.func_requires_microtube, self.subject_visits[1]))
@@ -754,13 +1016,17 @@ class TestPredicates(StatusHelperTestMixin, TestCase):
             reference_name=f'{self.app_label}.hivtestreview',
             visit_code=self.subject_visits[0].visit_code,
             recorded_hiv_result=POS,
-            hiv_test_date=(self.subject_visits[0].report_datetime - relativedelta(days=50)).date())
+            hiv_test_date=(
+                self.subject_visits[0].report_datetime
+                - relativedelta(days=50)).date())
         self.reference_helper.create_for_model(
             report_datetime=self.subject_visits[1].report_datetime,
             reference_name=f'{self.app_label}.hivtestreview',
             visit_code=self.subject_visits[1].visit_code,
             recorded_hiv_result=POS,
-            hiv_test_date=(self.subject_visits[1].report_datetime - relativedelta(days=50)).date())
+            hiv_test_date=(
+                self.subject_visits[1].report_datetime
+                - relativedelta(days=50)).date())
         self.assertFalse(
             self.run_metadata_rule(
                 pc.func_requires_microtube, self.subject_visits[1]))
@@ -0,0 +1,99 @@
+from collections import namedtuple
+from datetime import datetime
+from django.test import TestCase
+from edc_metadata import NOT_REQUIRED, REQUIRED
+from edc_metadata_rules import RequisitionRuleGroup
+from edc_registration.models import RegisteredSubject
+
+from ..batch import BatchEvaluator
+from ..requisition_forecast import Demand, RequisitionForecast
+from ..rule_set import RuleSet
+from ..rules import RequisitionRule
+from ..visit_context import VisitContext
+
+Panel = namedtuple('Panel', 'name')
+
+
+def func_always(visit, **kwargs):
+    return True
+
+
+def func_requires_viral_load(visit, **kwargs):
+    return visit.visit_code == 'T1'
+
+
+class ForecastRuleGroup(RequisitionRuleGroup):
+
+    microtube = RequisitionRule(
+        predicate=func_always,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_panels=[Panel('microtube')])
+
+    viral_load = RequisitionRule(
+        predicate=func_requires_viral_load,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_panels=[Panel('viral_load')])
+
+    class Meta:
+        app_label = 'bcpp_subject'
+        requisition_model = 'bcpp_subject.subjectrequisition'
+
+
+class Appointments:
+
+    """Yields visit contexts as ScheduledAppointments would for
+    new appointments.
+    """
+
+    appointments = [
+        ('1', '111111111', datetime(2017, 5, 1, 9), 'otse', 'T1'),
+        ('2', '222222222', datetime(2017, 5, 1, 10), 'otse', 'T2'),
+        ('3', '333333333', datetime(2017, 5, 2, 9), 'otse', 'T1'),
+        ('4', '444444444', datetime(2017, 5, 1, 9), 'digawana', 'T1'),
+        ('5', 'unregistered', datetime(2017, 5, 1, 9), 'otse', 'T1')]
+
+    def __init__(self, **kwargs):
+        pass
+
+    def contexts(self):
+        yield [VisitContext(
+            pk=pk, subject_identifier=subject_identifier,
+            report_datetime=appt_datetime,
+            survey_schedule=f'bcpp-survey.bcpp-year-2.{map_area}',
+            visit_code=visit_code)
+            for pk, subject_identifier, appt_datetime, map_area, visit_code
+            in self.appointments]
+
+
+class TestRequisitionForecast(TestCase):
+
+    def test_map_area(self):
+        self.assertEqual(
+            RequisitionForecast.map_area('bcpp-survey.bcpp-year-2.otse'), 'otse')
+        self.assertIsNone(RequisitionForecast.map_area(None))
+
+    def test_requisition_rule_groups_only(self):
+        forecast = RequisitionForecast(days=1)
+        for rule_group in forecast.rule_set.rule_groups:
+            self.assertTrue(issubclass(rule_group, RequisitionRuleGroup))
+
+    def test_run(self):
+        for subject_identifier in ['111111111', '222222222', '333333333', '444444444']:
+            RegisteredSubject.objects.create(subject_identifier=subject_identifier)
+        forecast = RequisitionForecast(days=2)
+        forecast.scheduled = Appointments()
+        forecast.rule_set = RuleSet(
+            rule_groups=[ForecastRuleGroup], name='requisitions')
+        forecast.batch_evaluator = BatchEvaluator(rule_sets=[forecast.rule_set])
+        demand = forecast.run()
+        self.assertEqual(demand, [
+            Demand('digawana', datetime(2017, 5, 1).date(), 'microtube', 1),
+            Demand('digawana', datetime(2017, 5, 1).date(), 'viral_load', 1),
+            Demand('otse', datetime(2017, 5, 1).date(), 'microtube', 2),
+            Demand('otse', datetime(2017, 5, 1).date(), 'viral_load', 1),
+            Demand('otse', datetime(2017, 5, 2).date(), 'microtube', 1),
+            Demand('otse', datetime(2017, 5, 2).date(), 'viral_load', 1)])
+        self.assertEqual(
+            [visit_outcome.visit_id for visit_outcome in forecast.errors], ['5'])
@@ -0,0 +1,108 @@
+from datetime import datetime
+from django.apps import apps as django_apps
+from django.test import TestCase
+from django.utils import timezone
+from edc_metadata import NOT_REQUIRED, REQUIRED
+from edc_metadata_rules import CrfRuleGroup
+from edc_registration.models import RegisteredSubject
+
+from ..fingerprint import deploy_salt, rule_fingerprint
+from ..models import CachedRuleResult
+from ..rule_results import rule_results
+from ..side_effects import side_effects
+from ..visit_context import VisitContext
+from ..rules import CrfRule
+
+calls = []
+
+
+def func_counted(visit, **kwargs):
+    calls.append(visit.visit_code)
+    return True
+
+
+class CountedRuleGroup(CrfRuleGroup):
+
+    counted = CrfRule(
+        predicate=func_counted,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_models=['hicenrollment'])
+
+    class Meta:
+        app_label = 'bcpp_subject'
+
+
+class TestRuleResults(TestCase):
+
+    def setUp(self):
+        self.app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        self.app_config.cache_rule_results = True
+        RegisteredSubject.objects.create(subject_identifier='111111111')
+        self.visit = VisitContext(
+            subject_identifier='111111111', visit_code='T0',
+            report_datetime=timezone.make_aware(datetime(2017, 5, 1)))
+        self.rule = CountedRuleGroup.get_rules()[0]
+        del calls[:]
+
+    def tearDown(self):
+        self.app_config.cache_rule_results = False
+
+    def test_cached(self):
+        result = self.rule.run(visit=self.visit)
+        self.assertEqual(dict(result), {'bcpp_subject.hicenrollment': REQUIRED})
+        self.assertEqual(self.rule.run(visit=self.visit), result)
+        self.assertEqual(calls, ['T0'])
+        self.assertEqual(CachedRuleResult.objects.count(), 1)
+
+    def test_invalidated_by_input_version(self):
+        self.rule.run(visit=self.visit)
+        RegisteredSubject.objects.get(subject_identifier='111111111').save()
+        self.rule.run(visit=self.visit)
+        self.assertEqual(calls, ['T0', 'T0'])
+        self.assertEqual(CachedRuleResult.objects.count(), 1)
+
+    def test_prefetch_loads_visit_once(self):
+        self.rule.run(visit=self.visit)
+        with rule_results.prefetch():
+            with self.assertNumQueries(2):
+                self.rule.run(visit=self.visit)
+                self.rule.run(visit=self.visit)
+
+    def test_disabled(self):
+        self.app_config.cache_rule_results = False
+        self.rule.run(visit=self.visit)
+        self.rule.run(visit=self.visit)
+        self.assertEqual(calls, ['T0', 'T0'])
+
+    def test_not_shared_with_unscheduled_visit(self):
+        self.rule.run(visit=self.visit)
+        unscheduled = VisitContext(
+            subject_identifier='111111111', visit_code='T0', visit_code_sequence=1,
+            report_datetime=timezone.make_aware(datetime(2017, 5, 3)))
+        self.rule.run(visit=unscheduled)
+        self.assertEqual(calls, ['T0', 'T0'])
+        self.assertEqual(CachedRuleResult.objects.count(), 2)
+
+    def test_not_persisted_with_side_effects_suppressed(self):
+        with side_effects.suppress():
+            self.rule.run(visit=self.visit)
+        self.assertEqual(CachedRuleResult.objects.count(), 0)
+
+    def test_bumped_if_disabled(self):
+        self.rule.run(visit=self.visit)
+        self.app_config.cache_rule_results = False
+        RegisteredSubject.objects.get(subject_identifier='111111111').save()
+        self.app_config.cache_rule_results = True
+        self.rule.run(visit=self.visit)
+        self.assertEqual(calls, ['T0', 'T0'])
+
+    def test_fingerprint_salted(self):
+        fingerprint = rule_fingerprint(self.rule)
+        self.app_config.rule_fingerprint_salt = 'salt'
+        deploy_salt.cache_clear()
+        try:
+            self.assertNotEqual(rule_fingerprint(self.rule), fingerprint)
+        finally:
+            self.app_config.rule_fingerprint_salt = None
+            deploy_salt.cache_clear()
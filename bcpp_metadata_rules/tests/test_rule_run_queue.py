@@ -0,0 +1,111 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from edc_base.utils import get_utcnow
+
+from ..batch import BatchEvaluator
+from ..constants import DONE, FAILED, PENDING, PROCESSING
+from ..models import RuleRunQueueItem
+from ..predicates import Predicates
+from ..rule_run_queue import RuleRunQueue
+from ..visit_context import VisitContext
+
+
+class ReferenceReadingEvaluator:
+
+    predicates = Predicates()
+
+    def __init__(self, visit=None, app_label=None):
+        self.visit = visit
+
+    def run(self):
+        self.predicates.value(
+            visit=self.visit, reference_name='bcpp_subject.sexualbehaviour',
+            field_name='last_year_partners')
+
+
+class ContextBatchEvaluator(BatchEvaluator):
+
+    report_datetime = get_utcnow()
+
+    def batches(self, pks=None):
+        yield [VisitContext(pk=pk, subject_identifier='111111111',
+                            report_datetime=self.report_datetime) for pk in pks]
+
+    @property
+    def reference_collections(self):
+        return [ReferenceReadingEvaluator.predicates]
+
+
+class TestRuleRunQueue(TestCase):
+
+    def setUp(self):
+        self.queue = RuleRunQueue()
+        for index in range(3):
+            RuleRunQueueItem.objects.create(
+                visit_model='bcpp_subject.subjectvisit',
+                visit_id=str(index),
+                subject_identifier='111111111',
+                visit_code=f'T{index}',
+                app_label='bcpp_subject')
+
+    def test_pending_since(self):
+        self.assertIsNotNone(self.queue.pending_since(
+            visit_model='bcpp_subject.subjectvisit', visit_id='0'))
+        self.assertIsNone(self.queue.pending_since(
+            visit_model='bcpp_subject.subjectvisit', visit_id='9'))
+
+    def test_claim(self):
+        items = self.queue.claim(batch_size=2)
+        self.assertEqual(len(items), 2)
+        self.assertEqual(
+            RuleRunQueueItem.objects.filter(status=PROCESSING).count(), 2)
+        self.assertEqual(
+            RuleRunQueueItem.objects.filter(status=PENDING).count(), 1)
+
+    def test_claim_does_not_reclaim(self):
+        first = self.queue.claim(batch_size=2)
+        second = self.queue.claim(batch_size=2)
+        self.assertEqual(len(second), 1)
+        self.assertNotIn(second[0].pk, [item.pk for item in first])
+
+    def test_finish(self):
+        item = self.queue.claim(batch_size=1)[0]
+        self.queue.finish(item, status='done')
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'done')
+        self.assertIsNotNone(item.done_datetime)
+
+    def test_add_once_while_pending(self):
+        opts = dict(visit_model='bcpp_subject.subjectvisit', visit_id='9',
+                    subject_identifier='222222222', visit_code='T1',
+                    app_label='bcpp_subject')
+        item = self.queue.add(**opts)
+        self.assertEqual(self.queue.add(**opts).pk, item.pk)
+        self.queue.model_cls.objects.filter(pk=item.pk).update(
+            status=PROCESSING, pending_key=None)
+        self.assertNotEqual(self.queue.add(**opts).pk, item.pk)
+
+    def test_reclaim(self):
+        item = self.queue.claim(batch_size=1)[0]
+        self.assertEqual(self.queue.reclaim(timeout=60), 0)
+        RuleRunQueueItem.objects.filter(pk=item.pk).update(
+            started_datetime=get_utcnow() - timedelta(minutes=5))
+        self.assertEqual(self.queue.reclaim(timeout=60), 1)
+        item.refresh_from_db()
+        self.assertEqual(item.status, FAILED)
+        self.assertEqual(RuleRunQueueItem.objects.filter(
+            visit_id=item.visit_id, status=PENDING).count(), 1)
+        self.assertTrue(self.queue.pending_since(
+            visit_model=item.visit_model, visit_id=item.visit_id))
+
+    def test_process_preloads_reference_values(self):
+        self.queue.batch_evaluator_cls = ContextBatchEvaluator
+        items = self.queue.claim(batch_size=3)
+        with CaptureQueriesContext(connection) as context:
+            self.queue.process(items=items, evaluator_cls=ReferenceReadingEvaluator)
+        self.assertEqual(
+            len([query for query in context.captured_queries
+                 if 'edc_reference_reference' in query['sql']]), 1)
+        self.assertEqual(RuleRunQueueItem.objects.filter(status=DONE).count(), 3)
@@ -0,0 +1,167 @@
+from collections import namedtuple
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.test import TestCase
+from edc_metadata import NOT_REQUIRED, REQUIRED
+from edc_metadata_rules import CrfRuleGroup
+
+from ..fingerprint import code_digest, rule_fingerprint, rule_groups_fingerprint
+from ..rule_set import RuleSet
+from ..rules import CrfRule
+
+
+class Visit:
+
+    def __init__(self, survey_schedule=None):
+        self.survey_schedule = survey_schedule
+
+
+Crf = namedtuple('Crf', 'model')
+ScheduleVisit = namedtuple('ScheduleVisit', 'crfs crfs_unscheduled crfs_prn')
+
+
+class ScheduledVisit(Visit):
+
+    def __init__(self, survey_schedule=None, visit=None, visit_code_sequence=None):
+        super().__init__(survey_schedule=survey_schedule)
+        self.visit = visit
+        self.visit_code_sequence = visit_code_sequence or 0
+
+
+def func_not_called(visit, **kwargs):
+    raise AssertionError('Predicate called')
+
+
+class SurveyRuleGroup(CrfRuleGroup):
+
+    hic_enrollment = CrfRule(
+        predicate=func_not_called,
+        consequence=REQUIRED,
+        alternative=NOT_REQUIRED,
+        target_models=['hicenrollment'],
+        exclude_survey_schedules=['bcpp-year-3'])
+
+    class Meta:
+        app_label = 'bcpp_subject'
+
+
+class TestRules(TestCase):
+
+    def test_applies_to(self):
+        rule = SurveyRuleGroup.get_rules()[0]
+        self.assertTrue(rule.applies_to('bcpp-year-2'))
+        self.assertFalse(rule.applies_to('bcpp-year-3'))
+
+    def test_applies_to_included(self):
+        rule = CrfRule(
+            predicate=func_not_called,
+            consequence=REQUIRED,
+            alternative=NOT_REQUIRED,
+            target_models=['bcpp_subject.hicenrollment'],
+            survey_schedules=['bcpp-year-1'])
+        self.assertTrue(rule.applies_to('bcpp-year-1'))
+        self.assertFalse(rule.applies_to('bcpp-year-2'))
+
+    def test_run_not_applicable(self):
+        rule = SurveyRuleGroup.get_rules()[0]
+        self.assertEqual(
+            dict(rule.run(visit=Visit(survey_schedule='bcpp-year-3'))),
+            {'bcpp_subject.hicenrollment': NOT_REQUIRED})
+
+    def test_rule_set_plan(self):
+        rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+        self.assertEqual(rule_set.survey_schedules, ['bcpp-year-3'])
+        [(_, result)] = rule_set.plan('bcpp-year-3')
+        self.assertEqual(dict(result), {'bcpp_subject.hicenrollment': NOT_REQUIRED})
+        [(_, result)] = rule_set.plan('bcpp-year-2')
+        self.assertIsNone(result)
+
+    def test_rule_set_evaluate_pruned(self):
+        rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+        outcomes = rule_set.evaluate(visit=Visit(survey_schedule='bcpp-year-3'))
+        self.assertEqual(
+            outcomes[('bcpp_subject.hicenrollment', None)].entry_status,
+            NOT_REQUIRED)
+
+    def test_rule_set_resolves_rule_once(self):
+        rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+        rule = rule_set.rules[0]
+        self.assertEqual(rule_set.resolve(rule), (str(rule), [None]))
+        self.assertIs(rule_set.resolve(rule), rule_set.resolve(rule))
+
+    def test_fingerprint_stable(self):
+        self.assertEqual(
+            rule_groups_fingerprint([SurveyRuleGroup]),
+            rule_groups_fingerprint([SurveyRuleGroup]))
+        self.assertEqual(
+            RuleSet(rule_groups=[SurveyRuleGroup]).fingerprint,
+            rule_groups_fingerprint([SurveyRuleGroup]))
+
+    def test_fingerprint_changes_with_rule(self):
+        rule = SurveyRuleGroup.get_rules()[0]
+        other = CrfRule(
+            predicate=func_not_called,
+            consequence=REQUIRED,
+            alternative=NOT_REQUIRED,
+            target_models=['bcpp_subject.hicenrollment'],
+            exclude_survey_schedules=['bcpp-year-2'])
+        other.group, other.name = rule.group, rule.name
+        self.assertNotEqual(rule_fingerprint(rule), rule_fingerprint(other))
+
+    def test_fingerprint_changes_with_predicate_code(self):
+        def func_not_called(visit, **kwargs):
+            return False
+        rule = SurveyRuleGroup.get_rules()[0]
+        other = CrfRule(
+            predicate=func_not_called,
+            consequence=REQUIRED,
+            alternative=NOT_REQUIRED,
+            target_models=['bcpp_subject.hicenrollment'],
+            exclude_survey_schedules=['bcpp-year-3'])
+        other.group, other.name = rule.group, rule.name
+        self.assertNotEqual(rule_fingerprint(rule), rule_fingerprint(other))
+
+    def test_rule_set_plan_built_once(self):
+        rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+        [(rule, result)] = rule_set.plan('bcpp-year-3')
+        self.assertIs(rule_set.plan('bcpp-year-3'), rule_set.plan('bcpp-year-3'))
+        self.assertIs(rule, SurveyRuleGroup.get_rules()[0])
+        self.assertEqual(dict(result), {'bcpp_subject.hicenrollment': NOT_REQUIRED})
+
+    def test_rule_set_loads_compiled_plan(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        app_config.rule_plan_cache = 'default'
+        try:
+            rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+            rule_set.plan('bcpp-year-3')
+            compiled = cache.get(rule_set.cache_key)
+            self.assertEqual(
+                [name for name, _ in compiled['bcpp-year-3']],
+                [str(SurveyRuleGroup.get_rules()[0])])
+            cache.set(rule_set.cache_key, {'bcpp-year-3': []}, None)
+            rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+            self.assertEqual(rule_set.plan('bcpp-year-3'), [])
+        finally:
+            app_config.rule_plan_cache = None
+            cache.clear()
+
+    def test_code_digest_frozenset_sorted(self):
+        def func(value):
+            return value in {'a', 'b', 'c', 'd'}
+        [const] = [const for const in func.__code__.co_consts
+                   if isinstance(const, frozenset)]
+        self.assertIn(f'frozenset({sorted(repr(member) for member in const)})',
+                      code_digest(func.__code__))
+
+    def test_rule_set_evaluate_scheduled_only(self):
+        rule_set = RuleSet(rule_groups=[SurveyRuleGroup])
+        target = ('bcpp_subject.hicenrollment', None)
+        schedule_visit = ScheduleVisit(
+            crfs=[Crf('bcpp_subject.hicenrollment')], crfs_unscheduled=[], crfs_prn=[])
+        outcomes = rule_set.evaluate(visit=ScheduledVisit(
+            survey_schedule='bcpp-year-3', visit=schedule_visit))
+        self.assertIn(target, outcomes)
+        outcomes = rule_set.evaluate(visit=ScheduledVisit(
+            survey_schedule='bcpp-year-3', visit=schedule_visit,
+            visit_code_sequence=1))
+        self.assertNotIn(target, outcomes)
@@ -0,0 +1,80 @@
+from django.test import TestCase
+from edc_metadata import NOT_REQUIRED, REQUIRED
+
+from ..batch import VisitOutcome, chunked
+from ..partitions import PartitionResult, PartitionedEvaluator, get_map_area
+from ..rule_set import Outcome
+from ..simulator import SimulationReport
+
+
+class TestSimulator(TestCase):
+
+    def visit_outcome(self, current=None, proposed=None, visit_code=None, error=None):
+        return VisitOutcome(
+            visit_id='1',
+            subject_identifier='111111111',
+            visit_code=visit_code or 'T1',
+            survey_schedule=None,
+            outcomes={'current': current or {}, 'proposed': proposed or {}},
+            error=error)
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_no_flips(self):
+        report = SimulationReport()
+        outcomes = {('bcpp_subject.pimacd4', None): Outcome(REQUIRED, 'A.pima_cd4')}
+        report.add(self.visit_outcome(current=outcomes, proposed=outcomes))
+        self.assertEqual(report.visit_count, 1)
+        self.assertEqual(report.flips, [])
+
+    def test_flip(self):
+        report = SimulationReport()
+        target = ('bcpp_subject.subjectrequisition', 'Viral Load')
+        report.add(self.visit_outcome(
+            current={target: Outcome(REQUIRED, 'A.vl_for_pos')},
+            proposed={target: Outcome(NOT_REQUIRED, 'B.vl_for_pos')}))
+        self.assertEqual(len(report.flips), 1)
+        flip = report.flips[0]
+        self.assertEqual(flip.panel_name, 'Viral Load')
+        self.assertEqual((flip.current, flip.proposed), (REQUIRED, NOT_REQUIRED))
+        self.assertEqual(flip.proposed_rule, 'B.vl_for_pos')
+        self.assertEqual(
+            report.counts['T1'][target + (REQUIRED, NOT_REQUIRED)], 1)
+
+    def test_flip_to_undecided(self):
+        report = SimulationReport()
+        target = ('bcpp_subject.hicenrollment', None)
+        report.add(self.visit_outcome(
+            current={target: Outcome(REQUIRED, 'A.hic_enrollment')}))
+        self.assertEqual(report.flips[0].proposed, None)
+
+    def test_error(self):
+        report = SimulationReport()
+        report.add(self.visit_outcome(error='RuleEvaluatorError: ...'))
+        self.assertEqual(len(report.errors), 1)
+        self.assertEqual(report.flips, [])
+
+    def test_get_map_area(self):
+        self.assertEqual(get_map_area('bcpp-survey.bcpp-year-2.otse'), 'otse')
+        self.assertIsNone(get_map_area(None))
+
+    def test_merge_partitions(self):
+        target = ('bcpp_subject.hicenrollment', None)
+        reports = []
+        for _ in range(2):
+            report = SimulationReport()
+            report.add(self.visit_outcome(
+                current={target: Outcome(REQUIRED, 'A.hic_enrollment')}))
+            reports.append(report)
+        results = [
+            PartitionResult('otse', 1, False, None, 0.1, reports[0]),
+            PartitionResult('lentsweletau', 0, True, 'Traceback ...', 0.1, None),
+            PartitionResult('digawana', 1, False, None, 0.1, reports[1])]
+        report = SimulationReport()
+        collected = PartitionedEvaluator.collect(report, results)
+        self.assertEqual(report.visit_count, 2)
+        self.assertEqual(len(report.flips), 2)
+        self.assertEqual(report.counts['T1'][target + (REQUIRED, None)], 2)
+        self.assertEqual(
+            [result.map_area for result in collected if result.failed], ['lentsweletau'])
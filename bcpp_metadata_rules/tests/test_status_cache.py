@@ -0,0 +1,93 @@
+from collections import namedtuple
+from datetime import datetime
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.test import TestCase
+from edc_constants.constants import NAIVE, POS
+
+from ..status_cache import SharedStatusHelpers, StatusCache
+from ..visit_context import VisitContext
+
+Reference = namedtuple('Reference', 'identifier model')
+
+
+class CountedStatusHelper:
+
+    instances = 0
+
+    def __init__(self, visit=None):
+        self.__class__.instances += 1
+
+    final_hiv_status = POS
+    final_arv_status = NAIVE
+    newly_positive = False
+
+
+class TestStatusCache(TestCase):
+
+    def setUp(self):
+        self.app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        self.app_config.status_cache = 'default'
+        caches['default'].clear()
+        CountedStatusHelper.instances = 0
+        self.status_cache = StatusCache()
+        self.helper = self.status_cache.wrap(CountedStatusHelper)
+        self.visit = VisitContext(
+            subject_identifier='111111111', visit_code='T1',
+            report_datetime=datetime(2017, 5, 1))
+
+    def tearDown(self):
+        self.app_config.status_cache = None
+
+    def test_shared(self):
+        self.assertEqual(self.helper(visit=self.visit).final_hiv_status, POS)
+        status = self.helper(visit=self.visit)
+        self.assertEqual(status.final_hiv_status, POS)
+        self.assertEqual(status.final_arv_status, NAIVE)
+        # the second attribute was not yet cached
+        self.assertEqual(CountedStatusHelper.instances, 2)
+        self.assertEqual(self.helper(visit=self.visit).final_arv_status, NAIVE)
+        self.assertEqual(CountedStatusHelper.instances, 2)
+
+    def test_keyed_by_visit(self):
+        self.helper(visit=self.visit).final_hiv_status
+        self.helper(visit=VisitContext(
+            subject_identifier='111111111', visit_code='T2',
+            report_datetime=datetime(2018, 5, 1))).final_hiv_status
+        self.assertEqual(CountedStatusHelper.instances, 2)
+        self.helper(visit=VisitContext(
+            subject_identifier='111111111', visit_code='T1', visit_code_sequence=1,
+            report_datetime=datetime(2017, 5, 3))).final_hiv_status
+        self.assertEqual(CountedStatusHelper.instances, 3)
+
+    def test_invalidated_by_status_crf(self):
+        self.helper(visit=self.visit).final_hiv_status
+        self.status_cache.invalidate(
+            reference=Reference('111111111', 'bcpp_subject.sexualbehaviour'))
+        self.helper(visit=self.visit).final_hiv_status
+        self.assertEqual(CountedStatusHelper.instances, 1)
+        self.status_cache.invalidate(
+            reference=Reference('111111111', 'bcpp_subject.hivresult'))
+        self.helper(visit=self.visit).final_hiv_status
+        self.assertEqual(CountedStatusHelper.instances, 2)
+
+    def test_other_attributes_from_status_helper(self):
+        status = self.helper(visit=self.visit)
+        self.assertFalse(status.newly_positive)
+        with self.assertRaises(AttributeError):
+            status.unknown
+
+
+class TestSharedStatusHelpers(TestCase):
+
+    def test_shared_per_visit_and_as_of(self):
+        status_helpers = SharedStatusHelpers()
+        visit = VisitContext(
+            subject_identifier='111111111', visit_code='T1',
+            report_datetime=datetime(2017, 5, 1))
+        with status_helpers.prefetch():
+            current = status_helpers.wrap(CountedStatusHelper)(visit=visit)
+            self.assertIs(status_helpers.wrap(CountedStatusHelper)(visit=visit), current)
+            as_of = status_helpers.wrap(
+                CountedStatusHelper, as_of=datetime(2017, 1, 1))(visit=visit)
+            self.assertIsNot(as_of, current)
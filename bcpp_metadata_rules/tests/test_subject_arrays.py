@@ -0,0 +1,46 @@
+from django.test import TestCase
+from edc_constants.constants import FEMALE, MALE
+from edc_registration.models import RegisteredSubject
+
+from ..models import BaselineFacts
+from ..subject_arrays import SubjectArrays
+
+
+class TestSubjectArrays(TestCase):
+
+    def setUp(self):
+        RegisteredSubject.objects.create(
+            subject_identifier='111111111', gender=FEMALE)
+        RegisteredSubject.objects.create(
+            subject_identifier='222222222', gender=MALE)
+        BaselineFacts.objects.create(
+            subject_identifier='111111111',
+            defaulter_at_baseline=False,
+            naive_at_baseline=True)
+        self.subject_arrays = SubjectArrays()
+
+    def test_not_loaded(self):
+        self.assertFalse(self.subject_arrays.enabled)
+        self.assertIsNone(self.subject_arrays.gender('111111111'))
+        self.assertIsNone(self.subject_arrays.baseline_facts('111111111'))
+
+    def test_backfill(self):
+        with self.subject_arrays.backfill():
+            with self.assertNumQueries(0):
+                self.assertEqual(self.subject_arrays.gender('111111111'), FEMALE)
+                self.assertEqual(self.subject_arrays.gender('222222222'), MALE)
+                self.assertIsNone(self.subject_arrays.gender('333333333'))
+                facts = self.subject_arrays.baseline_facts('111111111')
+                self.assertFalse(facts.defaulter_at_baseline)
+                self.assertTrue(facts.naive_at_baseline)
+                self.assertIsNone(self.subject_arrays.baseline_facts('222222222'))
+        self.assertFalse(self.subject_arrays.enabled)
+
+    def test_pack_baseline_keeps_unknown(self):
+        flags = self.subject_arrays.pack_baseline(defaulter=None, naive=False)
+        self.assertTrue(flags)
+        self.subject_arrays.index = {'111111111': 0}
+        self.subject_arrays.buffer = bytearray([2, flags])
+        facts = self.subject_arrays.baseline_facts('111111111')
+        self.assertIsNone(facts.defaulter_at_baseline)
+        self.assertFalse(facts.naive_at_baseline)
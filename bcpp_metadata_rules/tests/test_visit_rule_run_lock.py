@@ -0,0 +1,127 @@
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.test import TestCase
+from edc_registration.models import RegisteredSubject
+
+from ..models import RuleRunQueueItem, VisitRuleRun
+from ..visit_rule_run_lock import VisitRuleRunLock
+
+
+class ConcurrentRequestLock(VisitRuleRunLock):
+
+    """Simulates a newer run requested while this run waits
+    for the lock.
+    """
+
+    def __init__(self, visit=None, **kwargs):
+        self.visit = visit
+        super().__init__(visit=visit, **kwargs)
+
+    def request(self):
+        ticket = super().request()
+        VisitRuleRunLock(visit=self.visit).request()
+        return ticket
+
+
+class RecordingLock(VisitRuleRunLock):
+
+    retried = []
+
+    def retry(self):
+        self.retried.append(self.ticket)
+
+
+class FailingEvaluator:
+
+    runs = []
+
+    def __init__(self, visit=None, app_label=None):
+        self.visit = visit
+
+    def run(self):
+        self.runs.append(self.visit.subject_identifier)
+        with VisitRuleRunLock(visit=self.visit, evaluator_cls=self.__class__):
+            raise ValueError
+
+
+class TestVisitRuleRunLock(TestCase):
+
+    def setUp(self):
+        # any model instance will do as the "visit"
+        self.visit = RegisteredSubject.objects.create(subject_identifier='111111111')
+
+    def test_tickets(self):
+        for ticket in [1, 2]:
+            with VisitRuleRunLock(visit=self.visit) as lock:
+                self.assertEqual(lock.ticket, ticket)
+                self.assertFalse(lock.superseded)
+                lock.complete()
+        obj = VisitRuleRun.objects.get(visit_id=str(self.visit.pk))
+        self.assertEqual(obj.requested, 2)
+        self.assertEqual(obj.completed, 2)
+
+    def test_superseded(self):
+        with ConcurrentRequestLock(visit=self.visit) as lock:
+            self.assertTrue(lock.superseded)
+        obj = VisitRuleRun.objects.get(visit_id=str(self.visit.pk))
+        self.assertEqual(obj.completed, 0)
+
+    def test_failed_run_retries_superseded(self):
+        RecordingLock.retried = []
+        # an older run, e.g. waiting for the lock, that will skip
+        VisitRuleRunLock(visit=self.visit).request()
+        with self.assertRaises(ValueError):
+            with RecordingLock(visit=self.visit) as lock:
+                self.assertTrue(lock.supersedes)
+                raise ValueError
+        self.assertEqual(RecordingLock.retried, [2])
+
+    def test_failed_run_not_retried(self):
+        RecordingLock.retried = []
+        with self.assertRaises(ValueError):
+            with RecordingLock(visit=self.visit) as lock:
+                self.assertFalse(lock.supersedes)
+                raise ValueError
+        self.assertEqual(RecordingLock.retried, [])
+
+    def test_thread_lock_discarded(self):
+        with VisitRuleRunLock(visit=self.visit) as lock:
+            lock.complete()
+            self.assertIn(
+                (lock.visit_model, lock.visit_id), VisitRuleRunLock._thread_locks)
+        self.assertNotIn(
+            (lock.visit_model, lock.visit_id), VisitRuleRunLock._thread_locks)
+
+    def test_failed_run_rerun_once_if_not_deferred(self):
+        FailingEvaluator.runs = []
+        VisitRuleRunLock(visit=self.visit).request()
+        with self.assertRaises(ValueError):
+            FailingEvaluator(visit=self.visit).run()
+        self.assertEqual(FailingEvaluator.runs, ['111111111', '111111111'])
+        self.assertFalse(RuleRunQueueItem.objects.exists())
+
+    def test_failed_run_queued_if_deferred(self):
+        FailingEvaluator.runs = []
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        app_config.defer_rule_runs = True
+        self.visit.visit_code = 'T0'
+        try:
+            VisitRuleRunLock(visit=self.visit).request()
+            with self.assertRaises(ValueError):
+                FailingEvaluator(visit=self.visit).run()
+        finally:
+            app_config.defer_rule_runs = False
+        self.assertEqual(FailingEvaluator.runs, ['111111111'])
+        self.assertEqual(RuleRunQueueItem.objects.get().visit_id, str(self.visit.pk))
+
+    def test_ticket_written_in_outer_transaction(self):
+        """Asserts the ticket is only seen once the outer transaction
+        commits; see VisitRuleRunLock.
+        """
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                with VisitRuleRunLock(visit=self.visit) as lock:
+                    lock.complete()
+                raise ValueError
+        self.assertFalse(VisitRuleRun.objects.filter(
+            visit_id=str(self.visit.pk)).exists())
@@ -0,0 +1,68 @@
+from django.test import TestCase
+from edc_constants.constants import YES
+from edc_metadata import KEYED, REQUIRED
+from edc_metadata.models import CrfMetadata
+
+from ..models import BaselineFacts, MonotonicFact
+from ..monotonic import MonotonicFactIndex
+from ..visit_context import VisitContext
+from ..warm_up import CacheWarmUp
+
+
+class StatusHelper:
+
+    def __init__(self, visit=None):
+        pass
+
+    defaulter_at_baseline = False
+    naive_at_baseline = True
+
+
+class TestCacheWarmUp(TestCase):
+
+    def setUp(self):
+        self.warm_up = CacheWarmUp(days=1)
+        self.warm_up.predicates.status_helper_cls = StatusHelper
+        self.index = MonotonicFactIndex()
+        self.index.register('bcpp_subject.circumcision', 'circumcised', YES)
+        self.warm_up.predicates.monotonic_fact_index = self.index
+        self.visits = [
+            VisitContext(subject_identifier='111111111', visit_code='T0'),
+            VisitContext(subject_identifier='111111111', visit_code='T1'),
+            VisitContext(subject_identifier='222222222', visit_code='T1')]
+        for subject_identifier in ['111111111', '222222222']:
+            self.create_baseline_metadata(subject_identifier, KEYED)
+
+    def create_baseline_metadata(self, subject_identifier=None, entry_status=None):
+        return CrfMetadata.objects.create(
+            subject_identifier=subject_identifier,
+            visit_schedule_name='visit_schedule', schedule_name='schedule',
+            visit_code='T0', show_order=10, model='bcpp_subject.hivresult',
+            entry_status=entry_status)
+
+    def test_warm(self):
+        self.warm_up.warm(visits=self.visits)
+        self.assertEqual(self.warm_up.counts['visits'], 3)
+        self.assertEqual(self.warm_up.counts['monotonic_facts'], 2)
+        self.assertEqual(MonotonicFact.objects.count(), 2)
+        self.assertEqual(self.warm_up.counts['baseline_facts'], 2)
+        self.assertTrue(
+            BaselineFacts.objects.get(subject_identifier='222222222').naive_at_baseline)
+        self.assertEqual(self.warm_up.errors, [])
+
+    def test_existing_not_rebuilt(self):
+        self.warm_up.warm(visits=self.visits)
+        self.warm_up.counts.clear()
+        with self.assertNumQueries(2):
+            self.warm_up.warm(visits=self.visits)
+        self.assertEqual(self.warm_up.counts['monotonic_facts'], 0)
+        self.assertEqual(self.warm_up.counts['baseline_facts'], 0)
+
+    def test_baseline_not_final_not_persisted(self):
+        self.create_baseline_metadata('333333333', REQUIRED)
+        self.warm_up.warm(visits=[
+            VisitContext(subject_identifier='333333333', visit_code='T1'),
+            VisitContext(subject_identifier='444444444', visit_code='T1')])
+        self.assertEqual(self.warm_up.counts['baseline_facts'], 0)
+        self.assertFalse(BaselineFacts.objects.filter(
+            subject_identifier__in=['333333333', '444444444']).exists())
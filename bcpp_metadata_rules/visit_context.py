@@ -0,0 +1,62 @@
+from edc_visit_schedule import site_visit_schedules
+
+
+class VisitContext:
+
+    """A lightweight visit with only the attributes predicates
+    and rule groups read.
+
+    Accepted by rules and predicates in place of a visit model
+    instance for batch and offline evaluation. Nothing may be
+    saved through it.
+
+    For example:
+
+        for values in SubjectVisit.objects.values_list(*VisitContext.fields):
+            visit = VisitContext(*values)
+    """
+
+    __slots__ = ('pk', 'subject_identifier', 'report_datetime',
+                 'survey_schedule', 'visit_code', 'visit_schedule_name',
+                 'schedule_name', 'visit_code_sequence')
+
+    fields = __slots__
+
+    def __init__(self, pk=None, subject_identifier=None, report_datetime=None,
+                 survey_schedule=None, visit_code=None, visit_schedule_name=None,
+                 schedule_name=None, visit_code_sequence=None):
+        self.pk = pk
+        self.subject_identifier = subject_identifier
+        self.report_datetime = report_datetime
+        self.survey_schedule = survey_schedule
+        self.visit_code = visit_code
+        self.visit_schedule_name = visit_schedule_name
+        self.schedule_name = schedule_name
+        self.visit_code_sequence = visit_code_sequence or 0
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(subject_identifier='
+                f'\'{self.subject_identifier}\', visit_code=\'{self.visit_code}\', '
+                f'visit_code_sequence={self.visit_code_sequence})')
+
+    @property
+    def timepoint(self):
+        return self.visit_code
+
+    @property
+    def visit(self):
+        """Returns the visit schedule's visit, as the visit model's
+        `visit`, or None if the context has no visit schedule.
+        """
+        if not self.visit_schedule_name:
+            return None
+        visit_schedule = site_visit_schedules.get_visit_schedule(
+            self.visit_schedule_name)
+        schedule = visit_schedule.schedules.get(self.schedule_name)
+        return schedule.visits.get(self.visit_code)
+
+    @classmethod
+    def from_visit(cls, visit=None):
+        """Returns a VisitContext for a visit model instance.
+        """
+        return cls(*[getattr(visit, field) for field in cls.fields])
@@ -0,0 +1,146 @@
+import threading
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import F
+from edc_base.utils import get_utcnow
+
+from .rule_run_queue import rule_run_queue
+
+
+class VisitRuleRunLock:
+
+    """A context manager that serializes rule runs for a visit.
+
+    Each run takes a ticket from the visit's VisitRuleRun row then
+    waits for the row lock. If a newer run was requested while
+    waiting, this run is `superseded`; the newer run will see at
+    least the same data so this run need not evaluate.
+
+    For example:
+
+        with VisitRuleRunLock(visit=visit) as lock:
+            if not lock.superseded:
+                ...  # run the rules
+                lock.complete()
+
+    If a run that superseded older runs fails, the older runs did
+    not evaluate either; the rules for the visit are run again, see
+    `retry`.
+
+    Within an outer transaction, e.g. with ATOMIC_REQUESTS, the ticket
+    is written in a savepoint. Other transactions do not see it, and
+    wait for the row lock, until the outer transaction commits; runs
+    in other transactions are not superseded by it. Coalesce rule runs
+    to run them after the commit instead, see coalescer.
+
+    Enabled by the app config's `lock_rule_runs`.
+
+    SQLite ignores SELECT ... FOR UPDATE but serializes writers,
+    so runs in one process also take a per-visit thread lock,
+    discarded when no run for the visit holds or waits for it.
+    """
+
+    model = 'bcpp_metadata_rules.visitrulerun'
+    rule_run_queue = rule_run_queue
+
+    # {(visit_model, visit_id): [RLock, number of runs using it]}
+    _thread_locks = {}
+    _thread_locks_lock = threading.Lock()
+    _local = threading.local()
+
+    def __init__(self, visit=None, using=None, app_label=None, evaluator_cls=None):
+        self.visit = visit
+        self.visit_model = visit._meta.label_lower
+        self.visit_id = str(visit.pk)
+        self.app_label = app_label
+        self.evaluator_cls = evaluator_cls
+        self.using = using
+        self.ticket = None
+        self.superseded = None
+        self.supersedes = None
+        self._atomic = None
+        self._thread_lock = None
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(visit_model=\'{self.visit_model}\', '
+                f'visit_id=\'{self.visit_id}\', ticket={self.ticket})')
+
+    @property
+    def enabled(self):
+        app_config = django_apps.get_app_config('bcpp_metadata_rules')
+        return app_config.lock_rule_runs
+
+    @property
+    def model_cls(self):
+        return django_apps.get_model(self.model)
+
+    @property
+    def queryset(self):
+        return self.model_cls.objects.using(self.using).filter(
+            visit_model=self.visit_model, visit_id=self.visit_id)
+
+    def request(self):
+        """Returns a new ticket for this run.
+        """
+        with transaction.atomic(using=self.using):
+            self.model_cls.objects.using(self.using).get_or_create(
+                visit_model=self.visit_model, visit_id=self.visit_id)
+            self.queryset.update(requested=F('requested') + 1)
+            return self.queryset.select_for_update().get().requested
+
+    def acquire_thread_lock(self):
+        if transaction.get_connection(self.using).vendor != 'sqlite':
+            return None
+        with self._thread_locks_lock:
+            entry = self._thread_locks.setdefault(
+                (self.visit_model, self.visit_id), [threading.RLock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return entry[0]
+
+    def release_thread_lock(self):
+        self._thread_lock.release()
+        key = (self.visit_model, self.visit_id)
+        with self._thread_locks_lock:
+            entry = self._thread_locks[key]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._thread_locks[key]
+
+    def __enter__(self):
+        self.ticket = self.request()
+        self._thread_lock = self.acquire_thread_lock()
+        self._atomic = transaction.atomic(using=self.using)
+        self._atomic.__enter__()
+        obj = self.queryset.select_for_update().get()
+        self.superseded = obj.requested > self.ticket
+        # older runs not completed skip, or skipped, in favour of this run
+        self.supersedes = obj.completed < self.ticket - 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return self._atomic.__exit__(exc_type, exc_value, traceback)
+        finally:
+            if self._thread_lock:
+                self.release_thread_lock()
+            if exc_type and self.supersedes and not self.superseded:
+                self.retry()
+
+    def retry(self):
+        """Adds the visit to the rule run queue if rule runs are
+        deferred, otherwise runs the rules for the visit again now,
+        once.
+        """
+        if self.rule_run_queue.enabled:
+            self.rule_run_queue.enqueue(visit=self.visit, app_label=self.app_label)
+        elif self.evaluator_cls and not getattr(self._local, 'retrying', False):
+            self._local.retrying = True
+            try:
+                self.evaluator_cls(visit=self.visit, app_label=self.app_label).run()
+            finally:
+                self._local.retrying = False
+
+    def complete(self):
+        self.queryset.update(completed=self.ticket, completed_datetime=get_utcnow())
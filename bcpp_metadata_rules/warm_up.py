@@ -0,0 +1,113 @@
+from collections import Counter
+
+from .appointments import ScheduledAppointments
+from .predicates import Predicates
+
+
+class CacheWarmUp:
+
+    """A class that precomputes, for the new appointments of the
+    day, the per-subject facts the predicates would otherwise
+    compute on the first save of each visit.
+
+    For each batch of appointments:
+        * the monotonic fact index is built for subjects without
+          an entry;
+        * baseline facts are persisted for subjects at a follow-up
+          visit without them, once the baseline is final;
+        * if the status cache is enabled, the status helper's
+          outcomes are cached for the visit.
+
+    Facts that already exist are found with one query per batch.
+    A failure is recorded in `errors` and does not stop the others.
+
+    For example:
+
+        warm_up = CacheWarmUp(days=1)
+        warm_up.run()
+        >>> Counter({'visits': 120, 'monotonic_facts': 84, ...})
+    """
+
+    appointments_cls = ScheduledAppointments
+    predicates_cls = Predicates
+
+    def __init__(self, start=None, days=None, batch_size=None):
+        self.scheduled = self.appointments_cls(
+            start=start, days=days, batch_size=batch_size)
+        self.predicates = self.predicates_cls()
+        self.counts = Counter()
+        self.errors = []
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(scheduled={self.scheduled})'
+
+    def run(self):
+        """Returns a Counter of the visits and facts warmed.
+        """
+        for visits in self.scheduled.contexts():
+            self.warm(visits=visits)
+        return self.counts
+
+    def warm(self, visits=None):
+        subject_identifiers = {visit.subject_identifier for visit in visits}
+        monotonic_facts = self.existing_monotonic_facts(subject_identifiers)
+        baseline_facts = self.existing_baseline_facts(subject_identifiers)
+        for visit in visits:
+            try:
+                # one status helper for the visit
+                with self.predicates.status_helpers.prefetch():
+                    self.warm_monotonic_facts(visit=visit, existing=monotonic_facts)
+                    self.warm_baseline_facts(visit=visit, existing=baseline_facts)
+                    self.warm_status(visit=visit)
+            except Exception as e:
+                self.errors.append(
+                    (visit.subject_identifier, visit.visit_code,
+                     f'{e.__class__.__name__}: {e}'))
+            self.counts.update(['visits'])
+
+    def existing_monotonic_facts(self, subject_identifiers=None):
+        """Returns a set of (subject_identifier, name) of the monotonic
+        facts already indexed for the subjects.
+        """
+        index = self.predicates.monotonic_fact_index
+        if index is None:
+            return set()
+        return set(index.model_cls.objects.filter(
+            subject_identifier__in=subject_identifiers,
+            name__in=list(index.specs)).values_list('subject_identifier', 'name'))
+
+    def existing_baseline_facts(self, subject_identifiers=None):
+        return set(self.predicates.baseline_facts.model_cls.objects.filter(
+            subject_identifier__in=subject_identifiers).values_list(
+                'subject_identifier', flat=True))
+
+    def warm_monotonic_facts(self, visit=None, existing=None):
+        index = self.predicates.monotonic_fact_index
+        if index is None:
+            return
+        for spec in index.specs.values():
+            if (visit.subject_identifier, spec.name) not in existing:
+                index.build(
+                    subject_identifier=visit.subject_identifier, spec=spec,
+                    reference_model_cls=self.predicates.reference_model_cls)
+                existing.add((visit.subject_identifier, spec.name))
+                self.counts.update(['monotonic_facts'])
+
+    def warm_baseline_facts(self, visit=None, existing=None):
+        baseline_facts = self.predicates.baseline_facts
+        if (visit.visit_code not in baseline_facts.baseline_visit_codes
+                and visit.subject_identifier not in existing):
+            obj = baseline_facts.get(
+                visit=visit, status_helper_cls=self.predicates.status_helper_cls)
+            if isinstance(obj, baseline_facts.model_cls):
+                # not persisted until the baseline is final
+                existing.add(visit.subject_identifier)
+                self.counts.update(['baseline_facts'])
+
+    def warm_status(self, visit=None):
+        status_cache = self.predicates.status_cache
+        if status_cache and status_cache.enabled:
+            status = self.predicates.status_helper_cls(visit=visit)
+            for name in status_cache.names:
+                getattr(status, name)
+            self.counts.update(['statuses'])